@@ -1,7 +1,21 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import sqlite3
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Optional, Sequence
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from core.outputs.generation import Generation
+
+if TYPE_CHECKING:
+    from core.embeddings import Embeddings
+
+RETURN_VAL_TYPE = Sequence[Generation]
 
 
 class BaseCache(ABC):
@@ -18,3 +32,364 @@ class BaseCache(ABC):
     @abstractmethod
     def clear(self, **kwargs: Any) -> None:
         """Clear cache that can take additional keyword arguments."""
+
+    def lookup_many(
+            self, keys: Sequence[Tuple[str, str]]
+    ) -> List[Optional[RETURN_VAL_TYPE]]:
+        """Look up several (prompt, llm_string) pairs at once.
+
+        The default implementation calls ``lookup`` for every pair; caches with a
+        cheaper bulk read should override it.
+        """
+        return [self.lookup(prompt, llm_string) for prompt, llm_string in keys]
+
+    def update_many(
+            self, items: Sequence[Tuple[str, str, RETURN_VAL_TYPE]]
+    ) -> None:
+        """Update the cache with several (prompt, llm_string, return_val) items.
+
+        The default implementation calls ``update`` for every item; caches with a
+        cheaper bulk write should override it.
+        """
+        for prompt, llm_string, return_val in items:
+            self.update(prompt, llm_string, return_val)
+
+
+class InMemoryCache(BaseCache):
+    """Cache that stores things in memory.
+
+    Safe to share between threads. Once ``maxsize`` entries are stored, the least
+    recently used one is evicted; with a ``ttl``, entries expire that many seconds
+    after they were written.
+    """
+
+    def __init__(
+            self, *, maxsize: Optional[int] = None, ttl: Optional[float] = None
+    ) -> None:
+        """Initialize with empty cache.
+
+        Args:
+            maxsize: The maximum number of entries to keep. Unbounded if None.
+            ttl: Seconds an entry stays valid after it was written. Never expires
+                if None.
+        """
+        if maxsize is not None and maxsize <= 0:
+            raise ValueError("maxsize must be greater than 0")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[
+            Tuple[str, str], Tuple[RETURN_VAL_TYPE, Optional[float]]
+        ] = OrderedDict()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Look up based on prompt and llm_string."""
+        key = (prompt, llm_string)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            return_val, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return return_val
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Update cache based on prompt and llm_string."""
+        key = (prompt, llm_string)
+        expires_at = time.monotonic() + self._ttl if self._ttl is not None else None
+        with self._lock:
+            self._cache[key] = (return_val, expires_at)
+            self._cache.move_to_end(key)
+            if self._maxsize is not None:
+                while len(self._cache) > self._maxsize:
+                    self._cache.popitem(last=False)
+
+    def clear(self, **kwargs: Any) -> None:
+        """Clear cache."""
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cache)
+
+
+class SQLiteCache(BaseCache):
+    """Cache that persists generations to a local SQLite database.
+
+    The database runs in WAL mode, so several processes can read the same file
+    while one writes, and the cache stays warm across restarts. Rows are keyed on
+    a SHA-256 hash of the prompt and llm_string, and ``lookup_many`` /
+    ``update_many`` serve a whole batch in a single transaction.
+    """
+
+    # SQLite limits the number of host parameters in one statement.
+    _MAX_VARIABLES = 500
+
+    def __init__(self, database_path: Union[str, Path] = ".sidekick.db") -> None:
+        """Open (and create if needed) the cache database.
+
+        Args:
+            database_path: Path of the SQLite database file.
+        """
+        self.database_path = str(database_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.database_path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " llm_string TEXT NOT NULL,"
+            " response TEXT NOT NULL)"
+        )
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(
+            f"{len(prompt)}:{prompt}{llm_string}".encode("utf-8")
+        ).hexdigest()
+
+    @staticmethod
+    def _dumps(return_val: RETURN_VAL_TYPE) -> str:
+        return json.dumps([generation.model_dump() for generation in return_val])
+
+    @staticmethod
+    def _loads(response: str) -> RETURN_VAL_TYPE:
+        return [Generation(**generation) for generation in json.loads(response)]
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Look up based on prompt and llm_string."""
+        return self.lookup_many([(prompt, llm_string)])[0]
+
+    def lookup_many(
+            self, keys: Sequence[Tuple[str, str]]
+    ) -> List[Optional[RETURN_VAL_TYPE]]:
+        """Look up several (prompt, llm_string) pairs in one transaction."""
+        hashed = [self._key(prompt, llm_string) for prompt, llm_string in keys]
+        responses = {}
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for start in range(0, len(hashed), self._MAX_VARIABLES):
+                    chunk = hashed[start:start + self._MAX_VARIABLES]
+                    rows = self._conn.execute(
+                        "SELECT key, response FROM llm_cache WHERE key IN "
+                        f"({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                    responses.update(rows)
+            finally:
+                self._conn.execute("COMMIT")
+        return [
+            self._loads(responses[key]) if key in responses else None
+            for key in hashed
+        ]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Update cache based on prompt and llm_string."""
+        self.update_many([(prompt, llm_string, return_val)])
+
+    def update_many(
+            self, items: Sequence[Tuple[str, str, RETURN_VAL_TYPE]]
+    ) -> None:
+        """Write several (prompt, llm_string, return_val) items in one transaction."""
+        rows = [
+            (self._key(prompt, llm_string), llm_string, self._dumps(return_val))
+            for prompt, llm_string, return_val in items
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO llm_cache (key, llm_string, response)"
+                    " VALUES (?, ?, ?)",
+                    rows,
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def clear(self, **kwargs: Any) -> None:
+        """Clear cache.
+
+        Args:
+            llm_string: Only clear the entries cached under this llm_string.
+        """
+        llm_string = kwargs.get("llm_string")
+        with self._lock:
+            if llm_string is None:
+                self._conn.execute("DELETE FROM llm_cache")
+            else:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE llm_string = ?", (llm_string,)
+                )
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def _import_numpy() -> Any:
+    """Import the numpy python package and raise an error if it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "InMemorySemanticCache requires the `numpy` python "
+            "package installed. Please install it with `pip install numpy`"
+        )
+    return numpy
+
+
+class _SemanticIndex:
+    """Fixed-capacity matrix of unit prompt vectors for one llm_string."""
+
+    def __init__(self, np: Any, capacity: int, dim: int) -> None:
+        self.np = np
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.return_vals: List[Optional[RETURN_VAL_TYPE]] = [None] * capacity
+        self.prompts: List[Optional[str]] = [None] * capacity
+        self.rows: Dict[str, int] = {}
+        self.size = 0
+
+    def search(self, queries: Any) -> Tuple[Any, Any]:
+        """Return the best row and its cosine similarity for every query vector."""
+        scores = queries @ self.vectors[: self.size].T
+        best = scores.argmax(axis=1)
+        return best, scores[self.np.arange(len(queries)), best]
+
+    def add(
+            self, prompt: str, vector: Any, return_val: RETURN_VAL_TYPE, tick: int
+    ) -> None:
+        """Store a prompt, replacing its row if it is already cached."""
+        row = self.rows.get(prompt)
+        if row is None:
+            if self.size < len(self.vectors):
+                row = self.size
+                self.size += 1
+            else:
+                row = int(self.last_used.argmin())
+                del self.rows[self.prompts[row]]
+            self.rows[prompt] = row
+            self.prompts[row] = prompt
+        self.vectors[row] = vector
+        self.return_vals[row] = return_val
+        self.last_used[row] = tick
+
+
+class InMemorySemanticCache(BaseCache):
+    """Cache that matches prompts by embedding similarity instead of exact text.
+
+    A lookup embeds the prompt and returns the generations of the most similar
+    cached prompt of the same llm_string, provided their cosine similarity is at
+    least ``score_threshold``. Vectors live in one NumPy matrix per llm_string, so
+    top-1 search is a single matrix product, and once ``maxsize`` prompts are
+    stored for an llm_string the least recently used one is replaced.
+    """
+
+    def __init__(
+            self,
+            embedding: Embeddings,
+            *,
+            score_threshold: float = 0.9,
+            maxsize: int = 1000,
+    ) -> None:
+        """Initialize with an embedding model.
+
+        Args:
+            embedding: The embedding model used to embed prompts.
+            score_threshold: The minimum cosine similarity for a prompt to hit.
+            maxsize: The maximum number of prompts cached per llm_string.
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be greater than 0")
+        self._np = _import_numpy()
+        self.embedding = embedding
+        self.score_threshold = score_threshold
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, _SemanticIndex] = {}
+        self._tick = 0
+
+    def _normalize(self, vectors: List[List[float]]) -> Any:
+        matrix = self._np.asarray(vectors, dtype=self._np.float32)
+        norms = self._np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / self._np.where(norms == 0, 1, norms)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Look up the generations of the most similar prompt."""
+        return self.lookup_many([(prompt, llm_string)])[0]
+
+    def lookup_many(
+            self, keys: Sequence[Tuple[str, str]]
+    ) -> List[Optional[RETURN_VAL_TYPE]]:
+        """Look up several prompts with one embedding call and one search per
+        llm_string."""
+        results: List[Optional[RETURN_VAL_TYPE]] = [None] * len(keys)
+        with self._lock:
+            if not any(llm_string in self._indexes for _, llm_string in keys):
+                return results
+        queries = self._normalize(
+            self.embedding.embed_documents([prompt for prompt, _ in keys])
+        )
+        positions: Dict[str, List[int]] = {}
+        for i, (_, llm_string) in enumerate(keys):
+            positions.setdefault(llm_string, []).append(i)
+        with self._lock:
+            for llm_string, idxs in positions.items():
+                index = self._indexes.get(llm_string)
+                if index is None or index.size == 0:
+                    continue
+                best, scores = index.search(queries[idxs])
+                for i, row, score in zip(idxs, best, scores):
+                    if score >= self.score_threshold:
+                        self._tick += 1
+                        index.last_used[row] = self._tick
+                        results[i] = index.return_vals[row]
+        return results
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Cache the generations of a prompt."""
+        self.update_many([(prompt, llm_string, return_val)])
+
+    def update_many(
+            self, items: Sequence[Tuple[str, str, RETURN_VAL_TYPE]]
+    ) -> None:
+        """Cache several prompts with one embedding call."""
+        if not items:
+            return
+        vectors = self._normalize(
+            self.embedding.embed_documents([prompt for prompt, _, _ in items])
+        )
+        with self._lock:
+            for vector, (prompt, llm_string, return_val) in zip(vectors, items):
+                index = self._indexes.get(llm_string)
+                if index is None:
+                    index = _SemanticIndex(self._np, self.maxsize, len(vector))
+                    self._indexes[llm_string] = index
+                self._tick += 1
+                index.add(prompt, vector, return_val, self._tick)
+
+    def clear(self, **kwargs: Any) -> None:
+        """Clear cache.
+
+        Args:
+            llm_string: Only clear the prompts cached under this llm_string.
+        """
+        llm_string = kwargs.get("llm_string")
+        with self._lock:
+            if llm_string is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(llm_string, None)
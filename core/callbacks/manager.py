@@ -1,364 +1,772 @@
-# from typing import List, Optional, Any
-#
-# from core.callbacks.base import BaseCallbackManager, BaseCallbackHandler
-#
-#
-# def handle_event(
-#         handlers: List[BaseCallbackHandler],
-#         event_name: str,
-#         ignore_condition_name: Optional[str],
-#         *args: Any,
-#         **kwargs: Any,
-# ) -> None:
-#     """Generic event handler for CallbackManager.
-#
-#     Note: This function is used by langserve to handle events.
-#
-#     Args:
-#         handlers: The list of handlers that will handle the event
-#         event_name: The name of the event (e.g., "on_llm_start")
-#         ignore_condition_name: Name of the attribute defined on handler
-#             that if True will cause the handler to be skipped for the given event
-#         *args: The arguments to pass to the event handler
-#         **kwargs: The keyword arguments to pass to the event handler
-#     """
-#     coros: List[Coroutine[Any, Any, Any]] = []
-#
-#     try:
-#         message_strings: Optional[List[str]] = None
-#         for handler in handlers:
-#             try:
-#                 if ignore_condition_name is None or not getattr(
-#                         handler, ignore_condition_name
-#                 ):
-#                     event = getattr(handler, event_name)(*args, **kwargs)
-#                     if asyncio.iscoroutine(event):
-#                         coros.append(event)
-#             except NotImplementedError as e:
-#                 if event_name == "on_chat_model_start":
-#                     if message_strings is None:
-#                         message_strings = [get_buffer_string(m) for m in args[1]]
-#                     handle_event(
-#                         [handler],
-#                         "on_llm_start",
-#                         "ignore_llm",
-#                         args[0],
-#                         message_strings,
-#                         *args[2:],
-#                         **kwargs,
-#                     )
-#                 else:
-#                     handler_name = handler.__class__.__name__
-#                     logger.warning(
-#                         f"NotImplementedError in {handler_name}.{event_name}"
-#                         f" callback: {repr(e)}"
-#                     )
-#             except Exception as e:
-#                 logger.warning(
-#                     f"Error in {handler.__class__.__name__}.{event_name} callback:"
-#                     f" {repr(e)}"
-#                 )
-#                 if handler.raise_error:
-#                     raise e
-#     finally:
-#         if coros:
-#             try:
-#                 # Raises RuntimeError if there is no current event loop.
-#                 asyncio.get_running_loop()
-#                 loop_running = True
-#             except RuntimeError:
-#                 loop_running = False
-#
-#             if loop_running:
-#                 # If we try to submit this coroutine to the running loop
-#                 # we end up in a deadlock, as we'd have gotten here from a
-#                 # running coroutine, which we cannot interrupt to run this one.
-#                 # The solution is to create a new loop in a new thread.
-#                 with ThreadPoolExecutor(1) as executor:
-#                     executor.submit(
-#                         cast(Callable, copy_context().run), _run_coros, coros
-#                     ).result()
-#             else:
-#                 _run_coros(coros)
-#
-#
-# def _run_coros(coros: List[Coroutine[Any, Any, Any]]) -> None:
-#     if hasattr(asyncio, "Runner"):
-#         # Python 3.11+
-#         # Run the coroutines in a new event loop, taking care to
-#         # - install signal handlers
-#         # - run pending tasks scheduled by `coros`
-#         # - close asyncgens and executors
-#         # - close the loop
-#         with asyncio.Runner() as runner:
-#             # Run the coroutine, get the result
-#             for coro in coros:
-#                 try:
-#                     runner.run(coro)
-#                 except Exception as e:
-#                     logger.warning(f"Error in callback coroutine: {repr(e)}")
-#
-#             # Run pending tasks scheduled by coros until they are all done
-#             while pending := asyncio.all_tasks(runner.get_loop()):
-#                 runner.run(asyncio.wait(pending))
-#     else:
-#         # Before Python 3.11 we need to run each coroutine in a new event loop
-#         # as the Runner api is not available.
-#         for coro in coros:
-#             try:
-#                 asyncio.run(coro)
-#             except Exception as e:
-#                 logger.warning(f"Error in callback coroutine: {repr(e)}")
-#
-#
-# class CallbackManager(BaseCallbackManager):
-#     """Callback manager that handles callbacks from LangChain."""
-#
-#     def on_llm_start(
-#             self,
-#             serialized: Dict[str, Any],
-#             prompts: List[str],
-#             run_id: Optional[UUID] = None,
-#             **kwargs: Any,
-#     ) -> List[CallbackManagerForLLMRun]:
-#         """Run when LLM starts running.
-#
-#         Args:
-#             serialized (Dict[str, Any]): The serialized LLM.
-#             prompts (List[str]): The list of prompts.
-#             run_id (UUID, optional): The ID of the run. Defaults to None.
-#
-#         Returns:
-#             List[CallbackManagerForLLMRun]: A callback manager for each
-#                 prompt as an LLM run.
-#         """
-#         managers = []
-#         for i, prompt in enumerate(prompts):
-#             # Can't have duplicate runs with the same run ID (if provided)
-#             run_id_ = run_id if i == 0 and run_id is not None else uuid.uuid4()
-#             handle_event(
-#                 self.handlers,
-#                 "on_llm_start",
-#                 "ignore_llm",
-#                 serialized,
-#                 [prompt],
-#                 run_id=run_id_,
-#                 parent_run_id=self.parent_run_id,
-#                 tags=self.tags,
-#                 metadata=self.metadata,
-#                 **kwargs,
-#             )
-#
-#             managers.append(
-#                 CallbackManagerForLLMRun(
-#                     run_id=run_id_,
-#                     handlers=self.handlers,
-#                     inheritable_handlers=self.inheritable_handlers,
-#                     parent_run_id=self.parent_run_id,
-#                     tags=self.tags,
-#                     inheritable_tags=self.inheritable_tags,
-#                     metadata=self.metadata,
-#                     inheritable_metadata=self.inheritable_metadata,
-#                 )
-#             )
-#
-#         return managers
-#
-#     @classmethod
-#     def configure(
-#             cls,
-#             inheritable_callbacks: Callbacks = None,
-#             local_callbacks: Callbacks = None,
-#             verbose: bool = False,
-#             inheritable_tags: Optional[List[str]] = None,
-#             local_tags: Optional[List[str]] = None,
-#             inheritable_metadata: Optional[Dict[str, Any]] = None,
-#             local_metadata: Optional[Dict[str, Any]] = None,
-#     ) -> CallbackManager:
-#         """Configure the callback manager.
-#
-#         Args:
-#             inheritable_callbacks (Optional[Callbacks], optional): The inheritable
-#                 callbacks. Defaults to None.
-#             local_callbacks (Optional[Callbacks], optional): The local callbacks.
-#                 Defaults to None.
-#             verbose (bool, optional): Whether to enable verbose mode. Defaults to False.
-#             inheritable_tags (Optional[List[str]], optional): The inheritable tags.
-#                 Defaults to None.
-#             local_tags (Optional[List[str]], optional): The local tags.
-#                 Defaults to None.
-#             inheritable_metadata (Optional[Dict[str, Any]], optional): The inheritable
-#                 metadata. Defaults to None.
-#             local_metadata (Optional[Dict[str, Any]], optional): The local metadata.
-#                 Defaults to None.
-#
-#         Returns:
-#             CallbackManager: The configured callback manager.
-#         """
-#         return _configure(
-#             cls,
-#             inheritable_callbacks,
-#             local_callbacks,
-#             verbose,
-#             inheritable_tags,
-#             local_tags,
-#             inheritable_metadata,
-#             local_metadata,
-#         )
-#
-#
-# T = TypeVar("T", CallbackManager, AsyncCallbackManager)
-#
-# H = TypeVar("H", bound=BaseCallbackHandler, covariant=True)
-#
-#
-# def _configure(
-#         callback_manager_cls: Type[T],
-#         inheritable_callbacks: Callbacks = None,
-#         local_callbacks: Callbacks = None,
-#         verbose: bool = False,
-#         inheritable_tags: Optional[List[str]] = None,
-#         local_tags: Optional[List[str]] = None,
-#         inheritable_metadata: Optional[Dict[str, Any]] = None,
-#         local_metadata: Optional[Dict[str, Any]] = None,
-# ) -> T:
-#     """Configure the callback manager.
-#
-#         Args:
-#             callback_manager_cls (Type[T]): The callback manager class.
-#             inheritable_callbacks (Optional[Callbacks], optional): The inheritable
-#                 callbacks. Defaults to None.
-#             local_callbacks (Optional[Callbacks], optional): The local callbacks.
-#                 Defaults to None.
-#             verbose (bool, optional): Whether to enable verbose mode. Defaults to False.
-#             inheritable_tags (Optional[List[str]], optional): The inheritable tags.
-#                 Defaults to None.
-#             local_tags (Optional[List[str]], optional): The local tags. Defaults to None.
-#             inheritable_metadata (Optional[Dict[str, Any]], optional): The inheritable
-#                 metadata. Defaults to None.
-#             local_metadata (Optional[Dict[str, Any]], optional): The local metadata.
-#                 Defaults to None.
-#
-#         Returns:
-#             T: The configured callback manager.
-#         """
-#     from langchain_core.tracers.context import (
-#         _configure_hooks,
-#         _get_tracer_project,
-#         _tracing_v2_is_enabled,
-#         tracing_callback_var,
-#         tracing_v2_callback_var,
-#     )
-#
-#     run_tree = get_run_tree_context()
-#     parent_run_id = None if run_tree is None else getattr(run_tree, "id")
-#     callback_manager = callback_manager_cls(handlers=[], parent_run_id=parent_run_id)
-#     if inheritable_callbacks or local_callbacks:
-#         if isinstance(inheritable_callbacks, list) or inheritable_callbacks is None:
-#             inheritable_callbacks_ = inheritable_callbacks or []
-#             callback_manager = callback_manager_cls(
-#                 handlers=inheritable_callbacks_.copy(),
-#                 inheritable_handlers=inheritable_callbacks_.copy(),
-#                 parent_run_id=parent_run_id,
-#             )
-#         else:
-#             callback_manager = callback_manager_cls(
-#                 handlers=inheritable_callbacks.handlers.copy(),
-#                 inheritable_handlers=inheritable_callbacks.inheritable_handlers.copy(),
-#                 parent_run_id=inheritable_callbacks.parent_run_id,
-#                 tags=inheritable_callbacks.tags.copy(),
-#                 inheritable_tags=inheritable_callbacks.inheritable_tags.copy(),
-#                 metadata=inheritable_callbacks.metadata.copy(),
-#                 inheritable_metadata=inheritable_callbacks.inheritable_metadata.copy(),
-#             )
-#         local_handlers_ = (
-#             local_callbacks
-#             if isinstance(local_callbacks, list)
-#             else (local_callbacks.handlers if local_callbacks else [])
-#         )
-#         for handler in local_handlers_:
-#             callback_manager.add_handler(handler, False)
-#     if inheritable_tags or local_tags:
-#         callback_manager.add_tags(inheritable_tags or [])
-#         callback_manager.add_tags(local_tags or [], False)
-#     if inheritable_metadata or local_metadata:
-#         callback_manager.add_metadata(inheritable_metadata or {})
-#         callback_manager.add_metadata(local_metadata or {}, False)
-#
-#     tracer = tracing_callback_var.get()
-#     tracing_enabled_ = (
-#             env_var_is_set("LANGCHAIN_TRACING")
-#             or tracer is not None
-#             or env_var_is_set("LANGCHAIN_HANDLER")
-#     )
-#
-#     tracer_v2 = tracing_v2_callback_var.get()
-#     tracing_v2_enabled_ = _tracing_v2_is_enabled()
-#     tracer_project = _get_tracer_project()
-#     debug = _get_debug()
-#     if verbose or debug or tracing_enabled_ or tracing_v2_enabled_:
-#         from langchain_core.tracers.langchain import LangChainTracer
-#         from langchain_core.tracers.langchain_v1 import LangChainTracerV1
-#         from langchain_core.tracers.stdout import ConsoleCallbackHandler
-#
-#         if verbose and not any(
-#                 isinstance(handler, StdOutCallbackHandler)
-#                 for handler in callback_manager.handlers
-#         ):
-#             if debug:
-#                 pass
-#             else:
-#                 callback_manager.add_handler(StdOutCallbackHandler(), False)
-#         if debug and not any(
-#                 isinstance(handler, ConsoleCallbackHandler)
-#                 for handler in callback_manager.handlers
-#         ):
-#             callback_manager.add_handler(ConsoleCallbackHandler(), True)
-#         if tracing_enabled_ and not any(
-#                 isinstance(handler, LangChainTracerV1)
-#                 for handler in callback_manager.handlers
-#         ):
-#             if tracer:
-#                 callback_manager.add_handler(tracer, True)
-#             else:
-#                 handler = LangChainTracerV1()
-#                 handler.load_session(tracer_project)
-#                 callback_manager.add_handler(handler, True)
-#         if tracing_v2_enabled_ and not any(
-#                 isinstance(handler, LangChainTracer)
-#                 for handler in callback_manager.handlers
-#         ):
-#             if tracer_v2:
-#                 callback_manager.add_handler(tracer_v2, True)
-#             else:
-#                 try:
-#                     handler = LangChainTracer(project_name=tracer_project)
-#                     callback_manager.add_handler(handler, True)
-#                 except Exception as e:
-#                     logger.warning(
-#                         "Unable to load requested LangChainTracer."
-#                         " To disable this warning,"
-#                         " unset the LANGCHAIN_TRACING_V2 environment variables.",
-#                         e,
-#                     )
-#     for var, inheritable, handler_class, env_var in _configure_hooks:
-#         create_one = (
-#                 env_var is not None
-#                 and env_var_is_set(env_var)
-#                 and handler_class is not None
-#         )
-#         if var.get() is not None or create_one:
-#             var_handler = var.get() or cast(Type[BaseCallbackHandler], handler_class)()
-#             if handler_class is None:
-#                 if not any(
-#                         handler is var_handler  # direct pointer comparison
-#                         for handler in callback_manager.handlers
-#                 ):
-#                     callback_manager.add_handler(var_handler, inheritable)
-#             else:
-#                 if not any(
-#                         isinstance(handler, handler_class)
-#                         for handler in callback_manager.handlers
-#                 ):
-#                     callback_manager.add_handler(var_handler, inheritable)
-#     return callback_manager
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from contextvars import copy_context
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Optional,
+    Type,
+    TypeVar,
+    cast,
+)
+from uuid import UUID
+
+from tenacity import RetryCallState
+
+from core.callbacks.base import (
+    BaseCallbackHandler,
+    BaseCallbackManager,
+    Callbacks,
+    LLMManagerMixin,
+    RunManagerMixin,
+)
+from core.callbacks.stdout import StdOutCallbackHandler
+from core.outputs.generation import GenerationChunk
+from core.outputs.llm_results import LLMResult
+from core.runnables.config import get_executor, get_executor_for_config
+
+logger = logging.getLogger(__name__)
+
+
+def handle_event(
+        handlers: List[BaseCallbackHandler],
+        event_name: str,
+        ignore_condition_name: Optional[str],
+        *args: Any,
+        **kwargs: Any,
+) -> None:
+    """Generic event handler for CallbackManager.
+
+    Args:
+        handlers: The list of handlers that will handle the event
+        event_name: The name of the event (e.g., "on_llm_start")
+        ignore_condition_name: Name of the attribute defined on handler
+            that if True will cause the handler to be skipped for the given event
+        *args: The arguments to pass to the event handler
+        **kwargs: The keyword arguments to pass to the event handler
+    """
+    coros: List[Coroutine[Any, Any, Any]] = []
+
+    try:
+        for handler in handlers:
+            try:
+                if ignore_condition_name is None or not getattr(
+                        handler, ignore_condition_name
+                ):
+                    event = getattr(handler, event_name)(*args, **kwargs)
+                    if asyncio.iscoroutine(event):
+                        coros.append(event)
+            except NotImplementedError as e:
+                handler_name = handler.__class__.__name__
+                logger.warning(
+                    f"NotImplementedError in {handler_name}.{event_name}"
+                    f" callback: {repr(e)}"
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Error in {handler.__class__.__name__}.{event_name} callback:"
+                    f" {repr(e)}"
+                )
+                if handler.raise_error:
+                    raise e
+    finally:
+        if coros:
+            try:
+                # Raises RuntimeError if there is no current event loop.
+                asyncio.get_running_loop()
+                loop_running = True
+            except RuntimeError:
+                loop_running = False
+
+            if loop_running:
+                # If we try to submit this coroutine to the running loop
+                # we end up in a deadlock, as we'd have gotten here from a
+                # running coroutine, which we cannot interrupt to run this one.
+                # The solution is to create a new loop in another thread. Called
+                # from a callbacks thread, e.g. by a nested run, this is a
+                # temporary thread, so the shared pool cannot deadlock.
+                with get_executor_for_config(None, "callbacks") as executor:
+                    executor.submit(
+                        cast(Callable, copy_context().run), _run_coros, coros
+                    ).result()
+            else:
+                _run_coros(coros)
+
+
+def _run_coros(coros: List[Coroutine[Any, Any, Any]]) -> None:
+    # Each coroutine runs in its own event loop, errors are only logged.
+    for coro in coros:
+        try:
+            asyncio.run(coro)
+        except Exception as e:
+            logger.warning(f"Error in callback coroutine: {repr(e)}")
+
+
+async def _ahandle_event_for_handler(
+        handler: BaseCallbackHandler,
+        event_name: str,
+        ignore_condition_name: Optional[str],
+        *args: Any,
+        **kwargs: Any,
+) -> None:
+    try:
+        if ignore_condition_name is None or not getattr(handler, ignore_condition_name):
+            event = getattr(handler, event_name)
+            if asyncio.iscoroutinefunction(event):
+                await event(*args, **kwargs)
+            elif handler.run_inline:
+                event(*args, **kwargs)
+            else:
+                await asyncio.get_running_loop().run_in_executor(
+                    get_executor("callbacks"),
+                    cast(
+                        Callable,
+                        copy_context().run,
+                    ),
+                    lambda: event(*args, **kwargs),
+                )
+    except NotImplementedError as e:
+        logger.warning(
+            f"NotImplementedError in {handler.__class__.__name__}.{event_name}"
+            f" callback: {repr(e)}"
+        )
+    except Exception as e:
+        logger.warning(
+            f"Error in {handler.__class__.__name__}.{event_name} callback:"
+            f" {repr(e)}"
+        )
+        if handler.raise_error:
+            raise e
+
+
+async def ahandle_event(
+        handlers: List[BaseCallbackHandler],
+        event_name: str,
+        ignore_condition_name: Optional[str],
+        *args: Any,
+        **kwargs: Any,
+) -> None:
+    """Generic event handler for AsyncCallbackManager.
+
+    Handlers marked ``run_inline`` are run in order first, the others
+    concurrently.
+
+    Args:
+        handlers: The list of handlers that will handle the event
+        event_name: The name of the event (e.g., "on_llm_start")
+        ignore_condition_name: Name of the attribute defined on handler
+            that if True will cause the handler to be skipped for the given event
+        *args: The arguments to pass to the event handler
+        **kwargs: The keyword arguments to pass to the event handler
+    """
+    for handler in [h for h in handlers if h.run_inline]:
+        await _ahandle_event_for_handler(
+            handler, event_name, ignore_condition_name, *args, **kwargs
+        )
+    await asyncio.gather(
+        *(
+            _ahandle_event_for_handler(
+                handler, event_name, ignore_condition_name, *args, **kwargs
+            )
+            for handler in handlers
+            if not handler.run_inline
+        )
+    )
+
+
+BRM = TypeVar("BRM", bound="BaseRunManager")
+
+
+class BaseRunManager(RunManagerMixin):
+    """Base class for run manager (a bound callback manager)."""
+
+    def __init__(
+            self,
+            *,
+            run_id: UUID,
+            handlers: List[BaseCallbackHandler],
+            inheritable_handlers: List[BaseCallbackHandler],
+            parent_run_id: Optional[UUID] = None,
+            tags: Optional[List[str]] = None,
+            inheritable_tags: Optional[List[str]] = None,
+            metadata: Optional[Dict[str, Any]] = None,
+            inheritable_metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Initialize the run manager.
+
+        Args:
+            run_id (UUID): The ID of the run.
+            handlers (List[BaseCallbackHandler]): The list of handlers.
+            inheritable_handlers (List[BaseCallbackHandler]):
+                The list of inheritable handlers.
+            parent_run_id (UUID, optional): The ID of the parent run.
+                Defaults to None.
+            tags (Optional[List[str]]): The list of tags.
+            inheritable_tags (Optional[List[str]]): The list of inheritable tags.
+            metadata (Optional[Dict[str, Any]]): The metadata.
+            inheritable_metadata (Optional[Dict[str, Any]]): The inheritable metadata.
+        """
+        self.run_id = run_id
+        self.handlers = handlers
+        self.inheritable_handlers = inheritable_handlers
+        self.parent_run_id = parent_run_id
+        self.tags = tags or []
+        self.inheritable_tags = inheritable_tags or []
+        self.metadata = metadata or {}
+        self.inheritable_metadata = inheritable_metadata or {}
+
+    @classmethod
+    def get_noop_manager(cls: Type[BRM]) -> BRM:
+        """Return a manager that doesn't perform any operations.
+
+        Returns:
+            BaseRunManager: The noop manager.
+        """
+        return cls(
+            run_id=uuid.uuid4(),
+            handlers=[],
+            inheritable_handlers=[],
+            tags=[],
+            inheritable_tags=[],
+            metadata={},
+            inheritable_metadata={},
+        )
+
+
+class RunManager(BaseRunManager):
+    """Sync Run Manager."""
+
+    def on_text(
+            self,
+            text: str,
+            **kwargs: Any,
+    ) -> Any:
+        """Run when text is received.
+
+        Args:
+            text (str): The received text.
+
+        Returns:
+            Any: The result of the callback.
+        """
+        handle_event(
+            self.handlers,
+            "on_text",
+            None,
+            text,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+    def on_retry(
+            self,
+            retry_state: RetryCallState,
+            **kwargs: Any,
+    ) -> None:
+        """Run when a request is about to be retried.
+
+        Args:
+            retry_state (RetryCallState): The retry state.
+        """
+        handle_event(
+            self.handlers,
+            "on_retry",
+            "ignore_retry",
+            retry_state,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+
+class AsyncRunManager(BaseRunManager):
+    """Async Run Manager."""
+
+    async def on_text(
+            self,
+            text: str,
+            **kwargs: Any,
+    ) -> Any:
+        """Run when text is received.
+
+        Args:
+            text (str): The received text.
+
+        Returns:
+            Any: The result of the callback.
+        """
+        await ahandle_event(
+            self.handlers,
+            "on_text",
+            None,
+            text,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+    async def on_retry(
+            self,
+            retry_state: RetryCallState,
+            **kwargs: Any,
+    ) -> None:
+        """Run when a request is about to be retried.
+
+        Args:
+            retry_state (RetryCallState): The retry state.
+        """
+        await ahandle_event(
+            self.handlers,
+            "on_retry",
+            "ignore_retry",
+            retry_state,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+
+class CallbackManagerForLLMRun(RunManager, LLMManagerMixin):
+    """Callback manager for LLM run."""
+
+    def on_llm_new_token(
+            self,
+            token: str,
+            *,
+            chunk: Optional[GenerationChunk] = None,
+            **kwargs: Any,
+    ) -> None:
+        """Run when LLM generates a new token.
+
+        Args:
+            token (str): The new token.
+            chunk (GenerationChunk, optional): The chunk the token belongs to.
+        """
+        handle_event(
+            self.handlers,
+            "on_llm_new_token",
+            "ignore_llm",
+            token,
+            chunk=chunk,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        """Run when LLM ends running.
+
+        Args:
+            response (LLMResult): The LLM result.
+        """
+        handle_event(
+            self.handlers,
+            "on_llm_end",
+            "ignore_llm",
+            response,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+    def on_llm_error(
+            self,
+            error: BaseException,
+            **kwargs: Any,
+    ) -> None:
+        """Run when LLM errors.
+
+        Args:
+            error (Exception or KeyboardInterrupt): The error.
+            kwargs (Any): Additional keyword arguments.
+                - response (LLMResult): The response which was generated before
+                    the error occurred.
+        """
+        handle_event(
+            self.handlers,
+            "on_llm_error",
+            "ignore_llm",
+            error,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+
+class AsyncCallbackManagerForLLMRun(AsyncRunManager, LLMManagerMixin):
+    """Async callback manager for LLM run."""
+
+    def get_sync(self) -> CallbackManagerForLLMRun:
+        """Get the equivalent sync RunManager.
+
+        Returns:
+            CallbackManagerForLLMRun: The sync RunManager.
+        """
+        return CallbackManagerForLLMRun(
+            run_id=self.run_id,
+            handlers=self.handlers,
+            inheritable_handlers=self.inheritable_handlers,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            inheritable_tags=self.inheritable_tags,
+            metadata=self.metadata,
+            inheritable_metadata=self.inheritable_metadata,
+        )
+
+    async def on_llm_new_token(
+            self,
+            token: str,
+            *,
+            chunk: Optional[GenerationChunk] = None,
+            **kwargs: Any,
+    ) -> None:
+        """Run when LLM generates a new token.
+
+        Args:
+            token (str): The new token.
+            chunk (GenerationChunk, optional): The chunk the token belongs to.
+        """
+        await ahandle_event(
+            self.handlers,
+            "on_llm_new_token",
+            "ignore_llm",
+            token,
+            chunk=chunk,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        """Run when LLM ends running.
+
+        Args:
+            response (LLMResult): The LLM result.
+        """
+        await ahandle_event(
+            self.handlers,
+            "on_llm_end",
+            "ignore_llm",
+            response,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+    async def on_llm_error(
+            self,
+            error: BaseException,
+            **kwargs: Any,
+    ) -> None:
+        """Run when LLM errors.
+
+        Args:
+            error (Exception or KeyboardInterrupt): The error.
+            kwargs (Any): Additional keyword arguments.
+                - response (LLMResult): The response which was generated before
+                    the error occurred.
+        """
+        await ahandle_event(
+            self.handlers,
+            "on_llm_error",
+            "ignore_llm",
+            error,
+            run_id=self.run_id,
+            parent_run_id=self.parent_run_id,
+            tags=self.tags,
+            **kwargs,
+        )
+
+
+class CallbackManager(BaseCallbackManager):
+    """Callback manager that handles callbacks from the framework."""
+
+    def on_llm_start(
+            self,
+            serialized: Dict[str, Any],
+            prompts: List[str],
+            run_id: Optional[UUID] = None,
+            **kwargs: Any,
+    ) -> List[CallbackManagerForLLMRun]:
+        """Run when LLM starts running.
+
+        Args:
+            serialized (Dict[str, Any]): The serialized LLM.
+            prompts (List[str]): The list of prompts.
+            run_id (UUID, optional): The ID of the run. Defaults to None.
+
+        Returns:
+            List[CallbackManagerForLLMRun]: A callback manager for each
+                prompt as an LLM run.
+        """
+        managers = []
+        for i, prompt in enumerate(prompts):
+            # Can't have duplicate runs with the same run ID (if provided)
+            run_id_ = run_id if i == 0 and run_id is not None else uuid.uuid4()
+            handle_event(
+                self.handlers,
+                "on_llm_start",
+                "ignore_llm",
+                serialized,
+                [prompt],
+                run_id=run_id_,
+                parent_run_id=self.parent_run_id,
+                tags=self.tags,
+                metadata=self.metadata,
+                **kwargs,
+            )
+
+            managers.append(
+                CallbackManagerForLLMRun(
+                    run_id=run_id_,
+                    handlers=self.handlers,
+                    inheritable_handlers=self.inheritable_handlers,
+                    parent_run_id=self.parent_run_id,
+                    tags=self.tags,
+                    inheritable_tags=self.inheritable_tags,
+                    metadata=self.metadata,
+                    inheritable_metadata=self.inheritable_metadata,
+                )
+            )
+
+        return managers
+
+    @classmethod
+    def configure(
+            cls,
+            inheritable_callbacks: Callbacks = None,
+            local_callbacks: Callbacks = None,
+            verbose: bool = False,
+            inheritable_tags: Optional[List[str]] = None,
+            local_tags: Optional[List[str]] = None,
+            inheritable_metadata: Optional[Dict[str, Any]] = None,
+            local_metadata: Optional[Dict[str, Any]] = None,
+    ) -> CallbackManager:
+        """Configure the callback manager.
+
+        Args:
+            inheritable_callbacks (Optional[Callbacks], optional): The inheritable
+                callbacks. Defaults to None.
+            local_callbacks (Optional[Callbacks], optional): The local callbacks.
+                Defaults to None.
+            verbose (bool, optional): Whether to enable verbose mode. Defaults to False.
+            inheritable_tags (Optional[List[str]], optional): The inheritable tags.
+                Defaults to None.
+            local_tags (Optional[List[str]], optional): The local tags.
+                Defaults to None.
+            inheritable_metadata (Optional[Dict[str, Any]], optional): The inheritable
+                metadata. Defaults to None.
+            local_metadata (Optional[Dict[str, Any]], optional): The local metadata.
+                Defaults to None.
+
+        Returns:
+            CallbackManager: The configured callback manager.
+        """
+        return _configure(
+            cls,
+            inheritable_callbacks,
+            local_callbacks,
+            verbose,
+            inheritable_tags,
+            local_tags,
+            inheritable_metadata,
+            local_metadata,
+        )
+
+
+class AsyncCallbackManager(BaseCallbackManager):
+    """Async callback manager that handles callbacks from the framework."""
+
+    @property
+    def is_async(self) -> bool:
+        """Return whether the handler is async."""
+        return True
+
+    async def on_llm_start(
+            self,
+            serialized: Dict[str, Any],
+            prompts: List[str],
+            run_id: Optional[UUID] = None,
+            **kwargs: Any,
+    ) -> List[AsyncCallbackManagerForLLMRun]:
+        """Run when LLM starts running.
+
+        Args:
+            serialized (Dict[str, Any]): The serialized LLM.
+            prompts (List[str]): The list of prompts.
+            run_id (UUID, optional): The ID of the run. Defaults to None.
+
+        Returns:
+            List[AsyncCallbackManagerForLLMRun]: The list of async
+                callback managers, one for each LLM Run corresponding
+                to each prompt.
+        """
+        tasks = []
+        managers = []
+
+        for i, prompt in enumerate(prompts):
+            run_id_ = run_id if i == 0 and run_id is not None else uuid.uuid4()
+
+            tasks.append(
+                ahandle_event(
+                    self.handlers,
+                    "on_llm_start",
+                    "ignore_llm",
+                    serialized,
+                    [prompt],
+                    run_id=run_id_,
+                    parent_run_id=self.parent_run_id,
+                    tags=self.tags,
+                    metadata=self.metadata,
+                    **kwargs,
+                )
+            )
+
+            managers.append(
+                AsyncCallbackManagerForLLMRun(
+                    run_id=run_id_,
+                    handlers=self.handlers,
+                    inheritable_handlers=self.inheritable_handlers,
+                    parent_run_id=self.parent_run_id,
+                    tags=self.tags,
+                    inheritable_tags=self.inheritable_tags,
+                    metadata=self.metadata,
+                    inheritable_metadata=self.inheritable_metadata,
+                )
+            )
+
+        await asyncio.gather(*tasks)
+
+        return managers
+
+    @classmethod
+    def configure(
+            cls,
+            inheritable_callbacks: Callbacks = None,
+            local_callbacks: Callbacks = None,
+            verbose: bool = False,
+            inheritable_tags: Optional[List[str]] = None,
+            local_tags: Optional[List[str]] = None,
+            inheritable_metadata: Optional[Dict[str, Any]] = None,
+            local_metadata: Optional[Dict[str, Any]] = None,
+    ) -> AsyncCallbackManager:
+        """Configure the async callback manager.
+
+        Args:
+            inheritable_callbacks (Optional[Callbacks], optional): The inheritable
+                callbacks. Defaults to None.
+            local_callbacks (Optional[Callbacks], optional): The local callbacks.
+                Defaults to None.
+            verbose (bool, optional): Whether to enable verbose mode. Defaults to False.
+            inheritable_tags (Optional[List[str]], optional): The inheritable tags.
+                Defaults to None.
+            local_tags (Optional[List[str]], optional): The local tags.
+                Defaults to None.
+            inheritable_metadata (Optional[Dict[str, Any]], optional): The inheritable
+                metadata. Defaults to None.
+            local_metadata (Optional[Dict[str, Any]], optional): The local metadata.
+                Defaults to None.
+
+        Returns:
+            AsyncCallbackManager: The configured async callback manager.
+        """
+        return _configure(
+            cls,
+            inheritable_callbacks,
+            local_callbacks,
+            verbose,
+            inheritable_tags,
+            local_tags,
+            inheritable_metadata,
+            local_metadata,
+        )
+
+
+T = TypeVar("T", CallbackManager, AsyncCallbackManager)
+
+
+def _configure(
+        callback_manager_cls: Type[T],
+        inheritable_callbacks: Callbacks = None,
+        local_callbacks: Callbacks = None,
+        verbose: bool = False,
+        inheritable_tags: Optional[List[str]] = None,
+        local_tags: Optional[List[str]] = None,
+        inheritable_metadata: Optional[Dict[str, Any]] = None,
+        local_metadata: Optional[Dict[str, Any]] = None,
+) -> T:
+    """Configure the callback manager.
+
+        Args:
+            callback_manager_cls (Type[T]): The callback manager class.
+            inheritable_callbacks (Optional[Callbacks], optional): The inheritable
+                callbacks. Defaults to None.
+            local_callbacks (Optional[Callbacks], optional): The local callbacks.
+                Defaults to None.
+            verbose (bool, optional): Whether to enable verbose mode. Defaults to False.
+            inheritable_tags (Optional[List[str]], optional): The inheritable tags.
+                Defaults to None.
+            local_tags (Optional[List[str]], optional): The local tags. Defaults to None.
+            inheritable_metadata (Optional[Dict[str, Any]], optional): The inheritable
+                metadata. Defaults to None.
+            local_metadata (Optional[Dict[str, Any]], optional): The local metadata.
+                Defaults to None.
+
+        Returns:
+            T: The configured callback manager.
+        """
+    callback_manager = callback_manager_cls(handlers=[])
+    if inheritable_callbacks or local_callbacks:
+        if isinstance(inheritable_callbacks, list) or inheritable_callbacks is None:
+            inheritable_callbacks_ = inheritable_callbacks or []
+            callback_manager = callback_manager_cls(
+                handlers=inheritable_callbacks_.copy(),
+                inheritable_handlers=inheritable_callbacks_.copy(),
+            )
+        else:
+            callback_manager = callback_manager_cls(
+                handlers=inheritable_callbacks.handlers.copy(),
+                inheritable_handlers=inheritable_callbacks.inheritable_handlers.copy(),
+                parent_run_id=inheritable_callbacks.parent_run_id,
+                tags=inheritable_callbacks.tags.copy(),
+                inheritable_tags=inheritable_callbacks.inheritable_tags.copy(),
+                metadata=inheritable_callbacks.metadata.copy(),
+                inheritable_metadata=inheritable_callbacks.inheritable_metadata.copy(),
+            )
+        local_handlers_ = (
+            local_callbacks
+            if isinstance(local_callbacks, list)
+            else (local_callbacks.handlers if local_callbacks else [])
+        )
+        for handler in local_handlers_:
+            callback_manager.add_handler(handler, False)
+    if inheritable_tags or local_tags:
+        callback_manager.add_tags(inheritable_tags or [])
+        callback_manager.add_tags(local_tags or [], False)
+    if inheritable_metadata or local_metadata:
+        callback_manager.add_metadata(inheritable_metadata or {})
+        callback_manager.add_metadata(local_metadata or {}, False)
+
+    if verbose and not any(
+            isinstance(handler, StdOutCallbackHandler)
+            for handler in callback_manager.handlers
+    ):
+        callback_manager.add_handler(StdOutCallbackHandler(), False)
+
+    return callback_manager
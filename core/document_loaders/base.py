@@ -5,6 +5,7 @@ from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING, AsyncIterator, Iterator, List, Optional
 
 from core.documents.base import Document
+from core.documents.batch import DocumentBatch
 
 # from langchain_core.runnables import run_in_executor
 
@@ -61,6 +62,28 @@ class BaseLoader(ABC):
         docs = self.load()
         return _text_splitter.split_documents(docs)
 
+    def load_batch(self) -> DocumentBatch:
+        """Load data into a DocumentBatch, without keeping a Document per item."""
+        return DocumentBatch(self.lazy_load())
+
+    def load_and_split_batch(
+        self, text_splitter: Optional[TextSplitter] = None
+    ) -> DocumentBatch:
+        """Load Documents and split them into a DocumentBatch of chunks.
+
+        Unlike ``load_and_split``, documents are split as they are loaded, and
+        the chunks are stored column by column.
+
+        Args:
+            text_splitter: TextSplitter instance to use for splitting documents.
+              Defaults to RecursiveCharacterTextSplitter.
+        """
+        if text_splitter is None:
+            from core.text_splitters.character import RecursiveCharacterTextSplitter
+
+            text_splitter = RecursiveCharacterTextSplitter()
+        return text_splitter.split_documents_to_batch(self.lazy_load())
+
     # Attention: This method will be upgraded into an abstractmethod once it's
     #            implemented in all the existing subclasses.
     def lazy_load(self) -> Iterator[Document]:
@@ -1,9 +1,19 @@
 from abc import ABC, abstractmethod
 from collections.abc import Iterator
-from typing import List
+from functools import partial
+from typing import Iterable, List, Optional
 
 from core.document_loaders.blob_loaders import Blob
 from core.documents.base import Document
+from core.documents.batch import DocumentBatch, DocumentBatchBuilder
+from core.runnables.config import RunnableConfig, get_executor_for_config
+
+
+def _parse_blob(parser: "BaseBlobParser", blob: Blob) -> DocumentBatch:
+    """Parse one blob, possibly in a worker process."""
+    builder = DocumentBatchBuilder()
+    builder.extend(parser.lazy_parse(blob))
+    return builder.build()
 
 
 class BaseBlobParser(ABC):
@@ -45,3 +55,30 @@ class BaseBlobParser(ABC):
             List of documents
         """
         return list(self.lazy_parse(blob))
+
+    def parse_batch(
+        self, blobs: Iterable[Blob], config: Optional[RunnableConfig] = None
+    ) -> DocumentBatch:
+        """Parse blobs into a single DocumentBatch, keeping the order of the blobs.
+
+        With ``config["executor"] == "process"``, the blobs are parsed in worker
+        processes, which suits CPU-bound parsers such as PDF parsing. The parser
+        and the blobs must then be picklable; blobs loaded from a path are sent
+        as the path and read by the worker.
+
+        Args:
+            blobs: Blob instances
+            config: Optional config selecting the executor
+
+        Returns:
+            The documents of all the blobs
+        """
+        if config and config.get("executor") == "process":
+            with get_executor_for_config(config, allow_process=True) as executor:
+                return DocumentBatch.concat(
+                    executor.map(partial(_parse_blob, self), blobs)
+                )
+        builder = DocumentBatchBuilder()
+        for blob in blobs:
+            builder.extend(self.lazy_parse(blob))
+        return builder.build()
@@ -21,11 +21,10 @@ class PyPDFParser(BaseBlobParser):
         with blob.as_bytes_io() as pdf_file_obj:
             pdf_reader = pypdf.PdfReader(pdf_file_obj, password=self.password)
             yield from [
-                Document(
-                    page_content=page.extract_text()
+                Document.construct_trusted(
+                    page.extract_text(),
                     #+ self._extract_images_from_page(page)
-                ,
-                    metadata={"source": blob.source, "page": page_number},
+                    {"source": blob.source, "page": page_number},
                 )
                 for page_number, page in enumerate(pdf_reader.pages)
             ]
@@ -0,0 +1,4 @@
+from core.documents.base import Document
+from core.documents.batch import DocumentBatch, DocumentBatchBuilder
+
+__all__ = ["Document", "DocumentBatch", "DocumentBatchBuilder"]
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, List, Literal
+from typing import Any, List, Literal, Optional
 from pydantic.v1 import Field, BaseModel
 
 
@@ -19,6 +19,36 @@ class Document(BaseModel):
         """Pass page_content in as positional or named arg."""
         super().__init__(page_content=page_content, **kwargs)
 
+    @classmethod
+    def construct_trusted(
+            cls, page_content: str, metadata: Optional[dict] = None
+    ) -> Document:
+        """Create a Document from trusted data, skipping validation.
+
+        A fast path for internal producers that build many documents from data
+        known to be valid, such as text splitters and parsers. Several times
+        faster than the constructor. Nothing is checked: ``page_content`` must
+        be a str and ``metadata`` a dict, which is used as is, not copied.
+        """
+        document = cls.__new__(cls)
+        object.__setattr__(
+            document,
+            "__dict__",
+            {
+                "page_content": page_content,
+                "metadata": {} if metadata is None else metadata,
+                "type": "Document",
+            },
+        )
+        object.__setattr__(document, "__fields_set__", {"page_content", "metadata"})
+        return document
+
+    def __reduce__(self) -> Any:
+        # Pickled as its two fields, for the worker processes of a process pool.
+        if type(self) is not Document:
+            return super().__reduce__()
+        return Document.construct_trusted, (self.page_content, self.metadata)
+
 
 if __name__ == '__main__':
     d = Document(page_content="This is a page", size=10)
@@ -0,0 +1,309 @@
+"""Columnar storage for large numbers of documents."""
+from __future__ import annotations
+
+import copy
+from array import array
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    overload,
+)
+
+from core.documents.base import Document
+
+# Metadata values of these types are handed out as stored; others are copied.
+_IMMUTABLE_TYPES = frozenset({str, int, float, bool, bytes, type(None)})
+
+
+def _copy_value(value: Any) -> Any:
+    if type(value) in _IMMUTABLE_TYPES:
+        return value
+    return copy.deepcopy(value)
+
+
+class _MetadataColumn:
+    """Values of one metadata key, one id per row into a table of unique values."""
+
+    __slots__ = ("values", "ids", "_index")
+
+    def __init__(self, rows: int) -> None:
+        # Id 0 means the row has no value for the key.
+        self.values: List[Any] = [None]
+        self.ids = array("I", [0]) * rows
+        self._index: Dict[Tuple[type, Hashable], int] = {}
+
+    def intern(self, value: Any) -> int:
+        """Get the id of ``value``, adding it to the values if it is new."""
+        try:
+            # Keyed by type as well, so that 1, 1.0 and True stay apart.
+            key = (type(value), value)
+            value_id = self._index.get(key)
+        except TypeError:
+            # Unhashable values are stored once per row.
+            key, value_id = None, None
+        if value_id is None:
+            value_id = len(self.values)
+            self.values.append(value)
+            if key is not None:
+                self._index[key] = value_id
+        return value_id
+
+    def append(self, value: Any) -> None:
+        self.ids.append(self.intern(value))
+
+    def append_missing(self, rows: int = 1) -> None:
+        if rows == 1:
+            self.ids.append(0)
+        else:
+            self.ids.extend(array("I", [0]) * rows)
+
+
+class DocumentBatchBuilder:
+    """Accumulates documents for a ``DocumentBatch``.
+
+    Example:
+        .. code-block:: python
+
+            builder = DocumentBatchBuilder()
+            for page_number, text in enumerate(pages):
+                builder.append(text, {"source": path, "page": page_number})
+            batch = builder.build()
+    """
+
+    def __init__(self) -> None:
+        self._texts: List[str] = []
+        self._offsets = array("q", [0])
+        self._columns: Dict[str, _MetadataColumn] = {}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def append(self, page_content: str, metadata: Optional[dict] = None) -> None:
+        """Add a document.
+
+        The metadata values are stored, not the dict; mutable values are shared
+        with the caller.
+        """
+        rows = len(self._texts)
+        self._texts.append(page_content)
+        self._offsets.append(self._offsets[-1] + len(page_content))
+        metadata = metadata or {}
+        for key, value in metadata.items():
+            column = self._columns.get(key)
+            if column is None:
+                column = self._columns[key] = _MetadataColumn(rows)
+            column.append(value)
+        if len(metadata) < len(self._columns):
+            for key, column in self._columns.items():
+                if key not in metadata:
+                    column.append_missing()
+
+    def extend(self, documents: Iterable[Document]) -> None:
+        """Add documents."""
+        for document in documents:
+            self.append(document.page_content, document.metadata)
+
+    def build(self) -> DocumentBatch:
+        """Build the batch. The builder should not be used afterwards."""
+        text = "".join(self._texts)
+        self._texts = []
+        columns = {
+            key: (column.values, column.ids) for key, column in self._columns.items()
+        }
+        return DocumentBatch._from_columns(text, self._offsets, columns)
+
+
+class DocumentBatch(Sequence[Document]):
+    """An immutable sequence of documents stored column by column.
+
+    The texts of all documents are stored as one string with an array of
+    offsets, and each metadata key as a column of ids into its distinct values.
+    A document costs a few bytes per metadata key on top of its text, instead
+    of a pydantic object, a dict and a string of its own.
+
+    ``Document`` objects are created on demand when the batch is indexed or
+    iterated. They are independent copies: changing one, including mutable
+    metadata values such as lists, does not change the batch or other
+    documents. Slices are views that share the batch's storage. Use ``texts`` and
+    ``metadata`` to read columns without creating documents.
+
+    Example:
+        .. code-block:: python
+
+            batch = splitter.split_documents_to_batch(loader.lazy_load())
+            for text in batch.texts():
+                ...
+            first_ten = batch[:10]
+    """
+
+    __slots__ = ("_text", "_offsets", "_columns", "_start", "_stop")
+
+    _text: str
+    _offsets: array
+    _columns: Dict[str, Tuple[List[Any], array]]
+    _start: int
+    _stop: int
+
+    def __init__(self, documents: Iterable[Document] = ()) -> None:
+        """Store ``documents`` in a new batch."""
+        builder = DocumentBatchBuilder()
+        builder.extend(documents)
+        batch = builder.build()
+        self._text = batch._text
+        self._offsets = batch._offsets
+        self._columns = batch._columns
+        self._start, self._stop = batch._start, batch._stop
+
+    @classmethod
+    def _from_columns(
+            cls,
+            text: str,
+            offsets: array,
+            columns: Dict[str, Tuple[List[Any], array]],
+            start: int = 0,
+            stop: Optional[int] = None,
+    ) -> DocumentBatch:
+        batch = cls.__new__(cls)
+        batch._text = text
+        batch._offsets = offsets
+        batch._columns = columns
+        batch._start = start
+        batch._stop = len(offsets) - 1 if stop is None else stop
+        return batch
+
+    @classmethod
+    def from_texts(
+            cls, texts: Iterable[str], metadatas: Optional[Iterable[dict]] = None
+    ) -> DocumentBatch:
+        """Create a batch from texts and, optionally, their metadata."""
+        builder = DocumentBatchBuilder()
+        if metadatas is None:
+            for text in texts:
+                builder.append(text)
+        else:
+            for text, metadata in zip(texts, metadatas):
+                builder.append(text, metadata)
+        return builder.build()
+
+    @classmethod
+    def concat(cls, batches: Iterable[DocumentBatch]) -> DocumentBatch:
+        """Join batches into one, in order.
+
+        The new batch stores only the rows of the batches, so concatenating a
+        single slice makes a compact copy of it.
+        """
+        texts: List[str] = []
+        offsets = array("q", [0])
+        columns: Dict[str, _MetadataColumn] = {}
+        rows = 0
+        for batch in batches:
+            start, stop = batch._start, batch._stop
+            begin = batch._offsets[start]
+            texts.append(batch._text[begin:batch._offsets[stop]])
+            shift = offsets[-1] - begin
+            offsets.extend(offset + shift for offset in batch._offsets[start + 1:stop + 1])
+            for key, (values, ids) in batch._columns.items():
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = _MetadataColumn(rows)
+                batch_ids = ids[start:stop]
+                remap = [0] * len(values)
+                for value_id in sorted(set(batch_ids)):
+                    if value_id:
+                        remap[value_id] = column.intern(values[value_id])
+                column.ids.extend(remap[value_id] for value_id in batch_ids)
+            rows += stop - start
+            for key, column in columns.items():
+                if len(column.ids) < rows:
+                    column.append_missing(rows - len(column.ids))
+        return cls._from_columns(
+            "".join(texts),
+            offsets,
+            {key: (column.values, column.ids) for key, column in columns.items()},
+        )
+
+    def __reduce__(self) -> Any:
+        # Pickles the storage, made compact first if this is a slice.
+        batch = self
+        if self._start != 0 or self._stop != len(self._offsets) - 1:
+            batch = DocumentBatch.concat([self])
+        return DocumentBatch._from_columns, (batch._text, batch._offsets, batch._columns)
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def _page_content(self, row: int) -> str:
+        return self._text[self._offsets[row]:self._offsets[row + 1]]
+
+    def _metadata(self, row: int) -> dict:
+        metadata = {}
+        for key, (values, ids) in self._columns.items():
+            value_id = ids[row]
+            if value_id:
+                metadata[key] = _copy_value(values[value_id])
+        return metadata
+
+    def _document(self, row: int) -> Document:
+        return Document.construct_trusted(self._page_content(row), self._metadata(row))
+
+    @overload
+    def __getitem__(self, index: int) -> Document:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> DocumentBatch:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Document, DocumentBatch]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self._from_columns(
+                    self._text,
+                    self._offsets,
+                    self._columns,
+                    self._start + start,
+                    self._start + max(start, stop),
+                )
+            return DocumentBatch(self[i] for i in range(start, stop, step))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("DocumentBatch index out of range")
+        return self._document(self._start + index)
+
+    def __iter__(self) -> Iterator[Document]:
+        for row in range(self._start, self._stop):
+            yield self._document(row)
+
+    def __repr__(self) -> str:
+        return f"DocumentBatch(<{len(self)} documents>)"
+
+    def texts(self) -> Iterator[str]:
+        """Iterate over the page contents, without creating documents."""
+        offsets, text = self._offsets, self._text
+        for row in range(self._start, self._stop):
+            yield text[offsets[row]:offsets[row + 1]]
+
+    def metadata(self, key: str) -> List[Any]:
+        """Get the values of a metadata key, None where a document has none.
+
+        Mutable values are copies, as in documents.
+        """
+        column = self._columns.get(key)
+        if column is None:
+            return [None] * len(self)
+        values, ids = column
+        return [_copy_value(values[i]) for i in ids[self._start:self._stop]]
+
+    def to_documents(self) -> List[Document]:
+        """Create all the documents of the batch."""
+        return list(self)
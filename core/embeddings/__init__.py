@@ -0,0 +1,7 @@
+"""**Embedding models** are wrappers around embedding models
+from different APIs and services.
+"""
+from core.embeddings.embeddings import Embeddings
+from core.embeddings.hashing import HashingEmbeddings
+
+__all__ = ["Embeddings", "HashingEmbeddings"]
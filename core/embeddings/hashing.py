@@ -0,0 +1,49 @@
+"""Embeddings computed locally by feature hashing."""
+import math
+import re
+import zlib
+from typing import List
+
+from core.embeddings.embeddings import Embeddings
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings built with the hashing trick.
+
+    Every lowercased word (and pair of adjacent words) is hashed into one of
+    ``size`` buckets with a +/-1 sign, and the vector is L2-normalized. Texts that
+    share most of their words get a high cosine similarity, which makes it a
+    cheap offline stand-in for a real embedding model, e.g. in tests.
+    """
+
+    def __init__(self, size: int = 256, ngram_range: int = 2) -> None:
+        """Initialize the embedder.
+
+        Args:
+            size: The dimension of the vectors.
+            ngram_range: The longest run of adjacent words hashed as one feature.
+        """
+        if size <= 0:
+            raise ValueError("size must be greater than 0")
+        self.size = size
+        self.ngram_range = ngram_range
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        for n in range(1, self.ngram_range + 1):
+            for i in range(len(tokens) - n + 1):
+                h = zlib.crc32(" ".join(tokens[i:i + n]).encode("utf-8"))
+                vector[h % self.size] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed search docs."""
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed query text."""
+        return self._embed(text)
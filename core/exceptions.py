@@ -46,3 +46,57 @@ class OutputParserException(ValueError, LangChainException):
         self.observation = observation
         self.llm_output = llm_output
         self.send_to_llm = send_to_llm
+
+
+class SideKickAPIError(LangChainException):
+    """Base class for errors returned by, or raised while reaching, the backend."""
+
+
+class APIConnectionError(SideKickAPIError):
+    """The backend could not be reached."""
+
+
+class APITimeoutError(APIConnectionError):
+    """The request to the backend timed out."""
+
+
+class APIStatusError(SideKickAPIError):
+    """The backend answered with an error status code.
+
+    Args:
+        message: The error message.
+        status_code: The HTTP status code of the response.
+        retry_after: Seconds the backend asked the client to wait before retrying,
+            if it sent a ``Retry-After`` header.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        *,
+        status_code: int,
+        retry_after: Optional[float] = None,
+    ):
+        super(APIStatusError, self).__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RateLimitError(APIStatusError):
+    """The backend rejected the request because of rate limiting (429)."""
+
+
+class InternalServerError(APIStatusError):
+    """The backend failed to handle the request (5xx)."""
+
+
+class CircuitOpenError(SideKickAPIError):
+    """The request was not sent because the circuit breaker is open."""
+
+
+class RequestCancelledError(SideKickAPIError):
+    """The request was cancelled before the backend answered."""
+
+
+class DeadlineExceededError(LangChainException, TimeoutError):
+    """The deadline or timeout of the call ran out."""
@@ -0,0 +1,20 @@
+"""Global values and configuration that apply to all of the framework."""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from core.caches import BaseCache
+
+_llm_cache: Optional["BaseCache"] = None
+
+
+def set_llm_cache(value: Optional["BaseCache"]) -> None:
+    """Set a new LLM cache, overwriting the previous value, if any."""
+    global _llm_cache
+    _llm_cache = value
+
+
+def get_llm_cache() -> Optional["BaseCache"]:
+    """Get the value of the `llm_cache` global setting."""
+    return _llm_cache
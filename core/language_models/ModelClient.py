@@ -1,11 +1,952 @@
-from pydantic import BaseModel, Field
+"""HTTP client for the SideKick completion API.
 
+Requests go through keep-alive connection pools that are shared by every client
+with the same host and connection settings, so TCP and TLS setup is paid once
+per connection instead of once per request, across model instances.
+
+The protocol mirrors Anthropic's text completion API: ``POST /v1/complete``
+with a JSON body, answered with a JSON completion or, when streaming, with
+server-sent ``completion`` events.
+"""
+from __future__ import annotations
+
+import asyncio
+import http.client
+import json
+import socket
+import ssl
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+from core.exceptions import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    DeadlineExceededError,
+    InternalServerError,
+    RateLimitError,
+    RequestCancelledError,
+    SideKickAPIError,
+)
+from core.runnables.config import get_deadline
+
+HUMAN_PROMPT = "\n\nHuman:"
+AI_PROMPT = "\n\nAssistant:"
+
+COMPLETIONS_PATH = "/v1/complete"
+
+RETRYABLE_ERRORS: Tuple[Type[SideKickAPIError], ...] = (
+    APIConnectionError,
+    RateLimitError,
+    InternalServerError,
+)
+"""Errors that mean the backend is unavailable or overloaded, not that the
+request is wrong."""
+
+_USER_AGENT = "sidekickai/1.0.0"
+
+T = TypeVar("T")
+
+
+class Completion(BaseModel):
+    """A completion, or one streamed piece of it."""
+
+    completion: str
+    stop_reason: Optional[str] = None
+    model: Optional[str] = None
+
+
+def _split_base_url(base_url: str) -> Tuple[str, str, int, str]:
+    """Split a base url into scheme, host, port and path prefix.
+
+    A url without a scheme, like ``localhost:8000``, is taken to be plain http.
+    """
+    if "://" not in base_url:
+        base_url = f"http://{base_url}"
+    url = urlsplit(base_url)
+    if url.scheme not in ("http", "https"):
+        raise ValueError(f"Unsupported url scheme {url.scheme!r} in {base_url!r}")
+    port = url.port or (443 if url.scheme == "https" else 80)
+    return url.scheme, url.hostname or "localhost", port, url.path.rstrip("/")
+
+
+def _status_error(
+        status: int, body: bytes, headers: Dict[str, str]
+) -> APIStatusError:
+    """Build the error for a response with an error status code."""
+    try:
+        message = json.loads(body)["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        message = body.decode("utf-8", "replace") or f"HTTP {status}"
+    retry_after: Optional[float] = None
+    if headers.get("retry-after"):
+        try:
+            retry_after = float(headers["retry-after"])
+        except ValueError:
+            pass
+    error_cls: Type[APIStatusError] = APIStatusError
+    if status == 429:
+        error_cls = RateLimitError
+    elif status >= 500:
+        error_cls = InternalServerError
+    return error_cls(message, status_code=status, retry_after=retry_after)
+
+
+class _SSEDecoder:
+    """Incremental decoder of server-sent events, fed one line at a time."""
+
+    def __init__(self) -> None:
+        self._event = "message"
+        self._data: List[str] = []
+
+    def decode(self, line: bytes) -> Optional[Tuple[str, str]]:
+        """Feed a line, returning the ``(event, data)`` it completes, if any."""
+        text = line.decode("utf-8").rstrip("\r\n")
+        if not text:
+            if not self._data:
+                return None
+            sse = (self._event, "\n".join(self._data))
+            self._event, self._data = "message", []
+            return sse
+        if text.startswith(":"):
+            return None
+        field, _, value = text.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "event":
+            self._event = value
+        elif field == "data":
+            self._data.append(value)
+        return None
+
+
+def _completion_from_event(event: str, data: str) -> Optional[Completion]:
+    """Turn a server-sent event into a completion chunk, if it carries one."""
+    if event == "completion":
+        return Completion.model_validate_json(data)
+    if event == "error":
+        error = json.loads(data).get("error", {})
+        status = 429 if error.get("type") == "rate_limit_error" else 500
+        raise _status_error(status, data.encode("utf-8"), {})
+    # Pings and unknown events only keep the connection alive.
+    return None
+
+
+def _request_headers(api_key: str, stream: bool) -> Dict[str, str]:
+    return {
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream" if stream else "application/json",
+        "User-Agent": _USER_AGENT,
+        "x-api-key": api_key,
+    }
+
+
+_current_scope: ContextVar[Optional["CancelScope"]] = ContextVar(
+    "sidekick_cancel_scope", default=None
+)
+
+
+class CancelScope:
+    """Cancels the requests sent from within it, from any thread.
+
+    Cancelling shuts down the sockets of the scope's requests in flight, so
+    their blocked reads return at once and they raise ``RequestCancelledError``;
+    requests sent from the scope afterwards raise it right away. Async requests
+    don't need a scope, they are cancelled with their task.
+
+    Example:
+        .. code-block:: python
+
+            scope = CancelScope()
+            # In a worker thread:
+            scope.run(client.completions.create, prompt=prompt)
+            # From any other thread, once the result is no longer needed:
+            scope.cancel()
+    """
+
+    def __init__(self) -> None:
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._conns: set = set()
+
+    def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call ``fn`` with the requests it sends in this scope."""
+        token = _current_scope.set(self)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_scope.reset(token)
+
+    def cancel(self) -> None:
+        """Cancel the requests in flight and those sent later."""
+        with self._lock:
+            self.cancelled = True
+            conns = list(self._conns)
+        for conn in conns:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except (AttributeError, OSError):
+                pass
+
+    def _enter(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if self.cancelled:
+                raise RequestCancelledError("Request cancelled before it was sent")
+            self._conns.add(conn)
+
+    def _exit(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._conns.discard(conn)
+
+
+def _remaining(
+        deadline: Optional[float], timeout: Optional[float] = None
+) -> Optional[float]:
+    """Shorten the timeout of a blocking step to the time left before ``deadline``.
+
+    Raises:
+        DeadlineExceededError: If the deadline has passed.
+    """
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceededError("Deadline exceeded")
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def _transport_error(
+        e: BaseException,
+        scope: Optional[CancelScope],
+        what: str,
+        deadline: Optional[float] = None,
+) -> BaseException:
+    """Map an error raised by the transport to the error to raise instead."""
+    if isinstance(e, DeadlineExceededError):
+        return e
+    if scope is not None and scope.cancelled:
+        return RequestCancelledError(f"{what} cancelled")
+    if deadline is not None and time.monotonic() >= deadline:
+        return DeadlineExceededError(f"{what} exceeded the deadline")
+    if isinstance(e, (socket.timeout, asyncio.TimeoutError)):
+        return APITimeoutError(f"{what} timed out")
+    if isinstance(
+            e, (OSError, http.client.HTTPException, asyncio.IncompleteReadError)
+    ):
+        return APIConnectionError(f"{what} failed: {e!r}")
+    return e
+
+
+class HTTPConnectionPool:
+    """A pool of keep-alive HTTP connections to one host.
+
+    At most ``maxsize`` connections are in use at once; callers wait for a free
+    one. Idle connections are reused most recently used first, and a request on
+    a connection the server already closed is resent once on a new one.
+    """
+
+    def __init__(
+            self,
+            scheme: str,
+            host: str,
+            port: int,
+            *,
+            maxsize: int = 10,
+            connect_timeout: Optional[float] = None,
+            read_timeout: Optional[float] = None,
+    ) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._scopes: Dict[http.client.HTTPConnection, CancelScope] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxsize)
+
+    def _connect(self, deadline: Optional[float]) -> http.client.HTTPConnection:
+        conn: http.client.HTTPConnection
+        timeout = _remaining(deadline, self.connect_timeout)
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(
+                self.host,
+                self.port,
+                timeout=timeout,
+                context=ssl.create_default_context(),
+            )
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _checkout(
+            self, deadline: Optional[float]
+    ) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(deadline), False
+
+    def _send(
+            self,
+            conn: http.client.HTTPConnection,
+            method: str,
+            path: str,
+            body: bytes,
+            headers: Dict[str, str],
+            deadline: Optional[float],
+    ) -> http.client.HTTPResponse:
+        conn.sock.settimeout(_remaining(deadline, self.read_timeout))
+        conn.request(method, path, body=body, headers=headers)
+        return conn.getresponse()
+
+    def request(
+            self, method: str, path: str, body: bytes, headers: Dict[str, str]
+    ) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """Send a request and return its connection and response.
+
+        The connection must be handed back with ``release`` once the response
+        has been read.
+        """
+        scope = _current_scope.get()
+        deadline = get_deadline(None)
+        if not self._slots.acquire(timeout=_remaining(deadline)):
+            raise DeadlineExceededError("Deadline exceeded waiting for a connection")
+        conn: Optional[http.client.HTTPConnection] = None
+        try:
+            conn, reused = self._checkout(deadline)
+            if scope is not None:
+                scope._enter(conn)
+            try:
+                response = self._send(conn, method, path, body, headers, deadline)
+            except (http.client.RemoteDisconnected, ConnectionError):
+                if not reused or (scope is not None and scope.cancelled):
+                    raise
+                # The server closed the idle connection; resend on a new one.
+                self._forget(conn, scope)
+                conn = self._connect(deadline)
+                if scope is not None:
+                    scope._enter(conn)
+                response = self._send(conn, method, path, body, headers, deadline)
+        except BaseException as e:
+            if conn is not None:
+                self._forget(conn, scope)
+            self._slots.release()
+            error = _transport_error(
+                e, scope, f"Request to {self.host}:{self.port}", deadline
+            )
+            if error is e:
+                raise
+            raise error from e
+        if scope is not None:
+            with self._lock:
+                self._scopes[conn] = scope
+        return conn, response
+
+    def _forget(
+            self, conn: http.client.HTTPConnection, scope: Optional[CancelScope]
+    ) -> None:
+        conn.close()
+        if scope is not None:
+            scope._exit(conn)
+
+    def release(
+            self, conn: http.client.HTTPConnection, *, reusable: bool = True
+    ) -> None:
+        """Hand back a connection, keeping it alive if it can be reused."""
+        with self._lock:
+            scope = self._scopes.pop(conn, None)
+            if scope is not None:
+                scope._exit(conn)
+                reusable = reusable and not scope.cancelled
+            if reusable:
+                self._idle.append(conn)
+        if not reusable:
+            conn.close()
+        self._slots.release()
+
+    def close(self) -> None:
+        """Close the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class _AsyncResponse:
+    """The status, headers and body of a response read from an asyncio stream."""
+
+    def __init__(
+            self,
+            status: int,
+            headers: Dict[str, str],
+            reader: asyncio.StreamReader,
+            read_timeout: Optional[float],
+    ) -> None:
+        self.status = status
+        self.headers = headers
+        self.reader = reader
+        self.read_timeout = read_timeout
+        self.complete = False
+
+    @property
+    def will_close(self) -> bool:
+        if self.headers.get("connection", "").lower() == "close":
+            return True
+        return (
+            "content-length" not in self.headers
+            and self.headers.get("transfer-encoding", "").lower() != "chunked"
+        )
+
+    async def _read(self, coro: Any) -> Any:
+        return await asyncio.wait_for(coro, self.read_timeout)
+
+    async def iter_bytes(self) -> AsyncIterator[bytes]:
+        """Yield the body as it arrives, decoding chunked transfer encoding."""
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await self._read(self.reader.readline())
+                size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip the trailers up to the final empty line.
+                    while (await self._read(self.reader.readline())).strip():
+                        pass
+                    break
+                data = await self._read(self.reader.readexactly(size))
+                await self._read(self.reader.readexactly(2))
+                yield data
+        elif "content-length" in self.headers:
+            length = int(self.headers["content-length"])
+            if length:
+                yield await self._read(self.reader.readexactly(length))
+        else:
+            while True:
+                data = await self._read(self.reader.read(65536))
+                if not data:
+                    break
+                yield data
+        self.complete = True
+
+    async def read(self) -> bytes:
+        """Read the whole body."""
+        return b"".join([data async for data in self.iter_bytes()])
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        """Yield the body line by line, keeping the line endings."""
+        buffer = b""
+        async for data in self.iter_bytes():
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line + b"\n"
+        if buffer:
+            yield buffer
+
+
+_AsyncConnection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class AsyncHTTPConnectionPool:
+    """A pool of keep-alive HTTP connections to one host, for one event loop.
+
+    The asyncio twin of ``HTTPConnectionPool``, built on asyncio streams so
+    requests wait on the event loop instead of holding a thread each.
+    """
+
+    def __init__(
+            self,
+            scheme: str,
+            host: str,
+            port: int,
+            *,
+            maxsize: int = 10,
+            connect_timeout: Optional[float] = None,
+            read_timeout: Optional[float] = None,
+    ) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle: List[_AsyncConnection] = []
+        self._slots = asyncio.Semaphore(maxsize)
+
+    async def _connect(self) -> _AsyncConnection:
+        ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context),
+            self.connect_timeout,
+        )
+
+    async def _send(
+            self,
+            conn: _AsyncConnection,
+            method: str,
+            path: str,
+            body: bytes,
+            headers: Dict[str, str],
+    ) -> _AsyncResponse:
+        reader, writer = conn
+        host = self.host if self.port in (80, 443) else f"{self.host}:{self.port}"
+        head = [f"{method} {path} HTTP/1.1", f"Host: {host}"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        head.append(f"Content-Length: {len(body)}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+        if not status_line:
+            raise http.client.RemoteDisconnected("Connection closed by server")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise http.client.BadStatusLine(status_line.decode("latin-1"))
+        response_headers: Dict[str, str] = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        return _AsyncResponse(status, response_headers, reader, self.read_timeout)
+
+    async def request(
+            self, method: str, path: str, body: bytes, headers: Dict[str, str]
+    ) -> Tuple[_AsyncConnection, _AsyncResponse]:
+        """Send a request and return its connection and response.
+
+        The connection must be handed back with ``release`` once the response
+        has been read.
+        """
+        await self._slots.acquire()
+        conn: Optional[_AsyncConnection] = None
+        try:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else await self._connect()
+            try:
+                return conn, await self._send(conn, method, path, body, headers)
+            except (http.client.RemoteDisconnected, ConnectionError):
+                if not reused:
+                    raise
+            # The server closed the idle connection; resend on a new one.
+            conn[1].close()
+            conn = await self._connect()
+            return conn, await self._send(conn, method, path, body, headers)
+        except BaseException as e:
+            if conn is not None:
+                conn[1].close()
+            self._slots.release()
+            error = _transport_error(e, None, f"Request to {self.host}:{self.port}")
+            if error is e:
+                raise
+            raise error from e
+
+    def release(self, conn: _AsyncConnection, *, reusable: bool = True) -> None:
+        """Hand back a connection, keeping it alive if it can be reused."""
+        if reusable and not conn[1].is_closing():
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+        self._slots.release()
+
+    def close(self) -> None:
+        """Close the idle connections."""
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+
+_PoolKey = Tuple[str, str, int, int, Optional[float], Optional[float]]
+
+_pools: Dict[_PoolKey, HTTPConnectionPool] = {}
+_async_pools: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, Dict[_PoolKey, AsyncHTTPConnectionPool]
+] = weakref.WeakKeyDictionary()
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(
+        scheme: str,
+        host: str,
+        port: int,
+        *,
+        maxsize: int = 10,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+) -> HTTPConnectionPool:
+    """Get the pool shared by all clients with the same host and settings."""
+    key = (scheme, host, port, maxsize, connect_timeout, read_timeout)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = HTTPConnectionPool(
+                scheme,
+                host,
+                port,
+                maxsize=maxsize,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+            )
+        return pool
+
+
+def get_async_connection_pool(
+        scheme: str,
+        host: str,
+        port: int,
+        *,
+        maxsize: int = 10,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+) -> AsyncHTTPConnectionPool:
+    """Get the pool of the running event loop shared by all clients with the
+    same host and settings."""
+    loop = asyncio.get_running_loop()
+    key = (scheme, host, port, maxsize, connect_timeout, read_timeout)
+    with _pools_lock:
+        pools = _async_pools.setdefault(loop, {})
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = AsyncHTTPConnectionPool(
+                scheme,
+                host,
+                port,
+                maxsize=maxsize,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+            )
+        return pool
+
+
+def _client_retry(max_retries: int) -> Any:
+    return retry(
+        reraise=True,
+        stop=stop_after_attempt(max_retries + 1),
+        wait=wait_exponential(multiplier=0.5, max=8),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    )
+
+
+class _BaseSideKickClient(BaseModel):
+    base_url: str = "http://localhost:8000"
+    """Url of the SideKick server, optionally with a path prefix."""
 
-class SideKickClient(BaseModel):
-    base_url: str
     api_key: str
-    timeout: int
-    max_retries: int
+    """Key sent in the ``x-api-key`` header."""
+
+    timeout: Optional[float] = 600
+    """Seconds to wait for each read from the server. Unlimited if None."""
+
+    connect_timeout: Optional[float] = 5.0
+    """Seconds to wait for a connection to be established. Unlimited if None."""
+
+    max_retries: int = 2
+    """Retries of requests failed by connection errors, 429s or 5xx errors."""
+
+    pool_maxsize: int = 10
+    """Most connections to the server in use at once."""
+
+    def _pool_args(self) -> Tuple[Tuple[str, str, int], Dict[str, Any]]:
+        scheme, host, port, _ = _split_base_url(self.base_url)
+        return (scheme, host, port), {
+            "maxsize": self.pool_maxsize,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.timeout,
+        }
+
+    def _request(self, stream: bool, **params: Any) -> Tuple[str, bytes, Dict[str, str]]:
+        path = _split_base_url(self.base_url)[3] + COMPLETIONS_PATH
+        body = json.dumps({**params, "stream": stream}).encode("utf-8")
+        return path, body, _request_headers(self.api_key, stream)
+
+
+class Completions:
+    """The completions resource of a ``SideKickClient``."""
+
+    def __init__(self, client: "SideKickClient") -> None:
+        self._client = client
+
+    def create(
+            self, *, stream: bool = False, **params: Any
+    ) -> Union[Completion, Iterator[Completion]]:
+        """Create a completion.
+
+        Args:
+            stream: Whether to return an iterator of completion chunks as they
+                are generated instead of the whole completion.
+            **params: The request parameters, like ``model``, ``prompt`` and
+                ``max_tokens_to_sample``.
+
+        Returns:
+            The completion, or an iterator of its chunks if ``stream`` is True.
+        """
+        args, kwargs = self._client._pool_args()
+        pool = get_connection_pool(*args, **kwargs)
+        path, body, headers = self._client._request(stream, **params)
+
+        @_client_retry(self._client.max_retries)
+        def _send() -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+            conn, response = pool.request("POST", path, body, headers)
+            if response.status >= 400:
+                try:
+                    data = response.read()
+                except BaseException:
+                    pool.release(conn, reusable=False)
+                    raise
+                pool.release(conn, reusable=not response.will_close)
+                raise _status_error(
+                    response.status, data, {k.lower(): v for k, v in response.getheaders()}
+                )
+            return conn, response
+
+        conn, response = _send()
+        if stream:
+            return Stream(pool, conn, response)
+        try:
+            data = response.read()
+        except BaseException as e:
+            pool.release(conn, reusable=False)
+            error = _transport_error(
+                e, _current_scope.get(), "Reading the response", get_deadline(None)
+            )
+            if error is e:
+                raise
+            raise error from e
+        pool.release(conn, reusable=not response.will_close)
+        return Completion.model_validate_json(data)
+
+
+class AsyncCompletions:
+    """The completions resource of an ``AsyncSideKickClient``."""
+
+    def __init__(self, client: "AsyncSideKickClient") -> None:
+        self._client = client
+
+    async def create(
+            self, *, stream: bool = False, **params: Any
+    ) -> Union[Completion, AsyncIterator[Completion]]:
+        """Create a completion.
+
+        Args:
+            stream: Whether to return an async iterator of completion chunks as
+                they are generated instead of the whole completion.
+            **params: The request parameters, like ``model``, ``prompt`` and
+                ``max_tokens_to_sample``.
+
+        Returns:
+            The completion, or an async iterator of its chunks if ``stream`` is
+                True.
+        """
+        args, kwargs = self._client._pool_args()
+        pool = get_async_connection_pool(*args, **kwargs)
+        path, body, headers = self._client._request(stream, **params)
+
+        @_client_retry(self._client.max_retries)
+        async def _send() -> Tuple[_AsyncConnection, _AsyncResponse]:
+            conn, response = await pool.request("POST", path, body, headers)
+            if response.status >= 400:
+                try:
+                    data = await response.read()
+                except BaseException:
+                    pool.release(conn, reusable=False)
+                    raise
+                pool.release(conn, reusable=not response.will_close)
+                raise _status_error(response.status, data, response.headers)
+            return conn, response
+
+        conn, response = await _send()
+        if stream:
+            return AsyncStream(pool, conn, response)
+        try:
+            data = await response.read()
+        except BaseException as e:
+            pool.release(conn, reusable=False)
+            error = _transport_error(e, None, "Reading the response")
+            if error is e:
+                raise
+            raise error from e
+        pool.release(conn, reusable=not response.will_close)
+        return Completion.model_validate_json(data)
+
+
+class Stream(Iterator[Completion]):
+    """The completion chunks of a streamed response.
+
+    The connection goes back to the pool once the stream is read to the end,
+    and is closed if the stream is closed or dropped before that.
+    """
+
+    def __init__(
+            self,
+            pool: HTTPConnectionPool,
+            conn: http.client.HTTPConnection,
+            response: http.client.HTTPResponse,
+    ) -> None:
+        self._pool = pool
+        self._conn: Optional[http.client.HTTPConnection] = conn
+        self._response = response
+        self._scope = _current_scope.get()
+        self._deadline = get_deadline(None)
+        self._iterator = self._iter_chunks()
+
+    def _release(self, reusable: bool) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(
+                conn, reusable=reusable and not self._response.will_close
+            )
+
+    def _iter_chunks(self) -> Iterator[Completion]:
+        decoder = _SSEDecoder()
+        try:
+            while True:
+                if self._deadline is not None and self._conn is not None:
+                    self._conn.sock.settimeout(
+                        _remaining(self._deadline, self._pool.read_timeout)
+                    )
+                line = self._response.readline()
+                if not line:
+                    break
+                sse = decoder.decode(line)
+                if sse is not None:
+                    chunk = _completion_from_event(*sse)
+                    if chunk is not None:
+                        yield chunk
+        except (OSError, http.client.HTTPException) as e:
+            self._release(reusable=False)
+            error = _transport_error(
+                e, self._scope, "Reading the stream", self._deadline
+            )
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            # Unread data is left on the connection if the stream was abandoned.
+            self._release(reusable=self._response.isclosed())
+
+    def __iter__(self) -> Iterator[Completion]:
+        return self
+
+    def __next__(self) -> Completion:
+        return next(self._iterator)
+
+    def close(self) -> None:
+        """Stop reading the stream and close its connection."""
+        self._release(reusable=False)
+        self._iterator.close()
+
+    def __del__(self) -> None:
+        self._release(reusable=False)
+
+
+class AsyncStream(AsyncIterator[Completion]):
+    """The completion chunks of a streamed response, read asynchronously.
+
+    The connection goes back to the pool once the stream is read to the end,
+    and is closed if the stream is closed or dropped before that.
+    """
+
+    def __init__(
+            self,
+            pool: AsyncHTTPConnectionPool,
+            conn: _AsyncConnection,
+            response: _AsyncResponse,
+    ) -> None:
+        self._pool = pool
+        self._conn: Optional[_AsyncConnection] = conn
+        self._response = response
+        self._iterator = self._iter_chunks()
+
+    def _release(self, reusable: bool) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(
+                conn, reusable=reusable and not self._response.will_close
+            )
+
+    async def _iter_chunks(self) -> AsyncIterator[Completion]:
+        decoder = _SSEDecoder()
+        try:
+            async for line in self._response.iter_lines():
+                sse = decoder.decode(line)
+                if sse is not None:
+                    chunk = _completion_from_event(*sse)
+                    if chunk is not None:
+                        yield chunk
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            self._release(reusable=False)
+            error = _transport_error(e, None, "Reading the stream")
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            # Unread data is left on the connection if the stream was abandoned.
+            self._release(reusable=self._response.complete)
+
+    def __aiter__(self) -> AsyncIterator[Completion]:
+        return self
+
+    async def __anext__(self) -> Completion:
+        return await self._iterator.__anext__()
+
+    async def aclose(self) -> None:
+        """Stop reading the stream and close its connection."""
+        self._release(reusable=False)
+        await self._iterator.aclose()
+
+    def __del__(self) -> None:
+        self._release(reusable=False)
+
+
+class SideKickClient(_BaseSideKickClient):
+    """Client of the SideKick completion API.
+
+    Example:
+        .. code-block:: python
+
+            client = SideKickClient(base_url="http://localhost:8000", api_key="sk")
+            completion = client.completions.create(
+                model="sidekick",
+                prompt=f"{HUMAN_PROMPT} Hello{AI_PROMPT}",
+                max_tokens_to_sample=32,
+            )
+    """
+
+    @property
+    def completions(self) -> Completions:
+        return Completions(self)
 
 
+class AsyncSideKickClient(_BaseSideKickClient):
+    """Async client of the SideKick completion API."""
 
+    @property
+    def completions(self) -> AsyncCompletions:
+        return AsyncCompletions(self)
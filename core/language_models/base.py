@@ -1,11 +1,11 @@
 from abc import abstractmethod, ABC
 from typing import Union, Optional, List, Dict, Any, TypeVar
 
-from pydantic import Field
+from pydantic.v1 import Field
 from pydantic.v1 import validator
 
-# from core.caches import BaseCache
-# from core.callbacks.base import Callbacks
+from core.caches import BaseCache
+from core.callbacks.base import Callbacks
 from core.messages import BaseMessage
 from core.prompt_values import PromptValue
 from core.runnables.base import Runnable, RunnableSerializable
@@ -24,8 +24,7 @@ class BaseLanguageModel(
     All language model wrappers inherit from BaseLanguageModel.
     """
 
-    # cache: Union[BaseCache, bool, None] = None
-    # cache: Union[bool, None] = None
+    cache: Union[BaseCache, bool, None] = None
 
     """Whether to cache the response.
 
@@ -38,13 +37,17 @@ class BaseLanguageModel(
     """
     verbose: bool = Field(default=False)
     """Whether to print out response text."""
-    #callbacks: Callbacks = Field(default=None, exclude=True)
+    callbacks: Callbacks = Field(default=None, exclude=True)
     """Callbacks to add to the run trace."""
     tags: Optional[List[str]] = Field(default=['llm'], exclude=True)
     """Tags to add to the run trace."""
     metadata: Optional[Dict[str, Any]] = Field(default=None, exclude=True)
     """Metadata to add to the run trace."""
 
+    class Config:
+        """Configuration for this pydantic object."""
+        arbitrary_types_allowed = True
+
     @validator("verbose", pre=True, always=True)
     def set_verbose(cls, verbose: Optional[bool]) -> bool:
         """If verbose is None, set it.
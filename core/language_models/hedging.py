@@ -0,0 +1,241 @@
+"""Hedged requests: resend a slow request and take whichever answer comes first."""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from core.language_models.ModelClient import CancelScope
+from core.runnables.config import get_executor
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Keeps the latencies of the most recent requests, safe across threads."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self._lock = threading.Lock()
+        self._recent: Deque[float] = deque(maxlen=window)
+        self._sorted: list = []
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def record(self, latency: float) -> None:
+        """Record the latency of a request, in seconds."""
+        with self._lock:
+            if len(self._recent) == self._recent.maxlen:
+                oldest = self._recent[0]
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            self._recent.append(latency)
+            bisect.insort(self._sorted, latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The latency under which ``q`` of the recent requests answered."""
+        with self._lock:
+            if not self._sorted:
+                return None
+            index = min(len(self._sorted) - 1, int(q * len(self._sorted)))
+            return self._sorted[index]
+
+
+class RequestHedger:
+    """Sends a duplicate of a request that is slower than most, and keeps
+    whichever answers first.
+
+    The duplicate is sent once the request has been in flight longer than the
+    ``percentile`` of recently observed latencies, so about ``1 - percentile``
+    of requests are hedged and the tail latency drops to roughly the
+    percentile plus one more request. The loser is cancelled. Hedging only
+    starts once ``min_samples`` latencies have been observed. Safe to share
+    between threads, event loops and models.
+
+    Example:
+        .. code-block:: python
+
+            model = SideKickModel(hedger=RequestHedger(percentile=0.95))
+            ...
+            print(model.hedger.stats)
+    """
+
+    def __init__(
+            self,
+            percentile: float = 0.95,
+            *,
+            min_samples: int = 20,
+            window: int = 1000,
+            min_delay: float = 0.0,
+    ) -> None:
+        """Initialize the hedger.
+
+        Args:
+            percentile: The percentile of recent latencies after which a request
+                is hedged.
+            min_samples: The latencies to observe before hedging.
+            window: The number of recent latencies to keep.
+            min_delay: The shortest wait before hedging, in seconds.
+        """
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be between 0 and 1")
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latencies = LatencyTracker(window)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "hedged": 0, "hedge_won": 0, "rejected": 0}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """How many requests were sent, hedged, won by their hedge, and not
+        hedged because ``admit`` refused."""
+        with self._lock:
+            return dict(self._stats)
+
+    @property
+    def hedge_rate(self) -> float:
+        """The share of requests that were hedged."""
+        stats = self.stats
+        return stats["hedged"] / stats["requests"] if stats["requests"] else 0.0
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None if not hedging yet."""
+        if len(self.latencies) < self.min_samples:
+            return None
+        delay = self.latencies.percentile(self.percentile)
+        return None if delay is None else max(delay, self.min_delay)
+
+    def _timed(self, fn: Callable[[], T]) -> T:
+        start = time.monotonic()
+        result = fn()
+        self.latencies.record(time.monotonic() - start)
+        return result
+
+    async def _atimed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        result = await fn()
+        self.latencies.record(time.monotonic() - start)
+        return result
+
+    def run(
+            self,
+            fn: Callable[[], T],
+            hedge: Optional[Callable[[], T]] = None,
+            *,
+            admit: Optional[Callable[[], bool]] = None,
+    ) -> T:
+        """Call ``fn``, hedging it with ``hedge`` if it is slow.
+
+        Args:
+            fn: Sends the request.
+            hedge: Sends the duplicate request. Defaults to ``fn``.
+            admit: Called before hedging; the request is not hedged if it
+                returns False, e.g. because the rate limit budget is exhausted.
+
+        Returns:
+            The result of whichever request succeeded first.
+        """
+        self._count("requests")
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._timed(fn)
+
+        scopes = {}
+        # Hedged requests have a pool of their own: they are submitted from
+        # threads of the "io" pool, which must not wait on their own pool. The
+        # pool is sized so that it does not limit the concurrency of "io".
+        executor = get_executor("hedging")
+        primary_scope = CancelScope()
+        started = threading.Event()
+        start = [0.0]
+
+        def run_primary() -> T:
+            start[0] = time.monotonic()
+            started.set()
+            return primary_scope.run(self._timed, fn)
+
+        primary = executor.submit(run_primary)
+        scopes[primary] = primary_scope
+        # The delay counts from when the request is sent, not from when it is
+        # queued: a request waiting for a thread is not slow.
+        started.wait()
+        done, _ = wait([primary], timeout=start[0] + delay - time.monotonic())
+        if done or (admit is not None and not admit()):
+            if not done:
+                self._count("rejected")
+            return primary.result()
+
+        self._count("hedged")
+        hedge_scope = CancelScope()
+        secondary = executor.submit(hedge_scope.run, self._timed, hedge or fn)
+        scopes[secondary] = hedge_scope
+        pending = {primary, secondary}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        scopes[loser].cancel()
+                    if future is secondary:
+                        self._count("hedge_won")
+                    return future.result()
+                if future is primary or error is None:
+                    error = future.exception()
+        assert error is not None
+        raise error
+
+    async def arun(
+            self,
+            fn: Callable[[], Awaitable[T]],
+            hedge: Optional[Callable[[], Awaitable[T]]] = None,
+            *,
+            admit: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> T:
+        """Async version of ``run``; the losing request's task is cancelled."""
+        self._count("requests")
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._atimed(fn)
+
+        primary = asyncio.ensure_future(self._atimed(fn))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or (admit is not None and not await admit()):
+                if not done:
+                    self._count("rejected")
+                return await primary
+
+            self._count("hedged")
+            secondary = asyncio.ensure_future(self._atimed(hedge or fn))
+            pending = {primary, secondary}
+            error: Optional[BaseException] = None
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        if task.exception() is None:
+                            if task is secondary:
+                                self._count("hedge_won")
+                            return task.result()
+                        if task is primary or error is None:
+                            error = task.exception()
+            finally:
+                for task in pending:
+                    task.cancel()
+            assert error is not None
+            raise error
+        finally:
+            if not primary.done():
+                primary.cancel()
+
@@ -1,28 +1,334 @@
+import asyncio
+import copy
 import inspect
+import logging
 import uuid
 import warnings
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Type, List, Any, Union, cast
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 
 from pydantic import Field
 from pydantic.v1 import root_validator
+from tenacity import (
+    RetryCallState,
+    before_sleep_log,
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+    wait_random,
+)
 
 from core.caches import BaseCache
 from core.callbacks.base import BaseCallbackManager, Callbacks
+from core.callbacks.manager import (
+    AsyncCallbackManager,
+    AsyncCallbackManagerForLLMRun,
+    CallbackManager,
+    CallbackManagerForLLMRun,
+)
 from core.dump import dumpd
 from core.language_models.base import BaseLanguageModel, LanguageModelInput
-from core.outputs.generation import Generation
+from core.language_models.retry import RetryBudget, wait_retry_after
+from core.outputs.generation import Generation, GenerationChunk
 from core.outputs.llm_results import LLMResult
 from core.prompt_values import PromptValue, StringPromptValue
-from core.runnables.config import RunnableConfig
+from core.runnables.config import (
+    RunnableConfig,
+    await_with_deadline,
+    check_deadline,
+    copy_context_with_deadline,
+    deadline_context,
+    get_deadline,
+    get_executor_for_config,
+    remaining_time,
+    run_in_executor,
+)
+from core.globals import get_llm_cache
+from core.runnables.utils import gather_with_concurrency
+from core.singleflight import SingleFlight
+from core.tracing import get_tracer
 
+logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
 
-def get_prompts(params, prompts):
-    pass
+T = TypeVar("T")
 
 
-def get_llm_cache():
-    pass
+def create_base_retry_decorator(
+        error_types: List[Type[BaseException]],
+        max_retries: int = 1,
+        run_manager: Optional[
+            Union[AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun]
+        ] = None,
+        *,
+        min_seconds: float = 0.5,
+        max_seconds: float = 8.0,
+        retry_budget: Optional[RetryBudget] = None,
+) -> Callable[[Any], Any]:
+    """Create a retry decorator for a given LLM and provided list of error types.
+
+    Retries back off exponentially from ``min_seconds`` up to ``max_seconds``
+    with random jitter, or wait as long as the backend asked to. The last error
+    is re-raised once the attempts or the retry budget run out.
+
+    Args:
+        error_types: The errors worth retrying.
+        max_retries: The retries allowed per request.
+        run_manager: The run manager notified with ``on_retry`` before each retry.
+        min_seconds: The wait before the first retry.
+        max_seconds: The longest wait between two retries.
+        retry_budget: A budget every retry is withdrawn from, if any.
+
+    Returns:
+        A tenacity retry decorator, for sync and async functions alike.
+    """
+    _logging = before_sleep_log(logger, logging.WARNING)
+    # Retries waiting for the async on_retry callback. It is awaited in the
+    # sleep before the retry, as tenacity does not await before_sleep.
+    _pending_retries: List[RetryCallState] = []
+
+    def _before_sleep(retry_state: RetryCallState) -> None:
+        _logging(retry_state)
+        if isinstance(run_manager, AsyncCallbackManagerForLLMRun):
+            # A copy, as tenacity moves the state on to the next attempt.
+            _pending_retries.append(copy.copy(retry_state))
+        elif run_manager:
+            run_manager.on_retry(retry_state)
+
+    async def _sleep(seconds: float) -> None:
+        while _pending_retries:
+            await cast(AsyncCallbackManagerForLLMRun, run_manager).on_retry(
+                _pending_retries.pop(0)
+            )
+        await asyncio.sleep(seconds)
+
+    def _budget_exhausted(retry_state: RetryCallState) -> bool:
+        # Only consulted once a retry is due, so no retry is withdrawn in vain.
+        return retry_budget is not None and not retry_budget.try_withdraw()
+
+    def _deadline_passed(retry_state: RetryCallState) -> bool:
+        remaining = remaining_time()
+        return remaining is not None and remaining <= 0
+
+    return retry(
+        reraise=True,
+        stop=(
+            stop_after_attempt(max_retries + 1) | _deadline_passed | _budget_exhausted
+        ),
+        wait=wait_retry_after(
+            wait_exponential(multiplier=min_seconds, max=max_seconds)
+            + wait_random(0, min_seconds),
+            max=max_seconds,
+        ),
+        retry=retry_if_exception_type(tuple(error_types)),
+        before_sleep=_before_sleep,
+        **(
+            {"sleep": _sleep}
+            if isinstance(run_manager, AsyncCallbackManagerForLLMRun)
+            else {}
+        ),
+    )
+
+
+def _resolve_cache(cache: Union[BaseCache, bool, None]) -> Optional[BaseCache]:
+    """Resolve the cache of a model to the cache instance to use, if any."""
+    if isinstance(cache, BaseCache):
+        return cache
+    if cache is False:
+        return None
+    llm_cache = get_llm_cache()
+    if cache is True and llm_cache is None:
+        raise ValueError(
+            "No global cache was configured. Use `set_llm_cache`"
+            " to set a global cache if you want to use a global cache."
+            " Otherwise either pass a cache object or set cache to False/None"
+        )
+    return llm_cache
+
+
+def get_prompts(
+        params: Dict[str, Any],
+        prompts: List[str],
+        cache: Union[BaseCache, bool, None] = None,
+) -> Tuple[Dict[int, List], str, List[int], List[str]]:
+    """Get prompts that are already cached.
+
+    Args:
+        params: The parameters identifying the model call, see
+            ``BaseLLM._get_llm_params``.
+        prompts: The prompts of the batch.
+        cache: The cache setting of the model.
+
+    Returns:
+        The cached generations by prompt index, the llm_string the batch is cached
+            under, and the indexes and values of the prompts that missed the cache.
+    """
+    llm_string = str(sorted([(k, v) for k, v in params.items()]))
+    missing_prompts = []
+    missing_prompt_idxs = []
+    existing_prompts = {}
+    llm_cache = _resolve_cache(cache)
+    cache_vals = (
+        llm_cache.lookup_many([(prompt, llm_string) for prompt in prompts])
+        if llm_cache is not None
+        else [None] * len(prompts)
+    )
+    for i, (prompt, cache_val) in enumerate(zip(prompts, cache_vals)):
+        if isinstance(cache_val, list):
+            existing_prompts[i] = cache_val
+        else:
+            missing_prompts.append(prompt)
+            missing_prompt_idxs.append(i)
+    return existing_prompts, llm_string, missing_prompt_idxs, missing_prompts
+
+
+def update_cache(
+        existing_prompts: Dict[int, List],
+        llm_string: str,
+        missing_prompt_idxs: List[int],
+        new_results: LLMResult,
+        prompts: List[str],
+        cache: Union[BaseCache, bool, None] = None,
+) -> Optional[dict]:
+    """Update the cache with the generations of the prompts that missed it.
+
+    Args:
+        existing_prompts: The cached generations by prompt index, filled in place.
+        llm_string: The llm_string returned by ``get_prompts``.
+        missing_prompt_idxs: The indexes of the prompts that missed the cache.
+        new_results: The result of generating the missing prompts.
+        prompts: The prompts of the batch.
+        cache: The cache setting of the model.
+
+    Returns:
+        The llm_output of the new results.
+    """
+    llm_cache = _resolve_cache(cache)
+    for i, result in enumerate(new_results.generations):
+        existing_prompts[missing_prompt_idxs[i]] = result
+    if llm_cache is not None:
+        llm_cache.update_many(
+            [
+                (prompts[missing_prompt_idxs[i]], llm_string, result)
+                for i, result in enumerate(new_results.generations)
+            ]
+        )
+    llm_output = new_results.llm_output
+    return llm_output
+
+
+def _iter_with_deadline(iterator: Iterator[T], deadline: Optional[float]) -> Iterator[T]:
+    """Advance ``iterator`` with ``deadline`` as the deadline of its calls.
+
+    Every step runs in a copy of the context, so the deadline reaches the
+    iterator without leaking into the caller's context between steps.
+    """
+    if deadline is None:
+        yield from iterator
+        return
+    context = copy_context_with_deadline(deadline)
+    while True:
+        try:
+            item = context.run(next, iterator)
+        except StopIteration:
+            return
+        yield item
+
+
+async def _aiter_with_deadline(
+        iterator: AsyncIterator[T], deadline: Optional[float]
+) -> AsyncIterator[T]:
+    """Async version of ``_iter_with_deadline``; a step still running when the
+    deadline passes is cancelled."""
+    if deadline is None:
+        async for item in iterator:
+            yield item
+        return
+
+    async def _anext() -> T:
+        # Runs in its own task, so setting the deadline does not leak out.
+        with deadline_context(deadline):
+            return await await_with_deadline(iterator.__anext__())
+
+    while True:
+        try:
+            item = await asyncio.ensure_future(_anext())
+        except StopAsyncIteration:
+            return
+        yield item
+
+
+_inflight_requests: SingleFlight[Tuple[str, str], List[Generation]] = SingleFlight()
+
+
+def generate_coalesced(
+        llm_string: str,
+        prompts: List[str],
+        send: Callable[[List[str]], LLMResult],
+) -> LLMResult:
+    """Send prompts through ``send`` unless an identical request is in flight.
+
+    Prompts that another thread or task is already generating under the same
+    llm_string are not sent again; the call waits for that request and shares
+    its generations. Duplicates within ``prompts`` are sent once.
+
+    Args:
+        llm_string: The llm_string identifying the model and call parameters.
+        prompts: The prompts to generate.
+        send: Generates a list of prompts.
+
+    Returns:
+        An LLMResult with the generations of ``prompts``, in order.
+    """
+    llm_outputs = []
+
+    def _send_leaders(keys: List[Tuple[str, str]]) -> List[List[Generation]]:
+        result = send([prompt for _, prompt in keys])
+        llm_outputs.append(result.llm_output)
+        return result.generations
+
+    generations = _inflight_requests.run_many(
+        [(llm_string, prompt) for prompt in prompts], _send_leaders
+    )
+    return LLMResult(
+        generations=generations, llm_output=llm_outputs[0] if llm_outputs else None
+    )
+
+
+async def agenerate_coalesced(
+        llm_string: str,
+        prompts: List[str],
+        send: Callable[[List[str]], Awaitable[LLMResult]],
+) -> LLMResult:
+    """Async version of ``generate_coalesced``."""
+    llm_outputs = []
+
+    async def _send_leaders(keys: List[Tuple[str, str]]) -> List[List[Generation]]:
+        result = await send([prompt for _, prompt in keys])
+        llm_outputs.append(result.llm_output)
+        return result.generations
+
+    generations = await _inflight_requests.arun_many(
+        [(llm_string, prompt) for prompt in prompts], _send_leaders
+    )
+    return LLMResult(
+        generations=generations, llm_output=llm_outputs[0] if llm_outputs else None
+    )
 
 
 class BaseLLM(BaseLanguageModel[str], ABC):
@@ -33,6 +339,15 @@ class BaseLLM(BaseLanguageModel[str], ABC):
     # callback_manager: Optional[BaseCallbackManager] = Field(default=None, exclude=True)
     """[DEPRECATED]"""
 
+    coalesce_requests: bool = False
+    """Whether identical concurrent requests share one backend call.
+
+    If true, a prompt that another thread or task is already generating with the
+    same model parameters is not sent again; the caller waits for the in-flight
+    request and receives the same generations. Leave it off when independent
+    samples are expected for identical prompts (e.g. temperature > 0).
+    """
+
     class Config:
         """Configuration for this pydantic object."""
         arbitrary_types_allowed = True
@@ -45,47 +360,195 @@ class BaseLLM(BaseLanguageModel[str], ABC):
             stop: Optional[List[str]] = None,
             **kwargs: Any,
     ) -> str:
-        config = RunnableConfig()
-
-        op = self.generate_prompt(
-            [self._convert_input(_input)],
-            stop=stop,
-            # callbacks=config.get("callbacks"),
-            tags=config.get("tags"),
-            metadata=config.get("metadata"),
-            run_name=config.get("run_name"),
-            run_id=config.pop("run_id", None),
-            **kwargs,
-        )
-        print("Generated prompt ", op)
+        config = config or RunnableConfig()
+
+        with tracer.span("llm.invoke", llm=self._llm_type):
+            op = self.generate_prompt(
+                [self._convert_input(_input)],
+                stop=stop,
+                callbacks=config.get("callbacks"),
+                tags=config.get("tags"),
+                metadata=config.get("metadata"),
+                run_name=config.get("run_name"),
+                run_id=config.get("run_id", None),
+                config=config,
+                **kwargs,
+            )
 
         return (
             op.generations[0][0].text
         )
 
+    async def ainvoke(
+            self,
+            _input: LanguageModelInput,
+            config: Optional[RunnableConfig] = None,
+            *,
+            stop: Optional[List[str]] = None,
+            **kwargs: Any,
+    ) -> str:
+        config = config or RunnableConfig()
+
+        with tracer.span("llm.ainvoke", llm=self._llm_type):
+            llm_result = await self.agenerate_prompt(
+                [self._convert_input(_input)],
+                stop=stop,
+                callbacks=config.get("callbacks"),
+                tags=config.get("tags"),
+                metadata=config.get("metadata"),
+                run_name=config.get("run_name"),
+                run_id=config.get("run_id", None),
+                config=config,
+                **kwargs,
+            )
+        return llm_result.generations[0][0].text
+
+    def stream(
+            self,
+            _input: LanguageModelInput,
+            config: Optional[RunnableConfig] = None,
+            *,
+            stop: Optional[List[str]] = None,
+            **kwargs: Any,
+    ) -> Iterator[str]:
+        if type(self)._stream == BaseLLM._stream:
+            # model doesn't implement streaming, so use default implementation
+            yield self.invoke(_input, config=config, stop=stop, **kwargs)
+            return
+
+        prompt = self._convert_input(_input)
+        config = config or RunnableConfig()
+        callback_manager = CallbackManager.configure(
+            config.get("callbacks"),
+            self.callbacks,
+            self.verbose,
+            config.get("tags"),
+            self.tags,
+            config.get("metadata"),
+            self.metadata,
+        )
+        (run_manager,) = callback_manager.on_llm_start(
+            self._get_serialized(),
+            [prompt],
+            options={"stop": stop},
+            name=config.get("run_name"),
+            run_id=config.get("run_id", None),
+            batch_size=1,
+        )
+        generation: Optional[GenerationChunk] = None
+        try:
+            for chunk in _iter_with_deadline(
+                    self._stream(prompt, stop=stop, run_manager=run_manager, **kwargs),
+                    get_deadline(config),
+            ):
+                yield chunk.text
+                if generation is None:
+                    generation = chunk
+                else:
+                    generation += chunk
+            assert generation is not None
+        except BaseException as e:
+            run_manager.on_llm_error(
+                e,
+                response=LLMResult(
+                    generations=[[generation]] if generation else []
+                ),
+            )
+            raise e
+        else:
+            run_manager.on_llm_end(LLMResult(generations=[[generation]]))
+
+    async def astream(
+            self,
+            _input: LanguageModelInput,
+            config: Optional[RunnableConfig] = None,
+            *,
+            stop: Optional[List[str]] = None,
+            **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        if (
+                type(self)._astream is BaseLLM._astream
+                and type(self)._stream is BaseLLM._stream
+        ):
+            # model doesn't implement streaming, so use default implementation
+            yield await self.ainvoke(_input, config=config, stop=stop, **kwargs)
+            return
+
+        prompt = self._convert_input(_input)
+        config = config or RunnableConfig()
+        callback_manager = AsyncCallbackManager.configure(
+            config.get("callbacks"),
+            self.callbacks,
+            self.verbose,
+            config.get("tags"),
+            self.tags,
+            config.get("metadata"),
+            self.metadata,
+        )
+        (run_manager,) = await callback_manager.on_llm_start(
+            self._get_serialized(),
+            [prompt],
+            options={"stop": stop},
+            name=config.get("run_name"),
+            run_id=config.get("run_id", None),
+            batch_size=1,
+        )
+        generation: Optional[GenerationChunk] = None
+        try:
+            async for chunk in _aiter_with_deadline(
+                    self._astream(prompt, stop=stop, run_manager=run_manager, **kwargs),
+                    get_deadline(config),
+            ):
+                yield chunk.text
+                if generation is None:
+                    generation = chunk
+                else:
+                    generation += chunk
+            assert generation is not None
+        except BaseException as e:
+            await run_manager.on_llm_error(
+                e,
+                response=LLMResult(generations=[[generation]] if generation else []),
+            )
+            raise e
+        else:
+            await run_manager.on_llm_end(LLMResult(generations=[[generation]]))
+
     def generate_prompt(
             self,
             prompts: List[PromptValue],
             stop: Optional[List[str]] = None,
-            # callbacks: Optional[Union[Callbacks, List[Callbacks]]] = None,
+            callbacks: Callbacks = None,
             **kwargs: Any,
     ) -> LLMResult:
-        print(prompts)
         prompt_strings = [p for p in prompts]
         return self.generate(prompt_strings, stop=stop,
-                             # callbacks=callbacks,
+                             callbacks=callbacks,
                              **kwargs)
 
+    async def agenerate_prompt(
+            self,
+            prompts: List[PromptValue],
+            stop: Optional[List[str]] = None,
+            callbacks: Callbacks = None,
+            **kwargs: Any,
+    ) -> LLMResult:
+        prompt_strings = [p for p in prompts]
+        return await self.agenerate(
+            prompt_strings, stop=stop, callbacks=callbacks, **kwargs
+        )
+
     def generate(
             self,
             prompts: List[str],
             stop: Optional[List[str]] = None,
-            # callbacks: Optional[Union[Callbacks, List[Callbacks]]] = None,
+            callbacks: Callbacks = None,
             *,
             tags: Optional[Union[List[str], List[List[str]]]] = None,
             metadata: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None,
             run_name: Optional[Union[str, List[str]]] = None,
             run_id: Optional[Union[uuid.UUID, List[Optional[uuid.UUID]]]] = None,
+            config: Optional[RunnableConfig] = None,
             **kwargs: Any,
     ) -> LLMResult:
         """Pass a sequence of prompts to a model and return generations.
@@ -105,18 +568,75 @@ class BaseLLM(BaseLanguageModel[str], ABC):
                 first occurrence of any of these substrings.
             callbacks: Callbacks to pass through. Used for executing additional
                 functionality, such as logging or streaming, throughout generation.
+            config: The RunnableConfig of the calling run. 'max_concurrency' bounds
+                how many prompts are sent to the model at the same time.
             **kwargs: Arbitrary additional keyword arguments. These are usually passed
                 to the model provider API call.
 
         Returns:
             An LLMResult, which contains a list of candidate Generations for each input
-                prompt and additional model provider-specific output.
+                prompt and additional model provider-specific output. Generations are
+                in the same order as ``prompts``.
         """
 
-        output = self._generate_helper(
-            prompts, stop, [], True, **kwargs)
+        params = self._get_llm_params(stop=stop, **kwargs)
+        (
+            existing_prompts,
+            llm_string,
+            missing_prompt_idxs,
+            missing_prompts,
+        ) = get_prompts(params, prompts, self.cache)
+        tracer.event(
+            "llm.cache_lookup", prompts=len(prompts), cached=len(existing_prompts)
+        )
+        if not missing_prompts:
+            return LLMResult(
+                generations=[existing_prompts[i] for i in range(len(prompts))],
+                llm_output={},
+            )
 
-        return output
+        callback_manager = CallbackManager.configure(
+            callbacks,
+            self.callbacks,
+            self.verbose,
+            cast(Optional[List[str]], tags),
+            self.tags,
+            cast(Optional[Dict[str, Any]], metadata),
+            self.metadata,
+        )
+
+        def _send(prompts_to_send: List[str]) -> LLMResult:
+            run_managers = callback_manager.on_llm_start(
+                self._get_serialized(),
+                prompts_to_send,
+                options={"stop": stop},
+                name=run_name,
+                run_id=cast(Optional[uuid.UUID], run_id),
+                batch_size=len(prompts_to_send),
+            )
+            return self._generate_helper(
+                prompts_to_send, stop, run_managers, True, config=config, **kwargs)
+
+        with deadline_context(get_deadline(config)), tracer.span(
+            "llm.generate", prompts=len(missing_prompts)
+        ):
+            if self.coalesce_requests:
+                new_results = generate_coalesced(llm_string, missing_prompts, _send)
+            else:
+                new_results = _send(missing_prompts)
+        if not existing_prompts:
+            update_cache(
+                existing_prompts, llm_string, missing_prompt_idxs, new_results,
+                prompts, self.cache,
+            )
+            return new_results
+
+        llm_output = update_cache(
+            existing_prompts, llm_string, missing_prompt_idxs, new_results,
+            prompts, self.cache,
+        )
+        generations = [existing_prompts[i] for i in range(len(prompts))]
+        return LLMResult(generations=generations, llm_output=llm_output)
 
     def _generate_helper(
             self,
@@ -124,6 +644,7 @@ class BaseLLM(BaseLanguageModel[str], ABC):
             stop: Optional[List[str]],
             run_managers: List[Any],  # List[CallbackManagerForLLMRun],
             new_arg_supported: bool,
+            config: Optional[RunnableConfig] = None,
             **kwargs: Any,
     ) -> LLMResult:
         try:
@@ -133,6 +654,7 @@ class BaseLLM(BaseLanguageModel[str], ABC):
                     stop=stop,
                     # TODO: support multiple run managers
                     run_manager=run_managers[0] if run_managers else None,
+                    config=config,
                     **kwargs,
                 )
                 if new_arg_supported
@@ -143,6 +665,137 @@ class BaseLLM(BaseLanguageModel[str], ABC):
                 run_manager.on_llm_error(e, response=LLMResult(generations=[]))
             raise e
 
+        flattened_outputs = output.flatten()
+        for manager, flattened_output in zip(run_managers, flattened_outputs):
+            manager.on_llm_end(flattened_output)
+
+        return output
+
+    async def agenerate(
+            self,
+            prompts: List[str],
+            stop: Optional[List[str]] = None,
+            callbacks: Callbacks = None,
+            *,
+            tags: Optional[Union[List[str], List[List[str]]]] = None,
+            metadata: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None,
+            run_name: Optional[Union[str, List[str]]] = None,
+            run_id: Optional[Union[uuid.UUID, List[Optional[uuid.UUID]]]] = None,
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Any,
+    ) -> LLMResult:
+        """Asynchronously pass a sequence of prompts to a model and return generations.
+
+        The async twin of ``generate``. Models with a native async client run every
+        prompt on the current event loop instead of occupying a thread per request.
+
+        Args:
+            prompts: List of string prompts.
+            stop: Stop words to use when generating. Model output is cut off at the
+                first occurrence of any of these substrings.
+            callbacks: Callbacks to pass through. Used for executing additional
+                functionality, such as logging or streaming, throughout generation.
+            config: The RunnableConfig of the calling run. 'max_concurrency' bounds
+                how many prompts are awaited at the same time.
+            **kwargs: Arbitrary additional keyword arguments. These are usually passed
+                to the model provider API call.
+
+        Returns:
+            An LLMResult, which contains a list of candidate Generations for each input
+                prompt and additional model provider-specific output. Generations are
+                in the same order as ``prompts``.
+        """
+        params = self._get_llm_params(stop=stop, **kwargs)
+        (
+            existing_prompts,
+            llm_string,
+            missing_prompt_idxs,
+            missing_prompts,
+        ) = get_prompts(params, prompts, self.cache)
+        tracer.event(
+            "llm.cache_lookup", prompts=len(prompts), cached=len(existing_prompts)
+        )
+        if not missing_prompts:
+            return LLMResult(
+                generations=[existing_prompts[i] for i in range(len(prompts))],
+                llm_output={},
+            )
+
+        callback_manager = AsyncCallbackManager.configure(
+            callbacks,
+            self.callbacks,
+            self.verbose,
+            cast(Optional[List[str]], tags),
+            self.tags,
+            cast(Optional[Dict[str, Any]], metadata),
+            self.metadata,
+        )
+
+        async def _send(prompts_to_send: List[str]) -> LLMResult:
+            run_managers = await callback_manager.on_llm_start(
+                self._get_serialized(),
+                prompts_to_send,
+                options={"stop": stop},
+                name=run_name,
+                run_id=cast(Optional[uuid.UUID], run_id),
+                batch_size=len(prompts_to_send),
+            )
+            return await self._agenerate_helper(
+                prompts_to_send, stop, run_managers, True, config=config, **kwargs)
+
+        with deadline_context(get_deadline(config)), tracer.span(
+            "llm.agenerate", prompts=len(missing_prompts)
+        ):
+            if self.coalesce_requests:
+                new_results = await agenerate_coalesced(
+                    llm_string, missing_prompts, _send
+                )
+            else:
+                new_results = await _send(missing_prompts)
+        if not existing_prompts:
+            update_cache(
+                existing_prompts, llm_string, missing_prompt_idxs, new_results,
+                prompts, self.cache,
+            )
+            return new_results
+
+        llm_output = update_cache(
+            existing_prompts, llm_string, missing_prompt_idxs, new_results,
+            prompts, self.cache,
+        )
+        generations = [existing_prompts[i] for i in range(len(prompts))]
+        return LLMResult(generations=generations, llm_output=llm_output)
+
+    async def _agenerate_helper(
+            self,
+            prompts: List[str],
+            stop: Optional[List[str]],
+            run_managers: List[Any],  # List[AsyncCallbackManagerForLLMRun],
+            new_arg_supported: bool,
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Any,
+    ) -> LLMResult:
+        try:
+            output = (
+                await self._agenerate(
+                    prompts,
+                    stop=stop,
+                    run_manager=run_managers[0] if run_managers else None,
+                    config=config,
+                    **kwargs,
+                )
+                if new_arg_supported
+                else await self._agenerate(prompts, stop=stop)
+            )
+        except BaseException as e:
+            for run_manager in run_managers:
+                await run_manager.on_llm_error(e, response=LLMResult(generations=[]))
+            raise e
+
+        flattened_outputs = output.flatten()
+        for manager, flattened_output in zip(run_managers, flattened_outputs):
+            await manager.on_llm_end(flattened_output)
+
         return output
 
     @abstractmethod
@@ -151,6 +804,7 @@ class BaseLLM(BaseLanguageModel[str], ABC):
             prompts: List[str],
             stop: Optional[List[str]] = None,
             run_manager: Any = None,  # Optional[CallbackManagerForLLMRun] = None,
+            config: Optional[RunnableConfig] = None,
             **kwargs: Any,
     ) -> LLMResult:
         """Run the LLM on the given prompts."""
@@ -166,6 +820,99 @@ class BaseLLM(BaseLanguageModel[str], ABC):
 
         return res
 
+    async def _agenerate(
+            self,
+            prompts: List[str],
+            stop: Optional[List[str]] = None,
+            run_manager: Any = None,  # Optional[AsyncCallbackManagerForLLMRun] = None,
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Any,
+    ) -> LLMResult:
+        """Run the LLM on the given prompts asynchronously.
+
+        Falls back to running ``_generate`` in an executor; override for native async.
+        """
+        return await run_in_executor(
+            None,
+            self._generate,
+            prompts,
+            stop,
+            run_manager,
+            config,
+            **kwargs,
+        )
+
+    def _stream(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        """Stream the LLM on the given prompt.
+
+        Models that can stream override this to yield chunks as the backend
+        produces them, calling ``run_manager.on_llm_new_token`` for each one.
+        """
+        raise NotImplementedError()
+
+    async def _astream(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        """Stream the LLM on the given prompt asynchronously.
+
+        Falls back to pulling chunks from ``_stream`` in an executor; override for
+        native async streaming.
+        """
+        iterator = await run_in_executor(
+            None,
+            self._stream,
+            prompt,
+            stop,
+            run_manager.get_sync() if run_manager else None,
+            **kwargs,
+        )
+        done = object()
+        while True:
+            item = await run_in_executor(
+                None,
+                next,
+                iterator,
+                done,  # type: ignore[call-arg, arg-type]
+            )
+            if item is done:
+                break
+            yield item  # type: ignore[misc]
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        """Get the identifying parameters."""
+        return {}
+
+    @property
+    @abstractmethod
+    def _llm_type(self) -> str:
+        """Return type of llm."""
+
+    def _get_llm_params(
+            self, stop: Optional[List[str]] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        """Get the parameters that identify a call, used to build the cache key."""
+        return {
+            **self._identifying_params,
+            **kwargs,
+            "_type": self._llm_type,
+            "stop": stop,
+        }
+
+    def _get_serialized(self) -> Dict[str, Any]:
+        """Describe this model to callback handlers on run start."""
+        return {"name": self.get_name()}
+
     def _convert_input(self, input):
         return input
 
@@ -192,33 +939,88 @@ class LLM(BaseLLM):
             prompts: List[str],
             stop: Optional[List[str]] = None,
             run_manager: Any = None,  # Optional[CallbackManagerForLLMRun] = None,
+            config: Optional[RunnableConfig] = None,
             **kwargs: Any,
     ) -> LLMResult:
-        """Run the LLM on the given prompt and input."""
-        # TODO: add caching here.
-        generations = []
+        """Run the LLM on the given prompts and input.
 
-        text = "This is output"
-        g = Generation(
-            text=text,
-            generation_info={"token": str("test")}, )
+        Prompts are sent to ``_call`` concurrently on a thread pool bounded by
+        ``config["max_concurrency"]``. Generations keep the order of ``prompts``.
+        """
+        new_arg_supported = inspect.signature(self._call).parameters.get("run_manager")
 
-        res = LLMResult(generations=[[g]], llm_output={})
+        def _call_one(prompt: str) -> List[Generation]:
+            # Prompts still queued when the deadline passes are not sent.
+            check_deadline()
+            with tracer.span("llm.call", prompt_chars=len(prompt)):
+                text = (
+                    self._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+                    if new_arg_supported
+                    else self._call(prompt, stop=stop, **kwargs)
+                )
+            return [Generation(text=text)]
+
+        if len(prompts) <= 1:
+            # Nothing to fan out, skip the thread pool.
+            return LLMResult.construct_trusted(
+                [_call_one(prompt) for prompt in prompts]
+            )
 
-        print("Prompt ", prompts[0])
+        with get_executor_for_config(config) as executor:
+            generations = list(executor.map(_call_one, prompts))
 
-        self._call(prompt=prompts[0], stop=stop, run_manager=run_manager, **kwargs)
-        # new_arg_supported = inspect.signature(self._call).parameters.get("run_manager")
-        # for prompt in prompts:
-        #     text = (
-        #         self._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
-        #         if new_arg_supported
-        #         else self._call(prompt, stop=stop, **kwargs)
-        #     )
-        #     generations.append([Generation(text=text)])
-        # return LLMResult(generations=generations)
+        return LLMResult.construct_trusted(generations)
 
-        return res
+    async def _acall(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Any = None,  # Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> str:
+        """Run the LLM on the given prompt and input asynchronously.
+
+        Falls back to running ``_call`` in an executor; override for native async.
+        """
+        return await run_in_executor(
+            None,
+            self._call,
+            prompt,
+            stop,
+            run_manager.get_sync() if run_manager else None,
+            **kwargs,
+        )
+
+    async def _agenerate(
+            self,
+            prompts: List[str],
+            stop: Optional[List[str]] = None,
+            run_manager: Any = None,  # Optional[AsyncCallbackManagerForLLMRun] = None,
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Any,
+    ) -> LLMResult:
+        """Run the LLM on the given prompts and input asynchronously.
+
+        Every prompt is awaited on the running event loop, at most
+        ``config["max_concurrency"]`` at a time. Generations keep the order of
+        ``prompts``.
+        """
+        new_arg_supported = inspect.signature(self._acall).parameters.get("run_manager")
+
+        async def _acall_one(prompt: str) -> List[Generation]:
+            with tracer.span("llm.acall", prompt_chars=len(prompt)):
+                text = await await_with_deadline(
+                    self._acall(prompt, stop=stop, run_manager=run_manager, **kwargs)
+                    if new_arg_supported
+                    else self._acall(prompt, stop=stop, **kwargs)
+                )
+            return [Generation(text=text)]
+
+        generations = await gather_with_concurrency(
+            (config or {}).get("max_concurrency"),
+            *(_acall_one(prompt) for prompt in prompts),
+        )
+        return LLMResult.construct_trusted(generations)
 
 
 if __name__ == '__main__':
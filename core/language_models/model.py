@@ -4,19 +4,80 @@
         --> LLM(_call:abstract) [_generate() -> _call()]
             --> <name>(_call:override)
 """
+import asyncio
+import re
 from abc import ABC
+from functools import lru_cache
 
-from pydantic.v1 import Field, BaseModel
-from typing import Any, Optional, List, Dict, Mapping
+from pydantic.v1 import Field, BaseModel, ValidationError
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, List, Dict, Mapping, Tuple, TypeVar, Union
 
 from pydantic import SecretStr
 from pydantic.v1 import root_validator
 
+from core.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
 from core.env import get_from_dict_or_env
-from core.language_models.ModelClient import SideKickClient
+from core.exceptions import DeadlineExceededError, RequestCancelledError
+from core.language_models.ModelClient import (
+    AI_PROMPT,
+    HUMAN_PROMPT,
+    RETRYABLE_ERRORS,
+    AsyncSideKickClient,
+    Completion,
+    SideKickClient,
+)
 from core.language_models.base import BaseLanguageModel
-from core.language_models.llms import LLM
-from core.utils import convert_to_secret_str, get_pydantic_field_names, build_extra_kwargs
+from core.language_models.hedging import RequestHedger
+from core.language_models.llms import LLM, create_base_retry_decorator
+from core.language_models.retry import CircuitBreaker, RetryBudget
+from core.language_models.stop_sequences import get_stop_sequence_matcher
+from core.outputs.generation import GenerationChunk
+from core.rate_limiters import BaseRateLimiter
+from core.runnables.config import check_deadline
+from core.tracing import get_tracer
+from core.utils import (
+    build_extra_kwargs,
+    convert_to_secret_str,
+    get_pydantic_field_aliases,
+    get_pydantic_field_names,
+)
+
+tracer = get_tracer(__name__)
+
+
+_CHARS_PER_TOKEN = 4
+"""Rough number of prompt characters per token, used to estimate request size."""
+
+_CLIENT_FIELDS = frozenset(
+    {
+        "client",
+        "async_client",
+        "anthropic_api_url",
+        "anthropic_api_key",
+        "default_request_timeout",
+        "connection_pool_size",
+    }
+)
+"""Fields the clients are built from, which ``with_overrides`` cannot change."""
+
+M = TypeVar("M", bound="SideKickCommon")
+
+
+@lru_cache(maxsize=64)
+def _get_clients(
+        base_url: str, api_key: str, timeout: float, pool_maxsize: int
+) -> Tuple[SideKickClient, AsyncSideKickClient]:
+    """Get clients for the settings, shared by every model that uses them."""
+    # Retries happen in _completion, where they are reported to callbacks.
+    client_params = dict(
+        base_url=base_url,
+        api_key=api_key,
+        timeout=timeout,
+        max_retries=0,
+        pool_maxsize=pool_maxsize,
+    )
+    return SideKickClient(**client_params), AsyncSideKickClient(**client_params)
+
 
 
 class SideKickCommon(BaseLanguageModel):
@@ -48,7 +109,28 @@ class SideKickCommon(BaseLanguageModel):
     max_retries: int = 2
     """Number of retries allowed for requests sent to the Anthropic Completion API."""
 
+    retry_min_seconds: float = 0.5
+    """Wait before the first retry; doubles with every retry, plus jitter."""
+
+    retry_max_seconds: float = 8.0
+    """Longest wait between two retries, including waits the backend asks for."""
+
+    retry_budget: Optional[RetryBudget] = Field(default=None, exclude=True)
+    """Caps retries to a share of the requests sent. Unlimited if None."""
+
+    circuit_breaker: Optional[CircuitBreaker] = Field(default=None, exclude=True)
+    """Fails requests fast while the backend keeps failing. Disabled if None."""
+
+    hedger: Optional[RequestHedger] = Field(default=None, exclude=True)
+    """Resends requests slower than most and keeps the first answer. Streaming
+    requests are not hedged. Disabled if None."""
+
     anthropic_api_url: Optional[str] = None
+    """Url of the SideKick server. Defaults to ``http://localhost:8000``."""
+
+    connection_pool_size: int = 10
+    """Most connections to the server in use at once, shared by models with the
+    same url and settings."""
 
     # anthropic_api_key: Optional[SecretStr] = None
 
@@ -60,6 +142,13 @@ class SideKickCommon(BaseLanguageModel):
 
     model_kwargs: Dict[str, Any] = Field(default_factory=dict)
 
+    rate_limiter: Optional[BaseRateLimiter] = Field(default=None, exclude=True)
+    """Client-side rate limiter acquired before every request to the backend.
+
+    Shared by the sync and async call paths; share one instance between models
+    that draw on the same quota.
+    """
+
     @root_validator(pre=True)
     def build_extra(cls, values: Dict) -> Dict:
         extra = values.get("model_kwargs", {})
@@ -72,73 +161,144 @@ class SideKickCommon(BaseLanguageModel):
     @root_validator()
     def validate_environment(cls, values: Dict) -> Dict:
         """Validate that api key and python package exists in environment."""
-
-        print("Running root validator")
-        print(values)
-
         values["anthropic_api_key"] = convert_to_secret_str(
             get_from_dict_or_env(values, "anthropic_api_key", "ANTHROPIC_API_KEY")
         )
 
         # Get custom api url from environment.
-        # values["anthropic_api_url"] = get_from_dict_or_env(
-        #     values,
-        #     "anthropic_api_url",
-        #     "ANTHROPIC_API_URL",
-        #     default="https://api.anthropic.com",
-        # )
-
-        try:
-            # import anthropic
-
-            # check_package_version("anthropic", gte_version="0.3")
-
-            # values["client"] = anthropic.Anthropic(
-            #     base_url=values["anthropic_api_url"],
-            #     api_key=values["anthropic_api_key"].get_secret_value(),
-            #     timeout=values["default_request_timeout"],
-            #     max_retries=values["max_retries"],
-            # )
-
-            values["client"] = SideKickClient(
-                base_url='localhost',
-                api_key='sk_123',
-                timeout=10,
-                max_retries=3
-            )
+        values["anthropic_api_url"] = get_from_dict_or_env(
+            values,
+            "anthropic_api_url",
+            "ANTHROPIC_API_URL",
+            default="http://localhost:8000",
+        )
 
-            values['HUMAN_PROMPT'] = 'THIS IS HUMAN PROMPT'
-
-            # values["async_client"] = anthropic.AsyncAnthropic(
-            #     base_url=values["anthropic_api_url"],
-            #     api_key=values["anthropic_api_key"].get_secret_value(),
-            #     timeout=values["default_request_timeout"],
-            #     max_retries=values["max_retries"],
-            # )
-            # values["HUMAN_PROMPT"] = anthropic.HUMAN_PROMPT
-            # values["AI_PROMPT"] = anthropic.AI_PROMPT
-            # values["count_tokens"] = values["client"].count_tokens
-
-        except ImportError:
-            raise ImportError(
-                "Could not import anthropic python package. "
-                "Please it install it with `pip install anthropic`."
-            )
+        # Models with the same url and settings share their clients, and with
+        # them the connection pool.
+        values["client"], values["async_client"] = _get_clients(
+            values["anthropic_api_url"],
+            values["anthropic_api_key"].get_secret_value(),
+            values["default_request_timeout"] or 600,
+            values["connection_pool_size"],
+        )
+        values["HUMAN_PROMPT"] = HUMAN_PROMPT
+        values["AI_PROMPT"] = AI_PROMPT
+        tracer.event("model.validate_environment", url=values["anthropic_api_url"])
 
         return values
 
+    def with_overrides(self: M, **overrides: Any) -> M:
+        """Copy the model with some fields changed, e.g. for a per-request variant.
+
+        Much cheaper than building a new model: only the overridden values are
+        validated, the model validators do not run again, and the copy shares
+        the clients, rate limiter, retry budget, circuit breaker and hedger.
+        Fields may be given by name or alias.
+
+        Example:
+            .. code-block:: python
+
+                creative = model.with_overrides(temperature=0.9, max_tokens=1024)
+
+        Raises:
+            ValueError: If an override is not a field of the model, or is one
+                the clients are built from, like ``anthropic_api_url``; build a
+                new model to change those.
+            ValidationError: If an overridden value is invalid.
+        """
+        cls = type(self)
+        field_aliases = get_pydantic_field_aliases(cls)
+        update: Dict[str, Any] = {}
+        for key, value in overrides.items():
+            name = field_aliases.get(key)
+            if name is None:
+                raise ValueError(
+                    f"{key} is not a field of {cls.__name__}; pass it in "
+                    f"model_kwargs instead."
+                )
+            if name in _CLIENT_FIELDS:
+                raise ValueError(
+                    f"{key} cannot be overridden as the clients depend on it; "
+                    f"create a new {cls.__name__} instead."
+                )
+            value, errors = self.__fields__[name].validate(
+                value, update, loc=key, cls=cls
+            )
+            if errors:
+                raise ValidationError([errors], cls)
+            update[name] = value
+        return self._copy_and_set_values(
+            {**self.__dict__, **update},
+            self.__fields_set__ | update.keys(),
+            deep=False,
+        )
+
     def _get_anthropic_stop(self, stop: Optional[List[str]] = None) -> List[str]:
+        """Get the stop sequences to send, without changing the caller's list."""
+        if not self.HUMAN_PROMPT or not self.AI_PROMPT:
+            raise NameError("Please ensure the anthropic package is loaded")
 
+        # Never want model to invent new turns of Human / Assistant dialog.
+        return [*(stop or []), self.HUMAN_PROMPT]
+
+    def _truncate_stream(
+            self, stream: Iterator[Completion], stop: List[str]
+    ) -> Iterator[str]:
+        """Yield the streamed text before the first stop sequence.
+
+        The stream is closed as soon as a stop sequence is seen, so no more
+        tokens are generated for text that would be thrown away.
+        """
+        scanner = get_stop_sequence_matcher(tuple(stop)).scanner()
+        try:
+            for token in stream:
+                text = scanner.feed(token.completion)
+                if text:
+                    yield text
+                if scanner.stopped:
+                    return
+            text = scanner.flush()
+            if text:
+                yield text
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+    async def _atruncate_stream(
+            self, stream: AsyncIterator[Completion], stop: List[str]
+    ) -> AsyncIterator[str]:
+        """Async version of ``_truncate_stream``."""
+        scanner = get_stop_sequence_matcher(tuple(stop)).scanner()
+        try:
+            async for token in stream:
+                text = scanner.feed(token.completion)
+                if text:
+                    yield text
+                if scanner.stopped:
+                    return
+            text = scanner.flush()
+            if text:
+                yield text
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def _wrap_prompt(self, prompt: str) -> str:
         if not self.HUMAN_PROMPT or not self.AI_PROMPT:
             raise NameError("Please ensure the anthropic package is loaded")
 
-        if stop is None:
-            stop = []
+        if prompt.startswith(self.HUMAN_PROMPT):
+            return prompt  # Already wrapped.
 
-        # Never want model to invent new turns of Human / Assistant dialog.
-        stop.extend([self.HUMAN_PROMPT])
+        # Guard against common errors in specifying wrong number of newlines.
+        corrected_prompt, n_subs = re.subn(r"^\n*Human:", self.HUMAN_PROMPT, prompt)
+        if n_subs == 1:
+            return corrected_prompt
 
-        return stop
+        # As a last resort, wrap the prompt ourselves to emulate instruct-style.
+        return f"{self.HUMAN_PROMPT} {prompt}{self.AI_PROMPT} Sure, here you go:\n"
 
     @property
     def _default_params(self) -> Mapping[str, Any]:
@@ -154,14 +314,175 @@ class SideKickCommon(BaseLanguageModel):
         if self.top_p is not None:
             d["top_p"] = self.top_p
 
-        print(d)
-        print(self.model_kwargs)
-
         return {**d}
 
+    @property
+    def _identifying_params(self) -> Mapping[str, Any]:
+        """Get the identifying parameters."""
+        return {**{"model_kwargs": self.model_kwargs}, **self._default_params}
+
+    def _estimate_tokens(self, params: Mapping[str, Any]) -> int:
+        """Estimate the tokens a request consumes: its prompt plus the most it may
+        generate."""
+        prompt_tokens = len(params.get("prompt", "")) // _CHARS_PER_TOKEN + 1
+        return prompt_tokens + params.get("max_tokens_to_sample", 0)
+
+    def _create_retry_decorator(
+            self,
+            run_manager: Optional[
+                Union[AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun]
+            ] = None,
+    ) -> Callable[[Any], Any]:
+        return create_base_retry_decorator(
+            error_types=list(RETRYABLE_ERRORS),
+            max_retries=self.max_retries,
+            run_manager=run_manager,
+            min_seconds=self.retry_min_seconds,
+            max_seconds=self.retry_max_seconds,
+            retry_budget=self.retry_budget,
+        )
+
+    def _record_outcome(self, error: Optional[BaseException], trial: bool) -> None:
+        """Report the outcome of a request to the circuit breaker.
+
+        ``trial`` means the request was the circuit breaker's half-open trial.
+        """
+        if self.circuit_breaker is None:
+            return
+        # A cancelled or timed out request says nothing about the backend, but
+        # as a trial it must make way for another one.
+        if isinstance(
+            error,
+            (RequestCancelledError, DeadlineExceededError, asyncio.CancelledError),
+        ):
+            if trial:
+                self.circuit_breaker.release_trial()
+            return
+        # Any answer other than a backend failure shows the backend is up.
+        if isinstance(error, RETRYABLE_ERRORS):
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
+    def _completion(
+            self,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **params: Any,
+    ) -> Any:
+        """Send one completion request through ``client``, hedging it if enabled."""
+        if self.hedger is None or params.get("stream"):
+            return self._send_completion(run_manager, **params)
+
+        def admit() -> bool:
+            # A hedge must not wait for, or overdraw, the rate limit budget.
+            return self.rate_limiter is None or self.rate_limiter.acquire(
+                tokens=self._estimate_tokens(params), blocking=False
+            )
+
+        return self.hedger.run(
+            lambda: self._send_completion(run_manager, **params),
+            lambda: self._send_completion(run_manager, admitted=True, **params),
+            admit=admit,
+        )
+
+    async def _acompletion(
+            self,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **params: Any,
+    ) -> Any:
+        """Send one completion request through ``async_client``, hedging it if
+        enabled."""
+        if self.hedger is None or params.get("stream"):
+            return await self._asend_completion(run_manager, **params)
+
+        async def admit() -> bool:
+            # A hedge must not wait for, or overdraw, the rate limit budget.
+            return self.rate_limiter is None or await self.rate_limiter.aacquire(
+                tokens=self._estimate_tokens(params), blocking=False
+            )
+
+        return await self.hedger.arun(
+            lambda: self._asend_completion(run_manager, **params),
+            lambda: self._asend_completion(run_manager, admitted=True, **params),
+            admit=admit,
+        )
+
+    def _send_completion(
+            self,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            *,
+            admitted: bool = False,
+            **params: Any,
+    ) -> Any:
+        """Send a completion request, retrying on backend errors.
+
+        ``admitted`` means the rate limiter was already acquired for the first
+        attempt.
+        """
+        if self.retry_budget is not None:
+            self.retry_budget.record_request()
+        skip_rate_limiter = admitted
+
+        @self._create_retry_decorator(run_manager)
+        def _completion_with_retry(**kwargs: Any) -> Any:
+            nonlocal skip_rate_limiter
+            if self.rate_limiter is not None and not skip_rate_limiter:
+                with tracer.span("model.rate_limit"):
+                    self.rate_limiter.acquire(tokens=self._estimate_tokens(kwargs))
+                check_deadline()
+            skip_rate_limiter = False
+            # Only once admitted: a half-open trial must end in an outcome.
+            trial = (
+                self.circuit_breaker is not None
+                and self.circuit_breaker.before_request()
+            )
+            try:
+                with tracer.span("model.request", stream=bool(kwargs.get("stream"))):
+                    response = self.client.completions.create(**kwargs)
+            except BaseException as e:
+                self._record_outcome(e, trial)
+                raise
+            self._record_outcome(None, trial)
+            return response
+
+        return _completion_with_retry(**params)
+
+    async def _asend_completion(
+            self,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            *,
+            admitted: bool = False,
+            **params: Any,
+    ) -> Any:
+        """Async version of ``_send_completion``."""
+        if self.retry_budget is not None:
+            self.retry_budget.record_request()
+        skip_rate_limiter = admitted
+
+        @self._create_retry_decorator(run_manager)
+        async def _acompletion_with_retry(**kwargs: Any) -> Any:
+            nonlocal skip_rate_limiter
+            if self.rate_limiter is not None and not skip_rate_limiter:
+                with tracer.span("model.rate_limit"):
+                    await self.rate_limiter.aacquire(
+                        tokens=self._estimate_tokens(kwargs)
+                    )
+            skip_rate_limiter = False
+            # Only once admitted: a half-open trial must end in an outcome.
+            trial = (
+                self.circuit_breaker is not None
+                and self.circuit_breaker.before_request()
+            )
+            try:
+                with tracer.span("model.request", stream=bool(kwargs.get("stream"))):
+                    response = await self.async_client.completions.create(**kwargs)
+            except BaseException as e:
+                self._record_outcome(e, trial)
+                raise
+            self._record_outcome(None, trial)
+            return response
 
-class CallbackManagerForLLMRun:
-    pass
+        return await _acompletion_with_retry(**params)
 
 
 class SideKickModel(SideKickCommon, LLM):
@@ -225,21 +546,130 @@ class SideKickModel(SideKickCommon, LLM):
                 response = model(prompt)
 
         """
-        stop = []  # self._get_anthropic_stop(stop)
+        if self.streaming:
+            completion = ""
+            for chunk in self._stream(
+                    prompt=prompt, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                completion += chunk.text
+            return completion
+
+        stop = self._get_anthropic_stop(stop)
         params = {**self._default_params, **kwargs}
 
-        print("We are inside call function")
+        response = self._completion(
+            run_manager=run_manager,
+            prompt=self._wrap_prompt(prompt),
+            stop_sequences=stop,
+            **params,
+        )
+        return get_stop_sequence_matcher(tuple(stop)).truncate(response.completion)
 
-        print("Processing ....")
+    async def _acall(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Any = None,  # Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> str:
+        """Call out to Sidekick's completion endpoint asynchronously.
 
-        print("client = ", self.client)
+        Awaits ``async_client`` on the running event loop, so concurrent requests
+        share the loop instead of holding a thread each.
+        """
+        if self.streaming:
+            completion = ""
+            async for chunk in self._astream(
+                    prompt=prompt, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                completion += chunk.text
+            return completion
+
+        stop = self._get_anthropic_stop(stop)
+        params = {**self._default_params, **kwargs}
 
-        response = self.client.completions.create(
+        response = await self._acompletion(
+            run_manager=run_manager,
             prompt=self._wrap_prompt(prompt),
             stop_sequences=stop,
             **params,
         )
-        return response.completion
+        return get_stop_sequence_matcher(tuple(stop)).truncate(response.completion)
+
+    def _stream(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        r"""Call Sidekick completion_stream and return the resulting generator.
+
+        Args:
+            prompt: The prompt to pass into the model.
+            stop: Optional list of stop words to use when generating.
+
+        Returns:
+            A generator representing the stream of tokens from Sidekick.
+
+        Example:
+            .. code-block:: python
+
+                prompt = "Write a poem about a stream."
+                prompt = f"\n\nHuman: {prompt}\n\nAssistant:"
+                generator = model.stream(prompt)
+                for token in generator:
+                    yield token
+        """
+        stop = self._get_anthropic_stop(stop)
+        params = {**self._default_params, **kwargs}
+
+        stream = self._completion(
+            run_manager=run_manager,
+            prompt=self._wrap_prompt(prompt),
+            stop_sequences=stop,
+            stream=True,
+            **params,
+        )
+        for text in self._truncate_stream(stream, stop):
+            chunk = GenerationChunk(text=text)
+
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        """Call Sidekick completion_stream asynchronously and yield the chunks.
+
+        Args:
+            prompt: The prompt to pass into the model.
+            stop: Optional list of stop words to use when generating.
+
+        Returns:
+            An async generator representing the stream of tokens from Sidekick.
+        """
+        stop = self._get_anthropic_stop(stop)
+        params = {**self._default_params, **kwargs}
+
+        stream = await self._acompletion(
+            run_manager=run_manager,
+            prompt=self._wrap_prompt(prompt),
+            stop_sequences=stop,
+            stream=True,
+            **params,
+        )
+        async for text in self._atruncate_stream(stream, stop):
+            chunk = GenerationChunk(text=text)
+
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
 
 
 if __name__ == '__main__':
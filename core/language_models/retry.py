@@ -0,0 +1,179 @@
+"""Retry budget, circuit breaker and wait strategy for requests to the backend."""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional
+
+from tenacity import RetryCallState
+from tenacity.wait import wait_base
+
+from core.exceptions import APIStatusError, CircuitOpenError
+from core.runnables.config import remaining_time
+
+
+class RetryBudget:
+    """Caps retries to a fraction of the requests sent.
+
+    Every request deposits ``ratio`` into the budget and every retry withdraws
+    one, so while the backend is failing retries add at most ``ratio`` extra
+    load instead of multiplying it by ``max_retries``. ``min_retries`` is the
+    initial balance and the most that can be saved up, so a low-traffic client
+    can still retry. Safe to share between threads and models.
+
+    Example:
+        .. code-block:: python
+
+            # Retry at most one request in ten, plus a reserve of 10 retries.
+            model = SideKickModel(retry_budget=RetryBudget(ratio=0.1))
+    """
+
+    def __init__(self, ratio: float = 0.1, min_retries: int = 10) -> None:
+        """Initialize the retry budget.
+
+        Args:
+            ratio: The retries allowed per request sent.
+            min_retries: The retries allowed without any requests sent.
+        """
+        if ratio < 0:
+            raise ValueError("ratio must not be negative")
+        if min_retries < 0:
+            raise ValueError("min_retries must not be negative")
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self._balance = float(min_retries)
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        """Deposit the share of a new request."""
+        with self._lock:
+            self._balance = min(
+                self._balance + self.ratio, max(float(self.min_retries), 1.0)
+            )
+
+    def try_withdraw(self) -> bool:
+        """Withdraw a retry, returning False if the budget is exhausted."""
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Fails fast while the backend is down.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    requests raise ``CircuitOpenError`` without being sent. Once
+    ``recovery_timeout`` seconds have passed a single trial request is let
+    through: its success closes the circuit, its failure opens it again. A trial
+    that ends without an outcome must be given up with ``release_trial`` so
+    another request can take its place. Safe to share between threads and
+    models.
+
+    Example:
+        .. code-block:: python
+
+            breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=30)
+            model = SideKickModel(circuit_breaker=breaker)
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+            self, failure_threshold: int = 5, recovery_timeout: float = 30.0
+    ) -> None:
+        """Initialize the circuit breaker.
+
+        Args:
+            failure_threshold: The consecutive failures that open the circuit.
+            recovery_timeout: Seconds to wait before sending a trial request.
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """The state of the circuit: closed, open or half_open."""
+        with self._lock:
+            return self._state
+
+    def before_request(self) -> bool:
+        """Check that a request may be sent.
+
+        Returns:
+            bool: Whether the request is the half-open trial.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with a trial
+                request already in flight.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return False
+            if (
+                self._state == self.OPEN
+                and time.monotonic() - self._opened_at >= self.recovery_timeout
+            ):
+                self._state = self.HALF_OPEN
+                return True
+        raise CircuitOpenError("Circuit breaker is open, not sending request")
+
+    def release_trial(self) -> None:
+        """Give up the trial request without an outcome, so the next request
+        may be the trial instead."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                # The recovery timeout has already passed: keep _opened_at.
+                self._state = self.OPEN
+
+    def record_success(self) -> None:
+        """Record a successful request, closing the circuit."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        """Record a failed request, opening the circuit if needed."""
+        with self._lock:
+            self._failures += 1
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class wait_retry_after(wait_base):
+    """Wait as long as the backend asked to, or fall back to another strategy.
+
+    Honors the ``retry_after`` of an ``APIStatusError``, capped at ``max`` and
+    at the time left before the current deadline.
+    """
+
+    def __init__(self, fallback: wait_base, max: Optional[float] = None) -> None:
+        self.fallback = fallback
+        self.max = max
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        wait = self.fallback(retry_state)
+        outcome = retry_state.outcome
+        if outcome is not None and outcome.failed:
+            retry_after = getattr(outcome.exception(), "retry_after", None)
+            if isinstance(outcome.exception(), APIStatusError) and retry_after:
+                wait = max(wait, retry_after)
+        if self.max is not None:
+            wait = min(wait, self.max)
+        remaining = remaining_time()
+        if remaining is not None:
+            wait = max(0.0, min(wait, remaining))
+        return wait
@@ -0,0 +1,274 @@
+"""Load balancing of SideKick requests over several backend replicas."""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from pydantic.v1 import Field, root_validator
+
+from core.language_models.ModelClient import (
+    RETRYABLE_ERRORS,
+    AsyncSideKickClient,
+    SideKickClient,
+)
+from core.language_models.model import SideKickModel
+
+Balancing = Literal["least_outstanding", "ewma"]
+
+
+class Endpoint:
+    """A backend replica and the load and health observed on it."""
+
+    def __init__(
+            self,
+            client: SideKickClient,
+            async_client: Optional[AsyncSideKickClient] = None,
+    ) -> None:
+        self.client = client
+        self.async_client = async_client
+        self.in_flight = 0
+        self.ewma: Optional[float] = None
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.client.base_url
+
+    def __repr__(self) -> str:
+        return (
+            f"Endpoint({self.name!r}, in_flight={self.in_flight}, "
+            f"ewma={self.ewma}, failures={self.failures})"
+        )
+
+
+class EndpointBalancer:
+    """Picks the endpoint for each request and tracks the endpoints' health.
+
+    With ``least_outstanding`` balancing a request goes to the endpoint with the
+    fewest requests in flight, ties going to the lowest latency. With ``ewma``
+    it goes to the endpoint with the lowest exponentially weighted moving
+    average latency times its requests in flight plus one, so a slow replica
+    gets proportionally less traffic. Remaining ties are broken at random.
+
+    An endpoint that fails ``failure_threshold`` requests in a row with a
+    backend error is ejected for ``ejection_seconds``. If every endpoint is
+    ejected, requests are spread over all of them rather than failing.
+    Safe to share between threads and event loops.
+    """
+
+    def __init__(
+            self,
+            endpoints: Sequence[Endpoint],
+            *,
+            balancing: Balancing = "least_outstanding",
+            failure_threshold: int = 3,
+            ejection_seconds: float = 10.0,
+            ewma_alpha: float = 0.3,
+    ) -> None:
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        self.endpoints = list(endpoints)
+        self.balancing = balancing
+        self.failure_threshold = failure_threshold
+        self.ejection_seconds = ejection_seconds
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def _score(self, endpoint: Endpoint) -> Tuple[float, ...]:
+        # Endpoints without a latency yet are tried first.
+        ewma = endpoint.ewma or 0.0
+        if self.balancing == "ewma":
+            return (ewma * (endpoint.in_flight + 1), endpoint.in_flight)
+        return (endpoint.in_flight, ewma)
+
+    def acquire(self) -> Endpoint:
+        """Pick the endpoint for a request and count the request in flight."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if e.ejected_until <= now]
+            scored = [(self._score(e), e) for e in candidates or self.endpoints]
+            best = min(score for score, _ in scored)
+            endpoint = self._random.choice([e for s, e in scored if s == best])
+            endpoint.in_flight += 1
+            return endpoint
+
+    def release(
+            self,
+            endpoint: Endpoint,
+            latency: float,
+            error: Optional[BaseException] = None,
+    ) -> None:
+        """Count a request out of flight and record how it went."""
+        with self._lock:
+            endpoint.in_flight -= 1
+            if isinstance(error, RETRYABLE_ERRORS):
+                endpoint.failures += 1
+                if endpoint.failures >= self.failure_threshold:
+                    endpoint.ejected_until = time.monotonic() + self.ejection_seconds
+                    endpoint.failures = 0
+                return
+            if error is not None:
+                # The endpoint answered, the request was at fault.
+                return
+            endpoint.failures = 0
+            endpoint.ewma = (
+                latency
+                if endpoint.ewma is None
+                else self.ewma_alpha * latency + (1 - self.ewma_alpha) * endpoint.ewma
+            )
+
+
+class _RoutedCompletions:
+    def __init__(self, balancer: EndpointBalancer) -> None:
+        self._balancer = balancer
+
+    def create(self, **params: Any) -> Any:
+        endpoint = self._balancer.acquire()
+        start = time.monotonic()
+        try:
+            response = endpoint.client.completions.create(**params)
+        except BaseException as e:
+            self._balancer.release(endpoint, time.monotonic() - start, e)
+            raise
+        if params.get("stream"):
+            return self._track_stream(endpoint, start, response)
+        self._balancer.release(endpoint, time.monotonic() - start)
+        return response
+
+    def _track_stream(
+            self, endpoint: Endpoint, start: float, stream: Iterator[Any]
+    ) -> Iterator[Any]:
+        error: Optional[BaseException] = None
+        try:
+            yield from stream
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._balancer.release(endpoint, time.monotonic() - start, error)
+
+
+class _AsyncRoutedCompletions:
+    def __init__(self, balancer: EndpointBalancer) -> None:
+        self._balancer = balancer
+
+    async def create(self, **params: Any) -> Any:
+        endpoint = self._balancer.acquire()
+        if endpoint.async_client is None:
+            error = ValueError(f"Endpoint {endpoint.name} has no async client")
+            self._balancer.release(endpoint, 0.0, error)
+            raise error
+        start = time.monotonic()
+        try:
+            response = await endpoint.async_client.completions.create(**params)
+        except BaseException as e:
+            self._balancer.release(endpoint, time.monotonic() - start, e)
+            raise
+        if params.get("stream"):
+            return self._track_stream(endpoint, start, response)
+        self._balancer.release(endpoint, time.monotonic() - start)
+        return response
+
+    async def _track_stream(
+            self, endpoint: Endpoint, start: float, stream: AsyncIterator[Any]
+    ) -> AsyncIterator[Any]:
+        error: Optional[BaseException] = None
+        try:
+            async for chunk in stream:
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._balancer.release(endpoint, time.monotonic() - start, error)
+
+
+class RoutingClient:
+    """A client that spreads requests over the endpoints of a balancer.
+
+    Has the same ``completions.create`` interface as ``SideKickClient``.
+    """
+
+    def __init__(self, balancer: EndpointBalancer) -> None:
+        self.balancer = balancer
+        self.completions = _RoutedCompletions(balancer)
+
+
+class AsyncRoutingClient:
+    """Async twin of ``RoutingClient``, sharing its balancer."""
+
+    def __init__(self, balancer: EndpointBalancer) -> None:
+        self.balancer = balancer
+        self.completions = _AsyncRoutedCompletions(balancer)
+
+
+class SideKickRouter(SideKickModel):
+    """SideKick model that sends each request to the least loaded of several
+    backend replicas.
+
+    Retries, hedges, rate limiting and caching work as with ``SideKickModel``;
+    a retried or hedged request is routed again, so it usually lands on another
+    replica.
+
+    Example:
+        .. code-block:: python
+
+            model = SideKickRouter(
+                endpoints=["http://replica-1:8000", "http://replica-2:8000"],
+                balancing="ewma",
+            )
+            model.invoke("Tell me a joke")
+    """
+
+    endpoints: List[str] = Field(default_factory=list)
+    """Urls of the backend replicas."""
+
+    balancing: Balancing = "least_outstanding"
+    """How to pick the replica: ``least_outstanding`` or ``ewma``."""
+
+    failure_threshold: int = 3
+    """Consecutive backend failures after which a replica is ejected."""
+
+    ejection_seconds: float = 10.0
+    """How long an ejected replica gets no requests."""
+
+    balancer: Optional[EndpointBalancer] = Field(default=None, exclude=True)
+    """The balancer in use. Built from ``endpoints`` if not given."""
+
+    @root_validator()
+    def validate_endpoints(cls, values: Dict) -> Dict:
+        """Route the model's requests through a balancer over the endpoints."""
+        if values.get("balancer") is None:
+            if not values.get("endpoints"):
+                raise ValueError("SideKickRouter needs at least one endpoint")
+            client: SideKickClient = values["client"]
+            async_client: AsyncSideKickClient = values["async_client"]
+            values["balancer"] = EndpointBalancer(
+                [
+                    Endpoint(
+                        client.model_copy(update={"base_url": url}),
+                        async_client.model_copy(update={"base_url": url}),
+                    )
+                    for url in values["endpoints"]
+                ],
+                balancing=values["balancing"],
+                failure_threshold=values["failure_threshold"],
+                ejection_seconds=values["ejection_seconds"],
+            )
+        values["client"] = RoutingClient(values["balancer"])
+        values["async_client"] = AsyncRoutingClient(values["balancer"])
+        return values
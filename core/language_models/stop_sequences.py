@@ -0,0 +1,172 @@
+"""Client side detection of stop sequences in generated text."""
+from __future__ import annotations
+
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class StopSequenceMatcher:
+    """Finds the first of several stop sequences in text, in linear time.
+
+    Builds an Aho-Corasick automaton over the stop sequences, so the text is
+    scanned once however many stop sequences there are. When stop sequences
+    overlap, the text is cut at the one that starts first. Immutable once
+    built, so one matcher can be shared between threads.
+
+    Example:
+        .. code-block:: python
+
+            matcher = StopSequenceMatcher(["</search_query>", "\\n\\nHuman:"])
+            matcher.truncate("<search_query>otters</search_query> more")
+            # -> "<search_query>otters"
+    """
+
+    def __init__(self, stop_sequences: Iterable[str]) -> None:
+        """Initialize the matcher.
+
+        Args:
+            stop_sequences: The stop sequences to look for. Empty strings are
+                ignored.
+        """
+        self.stop_sequences: List[str] = sorted({s for s in stop_sequences if s})
+        # State 0 is the root; a state is the prefix of a stop sequence.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._depth: List[int] = [0]
+        # Length of the longest stop sequence that is a suffix of the state.
+        self._match: List[int] = [0]
+        for sequence in self.stop_sequences:
+            self._insert(sequence)
+        self._link()
+
+    def __bool__(self) -> bool:
+        return bool(self.stop_sequences)
+
+    def _insert(self, sequence: str) -> None:
+        state = 0
+        for char in sequence:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._depth.append(self._depth[state] + 1)
+                self._match.append(0)
+            state = next_state
+        self._match[state] = len(sequence)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._match[child] = max(
+                    self._match[child], self._match[self._fail[child]]
+                )
+                queue.append(child)
+
+    def _step(self, state: int, char: str) -> int:
+        while state and char not in self._goto[state]:
+            state = self._fail[state]
+        return self._goto[state].get(char, 0)
+
+    def find(self, text: str) -> Optional[int]:
+        """Find where the first stop sequence in ``text`` starts.
+
+        Returns:
+            The index of the first stop sequence, or None if there is none.
+        """
+        scanner = self.scanner()
+        kept = scanner.feed(text) + scanner.flush()
+        return len(kept) if scanner.stopped else None
+
+    def truncate(self, text: str) -> str:
+        """Cut ``text`` before its first stop sequence."""
+        index = self.find(text)
+        return text if index is None else text[:index]
+
+    def scanner(self) -> StopSequenceScanner:
+        """Start scanning a new stream of text."""
+        return StopSequenceScanner(self)
+
+
+class StopSequenceScanner:
+    """Scans streamed text for stop sequences, across chunk boundaries.
+
+    Text that may be the start of a stop sequence is held back until the
+    following chunks show whether it is, so the text returned is exactly the
+    text before the first stop sequence.
+
+    Example:
+        .. code-block:: python
+
+            scanner = matcher.scanner()
+            for chunk in stream:
+                yield scanner.feed(chunk)
+                if scanner.stopped:
+                    stream.close()
+                    break
+            else:
+                yield scanner.flush()
+    """
+
+    def __init__(self, matcher: StopSequenceMatcher) -> None:
+        self.matcher = matcher
+        self.stopped = False
+        """Whether a stop sequence was found."""
+        self._state = 0
+        self._held = ""
+        # Start of the earliest stop sequence found in the held text.
+        self._match: Optional[int] = None
+
+    def feed(self, text: str) -> str:
+        """Scan the next chunk of text.
+
+        Returns:
+            The text that is now known to come before any stop sequence. Empty
+            once ``stopped``.
+        """
+        if self.stopped:
+            return ""
+        matcher = self.matcher
+        held = self._held + text
+        state, match = self._state, self._match
+        for i in range(len(self._held), len(held)):
+            state = matcher._step(state, held[i])
+            length = matcher._match[state]
+            if length and (match is None or i + 1 - length < match):
+                match = i + 1 - length
+            # Stop once no stop sequence starting earlier can still complete.
+            if match is not None and i + 1 - matcher._depth[state] >= match:
+                self.stopped = True
+                self._held = ""
+                return held[:match]
+
+        # Hold back from the start of the longest prefix of a stop sequence; a
+        # stop sequence already found starts at or after it.
+        keep = len(held) - matcher._depth[state]
+        self._state = state
+        self._match = None if match is None else match - keep
+        self._held = held[keep:]
+        return held[:keep]
+
+    def flush(self) -> str:
+        """End the stream, returning the text still held back."""
+        held, match = self._held, self._match
+        self._held, self._match = "", None
+        if match is not None:
+            self.stopped = True
+            return held[:match]
+        return held
+
+
+@lru_cache(maxsize=128)
+def get_stop_sequence_matcher(stop_sequences: Tuple[str, ...]) -> StopSequenceMatcher:
+    """Get the matcher for ``stop_sequences``, reusing it across requests."""
+    return StopSequenceMatcher(stop_sequences)
@@ -19,4 +19,24 @@ class Generation(BaseModel):
     """
     type: Literal["Generation"] = "Generation"
     """Type is used exclusively for serialization purposes."""
-    # TODO: add log probs as separate attribute
\ No newline at end of file
+    # TODO: add log probs as separate attribute
+
+
+class GenerationChunk(Generation):
+    """Generation chunk, which can be concatenated with other Generation chunks."""
+
+    def __add__(self, other: GenerationChunk) -> GenerationChunk:
+        if isinstance(other, GenerationChunk):
+            generation_info = (
+                {**(self.generation_info or {}), **(other.generation_info or {})}
+                if self.generation_info is not None or other.generation_info is not None
+                else None
+            )
+            return GenerationChunk(
+                text=self.text + other.text,
+                generation_info=generation_info,
+            )
+        else:
+            raise TypeError(
+                f"unsupported operand type(s) for +: '{type(self)}' and '{type(other)}'"
+            )
@@ -15,6 +15,67 @@ class LLMResult(BaseModel):
     llm_output: Optional[dict] = None
     """Arbitrary LLM provider-specific output."""
 
+    @classmethod
+    def construct_trusted(
+            cls,
+            generations: List[List[Generation]],
+            llm_output: Optional[dict] = None,
+    ) -> "LLMResult":
+        """Create a result from trusted data, skipping validation.
+
+        A fast path for internal producers such as ``LLM._generate``. Nothing
+        is checked or copied: ``generations`` must hold ``Generation``
+        instances.
+        """
+        result = cls.__new__(cls)
+        object.__setattr__(
+            result, "__dict__", {"generations": generations, "llm_output": llm_output}
+        )
+        object.__setattr__(
+            result,
+            "__pydantic_fields_set__",
+            {"generations"} if llm_output is None else {"generations", "llm_output"},
+        )
+        object.__setattr__(result, "__pydantic_extra__", None)
+        object.__setattr__(result, "__pydantic_private__", None)
+        return result
+
+    def flatten(self) -> List["LLMResult"]:
+        """Flatten generations into a single list.
+
+        Unpack List[List[Generation]] -> List[LLMResult] where each returned LLMResult
+            contains only a single Generation. If token usage information is available,
+            it is kept only for the LLMResult corresponding to the top-choice
+            Generation, to avoid over-counting of token usage downstream.
+
+        Returns:
+            List of LLMResults where each returned LLMResult contains a single
+                Generation.
+        """
+        llm_results = []
+        for i, gen_list in enumerate(self.generations):
+            # Avoid double counting tokens in OpenAICallback
+            if i == 0:
+                llm_results.append(
+                    LLMResult(
+                        generations=[gen_list],
+                        llm_output=self.llm_output,
+                    )
+                )
+            else:
+                if self.llm_output is not None:
+                    llm_output = deepcopy(self.llm_output)
+                    llm_output["token_usage"] = dict()
+                else:
+                    llm_output = None
+                llm_results.append(
+                    LLMResult(
+                        generations=[gen_list],
+                        llm_output=llm_output,
+                    )
+                )
+        return llm_results
+
 
 if __name__ == "__main__":
     g = Generation(
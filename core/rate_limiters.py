@@ -0,0 +1,167 @@
+"""Client-side rate limiters shared by the sync and async call paths."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+class BaseRateLimiter(ABC):
+    """Base class for rate limiters.
+
+    A rate limiter is acquired once before every request. ``tokens`` is the
+    caller's estimate of how many tokens the request will consume.
+    """
+
+    @abstractmethod
+    def acquire(self, *, tokens: int = 0, blocking: bool = True) -> bool:
+        """Acquire the right to send a request.
+
+        Args:
+            tokens: The estimated number of tokens of the request.
+            blocking: If True, wait until the request may be sent. If False,
+                return immediately.
+
+        Returns:
+            True if the request may be sent, False if ``blocking`` is False and
+                the budget is exhausted.
+        """
+
+    @abstractmethod
+    async def aacquire(self, *, tokens: int = 0, blocking: bool = True) -> bool:
+        """Acquire the right to send a request without blocking the event loop.
+
+        Args:
+            tokens: The estimated number of tokens of the request.
+            blocking: If True, wait until the request may be sent. If False,
+                return immediately.
+
+        Returns:
+            True if the request may be sent, False if ``blocking`` is False and
+                the budget is exhausted.
+        """
+
+
+class _TokenBucket:
+    """A token bucket that may go into debt for requests larger than it."""
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.last = now
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.last) * self.rate)
+        self.last = now
+
+    def wait_time(self, amount: float) -> float:
+        # A request larger than the bucket only waits for a full bucket.
+        needed = min(amount, self.capacity)
+        return max(0.0, (needed - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+
+class InMemoryRateLimiter(BaseRateLimiter):
+    """Token-bucket rate limiter for requests and tokens per minute.
+
+    Callers reserve their share of both budgets under a lock and then sleep until
+    the reservation is due, so bursts are spread out at the configured rate
+    instead of being rejected. Up to ``burst_seconds`` worth of budget can be
+    spent at once after an idle period. Safe to share between threads, event
+    loops and model instances; it only limits requests made in this process.
+
+    Example:
+        .. code-block:: python
+
+            limiter = InMemoryRateLimiter(
+                requests_per_minute=600, tokens_per_minute=200_000
+            )
+            model = SideKickModel(rate_limiter=limiter)
+    """
+
+    def __init__(
+            self,
+            *,
+            requests_per_minute: Optional[float] = None,
+            tokens_per_minute: Optional[float] = None,
+            burst_seconds: float = 1.0,
+    ) -> None:
+        """Initialize the rate limiter.
+
+        Args:
+            requests_per_minute: The request quota. Unlimited if None.
+            tokens_per_minute: The token quota. Unlimited if None.
+            burst_seconds: How many seconds of quota may be spent at once.
+        """
+        if requests_per_minute is not None and requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be greater than 0")
+        if tokens_per_minute is not None and tokens_per_minute <= 0:
+            raise ValueError("tokens_per_minute must be greater than 0")
+        if burst_seconds <= 0:
+            raise ValueError("burst_seconds must be greater than 0")
+        now = time.monotonic()
+        self._lock = threading.Lock()
+        self._requests = (
+            _TokenBucket(
+                requests_per_minute / 60,
+                max(1.0, requests_per_minute / 60 * burst_seconds),
+                now,
+            )
+            if requests_per_minute
+            else None
+        )
+        self._tokens = (
+            _TokenBucket(
+                tokens_per_minute / 60,
+                max(1.0, tokens_per_minute / 60 * burst_seconds),
+                now,
+            )
+            if tokens_per_minute
+            else None
+        )
+
+    def _reserve(self, tokens: int, blocking: bool) -> Optional[float]:
+        """Reserve budget for a request and return how long to wait before it.
+
+        Returns None, without reserving, if ``blocking`` is False and the request
+        would have to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests is not None:
+                self._requests.refill(now)
+                wait = max(wait, self._requests.wait_time(1))
+            if self._tokens is not None:
+                self._tokens.refill(now)
+                wait = max(wait, self._tokens.wait_time(tokens))
+            if wait > 0 and not blocking:
+                return None
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None:
+                self._tokens.take(tokens)
+            return wait
+
+    def acquire(self, *, tokens: int = 0, blocking: bool = True) -> bool:
+        """Acquire the right to send a request, sleeping if needed."""
+        wait = self._reserve(tokens, blocking)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def aacquire(self, *, tokens: int = 0, blocking: bool = True) -> bool:
+        """Acquire the right to send a request, awaiting if needed."""
+        wait = self._reserve(tokens, blocking)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
@@ -1,13 +1,39 @@
 import inspect
 from abc import ABC, abstractmethod
-from typing import Generic, Optional, Type, Any
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
 
 from pydantic.v1 import BaseModel
 from typing_extensions import Literal, get_args
 
-from core.runnables.config import RunnableConfig, run_in_executor
-from core.runnables.utils import create_model, Input, Output
+from core.runnables.config import (
+    RunnableConfig,
+    get_config_list,
+    get_executor_for_config,
+    process_config,
+    run_in_executor,
+)
+from core.runnables.utils import create_model, gather_with_concurrency, Input, Output
 from core.serializable import Serializable
+from core.tracing import get_tracer
+
+tracer = get_tracer(__name__)
 
 """
 Pydantic supports the creation of generic models to make it easier to reuse a common model structure.
@@ -36,6 +62,7 @@ class Runnable(Generic[Input, Output], ABC):
     - **invoke/ainvoke**: Transforms a single input into an output.
     - **batch/abatch**: Efficiently transforms multiple inputs into outputs.
     - **stream/astream**: Streams output from a single input as it's produced.
+    - **transform/atransform**: Streams output from a stream of input chunks.
     - **astream_log**: Streams output and selected intermediate results from an input.
 
     Built-in optimizations:
@@ -47,6 +74,9 @@ class Runnable(Generic[Input, Output], ABC):
              the sync counterpart using asyncio's thread pool.
              Override for native async.
 
+    - **Composition**: ``first | second`` is a RunnableSequence, which streams
+             chunks from each step into the next.
+
     All methods accept an optional config argument, which can be used to configure
     execution, add tags and metadata for tracing and debugging etc.
 
@@ -57,6 +87,26 @@ class Runnable(Generic[Input, Output], ABC):
     name: Optional[str] = None
     """The name of the runnable. Used for debugging and tracing."""
 
+    # Resolved once per class, from the type arguments of its generic base.
+    _type_args: ClassVar[Optional[Tuple[Any, Any]]] = None
+    # Input and output schemas of the class, keyed by model name. None for
+    # classes that override the type properties, as they may compute their
+    # types per instance.
+    _schemas: ClassVar[Optional[Dict[Tuple[str, str], Type[BaseModel]]]] = None
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._type_args = None
+        for base in getattr(cls, "__orig_bases__", ()):
+            type_args = get_args(base)
+            if type_args and len(type_args) == 2:
+                cls._type_args = type_args
+                break
+        inherits_types = cls.InputType is Runnable.InputType and (
+            cls.OutputType is Runnable.OutputType
+        )
+        cls._schemas = {} if inherits_types else None
+
     def get_name(
             self, suffix: Optional[str] = None, *, name: Optional[str] = None
     ) -> str:
@@ -73,12 +123,8 @@ class Runnable(Generic[Input, Output], ABC):
     @property
     def InputType(self) -> Type[Input]:
         """The type of input this runnable accepts specified as a type annotation."""
-        for cls in self.__class__.__orig_bases__:  # type: ignore[attr-defined]
-            type_args = get_args(cls)
-            print("type args")
-            print(type_args)
-            if type_args and len(type_args) == 2:
-                return type_args[0]
+        if self._type_args is not None:
+            return self._type_args[0]
 
         raise TypeError(
             f"Runnable {self.get_name()} doesn't have an inferable InputType. "
@@ -88,10 +134,8 @@ class Runnable(Generic[Input, Output], ABC):
     @property
     def OutputType(self) -> Type[Output]:
         """The type of output this runnable produces specified as a type annotation."""
-        for cls in self.__class__.__orig_bases__:  # type: ignore[attr-defined]
-            type_args = get_args(cls)
-            if type_args and len(type_args) == 2:
-                return type_args[1]
+        if self._type_args is not None:
+            return self._type_args[1]
 
         raise TypeError(
             f"Runnable {self.get_name()} doesn't have an inferable OutputType. "
@@ -120,22 +164,50 @@ class Runnable(Generic[Input, Output], ABC):
         Returns:
             A pydantic model that can be used to validate input.
         """
-        root_type = self.InputType
+        return self._get_schema("Input")
 
-        if inspect.isclass(root_type) and issubclass(root_type, BaseModel):
-            return root_type
+    @property
+    def output_schema(self) -> Type[BaseModel]:
+        """The type of output this runnable produces specified as a pydantic model."""
+        return self.get_output_schema()
 
-        print('get input schema')
-        print("\t config name = " + config.get('run_name') or None)
-        print("\t root_type= ", root_type)
+    def get_output_schema(
+            self, config: Optional[RunnableConfig] = None
+    ) -> Type[BaseModel]:
+        """Get a pydantic model that can be used to validate output of the runnable.
 
-        return create_model(
-            self.get_name("Input"),
-            __root__=(root_type, None),
-        )
+        Args:
+            config: A config to use when generating the schema.
+
+        Returns:
+            A pydantic model that can be used to validate output.
+        """
+        return self._get_schema("Output")
+
+    def _get_schema(self, kind: Literal["Input", "Output"]) -> Type[BaseModel]:
+        schemas = self._schemas
+        key = (kind, self.get_name(kind))
+        if schemas is not None:
+            schema = schemas.get(key)
+            if schema is not None:
+                return schema
+
+        root_type = self.InputType if kind == "Input" else self.OutputType
+
+        if inspect.isclass(root_type) and issubclass(root_type, BaseModel):
+            schema = root_type
+        else:
+            tracer.event(f"runnable.{kind.lower()}_schema", runnable=self.get_name())
+            schema = create_model(key[1], __root__=(root_type, None))
+
+        if schemas is not None:
+            schemas[key] = schema
+        return schema
 
     #@abstractmethod
-    def invoke(self, _input: Input, config: Optional[RunnableConfig] = None) -> Output:
+    def invoke(
+            self, _input: Input, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Output:
         """Transform a single input into an output. Override to implement.
 
         Args:
@@ -162,6 +234,267 @@ class Runnable(Generic[Input, Output], ABC):
         """
         return await run_in_executor(config, self.invoke, _input, config, **kwargs)
 
+    def stream(
+            self,
+            _input: Input,
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Optional[Any],
+    ) -> Iterator[Output]:
+        """Default implementation of stream, which calls invoke.
+
+        Subclasses should override this method if they support streaming output.
+        """
+        yield self.invoke(_input, config, **kwargs)
+
+    async def astream(
+            self,
+            _input: Input,
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Optional[Any],
+    ) -> AsyncIterator[Output]:
+        """Default implementation of astream, which calls ainvoke.
+
+        Subclasses should override this method if they support streaming output.
+        """
+        yield await self.ainvoke(_input, config, **kwargs)
+
+    def transform(
+            self,
+            _input: Iterator[Input],
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Optional[Any],
+    ) -> Iterator[Output]:
+        """Default implementation of transform, which buffers input and calls stream.
+
+        The input chunks are added together with ``+``; where chunks cannot be
+        added, the last one is used. Subclasses should override this method if
+        they can start producing output before the input is complete.
+        """
+        final: Any = None
+        got_first = False
+        for chunk in _input:
+            if not got_first:
+                final, got_first = chunk, True
+            else:
+                try:
+                    final = final + chunk
+                except TypeError:
+                    final = chunk
+        if got_first:
+            yield from self.stream(final, config, **kwargs)
+
+    async def atransform(
+            self,
+            _input: AsyncIterator[Input],
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Optional[Any],
+    ) -> AsyncIterator[Output]:
+        """Default implementation of atransform, which buffers input and calls
+        astream."""
+        final: Any = None
+        got_first = False
+        async for chunk in _input:
+            if not got_first:
+                final, got_first = chunk, True
+            else:
+                try:
+                    final = final + chunk
+                except TypeError:
+                    final = chunk
+        if got_first:
+            async for output in self.astream(final, config, **kwargs):
+                yield output
+
+    def __or__(self, other: Any) -> "RunnableSequence[Input, Any]":
+        """Compose this runnable with another runnable or a function."""
+        return RunnableSequence(self, coerce_to_runnable(other))
+
+    def __ror__(self, other: Any) -> "RunnableSequence[Any, Output]":
+        """Compose a function or another runnable with this runnable."""
+        return RunnableSequence(coerce_to_runnable(other), self)
+
+    def batch(
+            self,
+            inputs: List[Input],
+            config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+            *,
+            return_exceptions: bool = False,
+            **kwargs: Optional[Any],
+    ) -> List[Output]:
+        """Default implementation runs invoke in parallel using a thread pool executor.
+
+        The default implementation of batch works well for IO bound runnables.
+
+        Subclasses should override this method if they can batch more efficiently;
+        e.g., if the underlying runnable uses an API which supports a batch mode.
+
+        Args:
+            inputs: The inputs to the runnable.
+            config: A config, or one config per input. 'max_concurrency' of the
+                first config bounds the number of parallel invoke calls. With
+                'executor' set to "process" in the first config, the inputs are
+                sent in chunks to worker processes instead, and 'max_concurrency'
+                is not applied.
+            return_exceptions: If True, an exception raised by an input is returned
+                in its slot instead of being raised, and the other inputs still run.
+
+        Returns:
+            The outputs, in the same order as ``inputs``.
+        """
+        if not inputs:
+            return []
+
+        configs = get_config_list(config, len(inputs))
+
+        if configs[0].get("executor") == "process" and len(inputs) > 1:
+            invoke_in_process = partial(
+                _invoke_in_process, self, return_exceptions, kwargs
+            )
+            with get_executor_for_config(
+                    configs[0], allow_process=True
+            ) as executor:
+                return cast(
+                    List[Output],
+                    list(
+                        executor.map(
+                            invoke_in_process, inputs, map(process_config, configs)
+                        )
+                    ),
+                )
+
+        def invoke(_input: Input, _config: RunnableConfig) -> Union[Output, Exception]:
+            if return_exceptions:
+                try:
+                    return self.invoke(_input, _config, **kwargs)
+                except Exception as e:
+                    return e
+            else:
+                return self.invoke(_input, _config, **kwargs)
+
+        # If there's only one input, don't bother with the executor
+        if len(inputs) == 1:
+            return cast(List[Output], [invoke(inputs[0], configs[0])])
+
+        with get_executor_for_config(configs[0]) as executor:
+            return cast(List[Output], list(executor.map(invoke, inputs, configs)))
+
+    def batch_as_completed(
+            self,
+            inputs: Sequence[Input],
+            config: Optional[Union[RunnableConfig, Sequence[RunnableConfig]]] = None,
+            *,
+            return_exceptions: bool = False,
+            **kwargs: Optional[Any],
+    ) -> Iterator[Tuple[int, Union[Output, Exception]]]:
+        """Run invoke in parallel on a list of inputs,
+        yielding results as they complete.
+
+        Args:
+            inputs: The inputs to the runnable.
+            config: A config, or one config per input.
+            return_exceptions: If True, an exception raised by an input is yielded
+                in place of its output instead of being raised.
+
+        Yields:
+            Tuples of the index of the input and its output, in completion order.
+        """
+        if not inputs:
+            return
+
+        configs = get_config_list(config, len(inputs))
+
+        def invoke(
+                i: int, _input: Input, _config: RunnableConfig
+        ) -> Tuple[int, Union[Output, Exception]]:
+            if return_exceptions:
+                try:
+                    out: Union[Output, Exception] = self.invoke(_input, _config, **kwargs)
+                except Exception as e:
+                    out = e
+            else:
+                out = self.invoke(_input, _config, **kwargs)
+
+            return i, out
+
+        if len(inputs) == 1:
+            yield invoke(0, inputs[0], configs[0])
+            return
+
+        with get_executor_for_config(configs[0]) as executor:
+            futures = {
+                executor.submit(invoke, i, _input, _config)
+                for i, (_input, _config) in enumerate(zip(inputs, configs))
+            }
+
+            try:
+                while futures:
+                    done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                    while done:
+                        yield done.pop().result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    async def abatch(
+            self,
+            inputs: List[Input],
+            config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+            *,
+            return_exceptions: bool = False,
+            **kwargs: Optional[Any],
+    ) -> List[Output]:
+        """Default implementation runs ainvoke in parallel using asyncio.gather.
+
+        The default implementation of batch works well for IO bound runnables.
+
+        Subclasses should override this method if they can batch more efficiently;
+        e.g., if the underlying runnable uses an API which supports a batch mode.
+
+        Args:
+            inputs: The inputs to the runnable.
+            config: A config, or one config per input. 'max_concurrency' of the
+                first config bounds the number of concurrent ainvoke calls.
+            return_exceptions: If True, an exception raised by an input is returned
+                in its slot instead of being raised, and the other inputs still run.
+
+        Returns:
+            The outputs, in the same order as ``inputs``.
+        """
+        if not inputs:
+            return []
+
+        configs = get_config_list(config, len(inputs))
+
+        async def ainvoke(
+                _input: Input, _config: RunnableConfig
+        ) -> Union[Output, Exception]:
+            if return_exceptions:
+                try:
+                    return await self.ainvoke(_input, _config, **kwargs)
+                except Exception as e:
+                    return e
+            else:
+                return await self.ainvoke(_input, _config, **kwargs)
+
+        coros = map(ainvoke, inputs, configs)
+        return await gather_with_concurrency(configs[0].get("max_concurrency"), *coros)
+
+
+def _invoke_in_process(
+        runnable: Runnable[Input, Output],
+        return_exceptions: bool,
+        kwargs: dict,
+        input: Input,
+        config: RunnableConfig,
+) -> Union[Output, Exception]:
+    """Invoke ``runnable`` in a worker process of ``Runnable.batch``."""
+    if return_exceptions:
+        try:
+            return runnable.invoke(input, config, **kwargs)
+        except Exception as e:
+            return e
+    return runnable.invoke(input, config, **kwargs)
+
 
 class RunnableSerializable(BaseModel, Runnable[Input, Output]):
     """Runnable that can be serialized to JSON."""
@@ -170,6 +503,244 @@ class RunnableSerializable(BaseModel, Runnable[Input, Output]):
     """The name of the runnable. Used for debugging and tracing."""
 
 
+class RunnableLambda(Runnable[Input, Output]):
+    """Runnable that calls a function on its input.
+
+    Example:
+        .. code-block:: python
+
+            chain = retriever | RunnableLambda(format_docs) | llm
+    """
+
+    def __init__(
+            self, func: Callable[[Input], Output], name: Optional[str] = None
+    ) -> None:
+        self.func = func
+        self.name = name or getattr(func, "__name__", None)
+
+    def invoke(
+            self, _input: Input, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Output:
+        return self.func(_input)
+
+
+def coerce_to_runnable(thing: Any) -> Runnable:
+    """Get a runnable from a runnable or a function.
+
+    Raises:
+        TypeError: If ``thing`` is neither.
+    """
+    if isinstance(thing, Runnable):
+        return thing
+    if callable(thing):
+        return RunnableLambda(thing)
+    raise TypeError(f"Expected a Runnable or a callable, got {type(thing).__name__}")
+
+
+class RunnableSequence(Runnable[Input, Output]):
+    """A sequence of runnables, each taking the output of the previous one.
+
+    Usually created with ``|``. Nested sequences are flattened.
+
+    ``invoke`` and ``batch`` run the steps one after the other; ``batch`` passes
+    the whole batch through each step, so steps that batch efficiently do so.
+    ``stream`` and ``transform`` chain the ``transform`` of every step, so each
+    chunk a step yields is passed on at once: a step that transforms chunk by
+    chunk starts while the steps before it are still producing, and one that
+    needs its whole input, such as an LLM, waits for it and streams its output
+    to the next.
+
+    Keyword arguments are passed to the first step only.
+
+    Example:
+        .. code-block:: python
+
+            chain = prompt | llm | parser
+            for chunk in chain.stream({"question": "Why is the sky blue?"}):
+                print(chunk, end="")
+    """
+
+    def __init__(self, *steps: Any, name: Optional[str] = None) -> None:
+        """Create a sequence of at least two steps.
+
+        Args:
+            steps: Runnables, or functions to wrap in a RunnableLambda.
+            name: The name of the sequence.
+        """
+        flat: List[Runnable] = []
+        for step in steps:
+            step = coerce_to_runnable(step)
+            if isinstance(step, RunnableSequence):
+                flat.extend(step.steps)
+            else:
+                flat.append(step)
+        if len(flat) < 2:
+            raise ValueError(
+                f"RunnableSequence must have at least 2 steps, got {len(flat)}"
+            )
+        self.steps = flat
+        self.name = name
+
+    @property
+    def first(self) -> Runnable[Input, Any]:
+        """The first step."""
+        return self.steps[0]
+
+    @property
+    def last(self) -> Runnable[Any, Output]:
+        """The last step."""
+        return self.steps[-1]
+
+    @property
+    def InputType(self) -> Type[Input]:
+        return self.first.InputType
+
+    @property
+    def OutputType(self) -> Type[Output]:
+        return self.last.OutputType
+
+    def get_input_schema(
+            self, config: Optional[RunnableConfig] = None
+    ) -> Type[BaseModel]:
+        return self.first.get_input_schema(config)
+
+    def get_output_schema(
+            self, config: Optional[RunnableConfig] = None
+    ) -> Type[BaseModel]:
+        return self.last.get_output_schema(config)
+
+    def __repr__(self) -> str:
+        return "\n| ".join(repr(step) for step in self.steps)
+
+    def __or__(self, other: Any) -> "RunnableSequence[Input, Any]":
+        return RunnableSequence(*self.steps, other, name=self.name)
+
+    def __ror__(self, other: Any) -> "RunnableSequence[Any, Output]":
+        return RunnableSequence(other, *self.steps, name=self.name)
+
+    def invoke(
+            self, _input: Input, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Output:
+        value: Any = self.first.invoke(_input, config, **kwargs)
+        for step in self.steps[1:]:
+            value = step.invoke(value, config)
+        return cast(Output, value)
+
+    async def ainvoke(
+            self, _input: Input, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Output:
+        value: Any = await self.first.ainvoke(_input, config, **kwargs)
+        for step in self.steps[1:]:
+            value = await step.ainvoke(value, config)
+        return cast(Output, value)
+
+    def batch(
+            self,
+            inputs: List[Input],
+            config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+            *,
+            return_exceptions: bool = False,
+            **kwargs: Optional[Any],
+    ) -> List[Output]:
+        """Pass the whole batch through each step in turn.
+
+        With return_exceptions, an input that fails at a step gets the exception
+        as its output and is not passed to the following steps.
+        """
+        if not inputs:
+            return []
+
+        configs = get_config_list(config, len(inputs))
+        values: List[Any] = list(inputs)
+        # Indexes of the inputs that have not failed yet.
+        pending = list(range(len(inputs)))
+        for i, step in enumerate(self.steps):
+            outputs = step.batch(
+                [values[j] for j in pending],
+                [configs[j] for j in pending],
+                return_exceptions=return_exceptions,
+                **(kwargs if i == 0 else {}),
+            )
+            for j, output in zip(pending, outputs):
+                values[j] = output
+            if return_exceptions:
+                pending = [j for j in pending if not isinstance(values[j], Exception)]
+        return cast(List[Output], values)
+
+    async def abatch(
+            self,
+            inputs: List[Input],
+            config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+            *,
+            return_exceptions: bool = False,
+            **kwargs: Optional[Any],
+    ) -> List[Output]:
+        """Async version of ``batch``."""
+        if not inputs:
+            return []
+
+        configs = get_config_list(config, len(inputs))
+        values: List[Any] = list(inputs)
+        pending = list(range(len(inputs)))
+        for i, step in enumerate(self.steps):
+            outputs = await step.abatch(
+                [values[j] for j in pending],
+                [configs[j] for j in pending],
+                return_exceptions=return_exceptions,
+                **(kwargs if i == 0 else {}),
+            )
+            for j, output in zip(pending, outputs):
+                values[j] = output
+            if return_exceptions:
+                pending = [j for j in pending if not isinstance(values[j], Exception)]
+        return cast(List[Output], values)
+
+    def transform(
+            self,
+            _input: Iterator[Input],
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Optional[Any],
+    ) -> Iterator[Output]:
+        # Chain the steps' generators: each chunk is pulled through every step
+        # before the next is produced, and closing the result closes them all.
+        stream: Iterator[Any] = self.first.transform(_input, config, **kwargs)
+        for step in self.steps[1:]:
+            stream = step.transform(stream, config)
+        yield from stream
+
+    def stream(
+            self,
+            _input: Input,
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Optional[Any],
+    ) -> Iterator[Output]:
+        yield from self.transform(iter([_input]), config, **kwargs)
+
+    async def atransform(
+            self,
+            _input: AsyncIterator[Input],
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Optional[Any],
+    ) -> AsyncIterator[Output]:
+        stream: AsyncIterator[Any] = self.first.atransform(_input, config, **kwargs)
+        for step in self.steps[1:]:
+            stream = step.atransform(stream, config)
+        async for chunk in stream:
+            yield chunk
+
+    async def astream(
+            self,
+            _input: Input,
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Optional[Any],
+    ) -> AsyncIterator[Output]:
+        async def input_aiter() -> AsyncIterator[Input]:
+            yield _input
+
+        async for chunk in self.atransform(input_aiter(), config, **kwargs):
+            yield chunk
+
+
 if __name__ == '__main__':
     # Need to comment @abstractmethod annotation to run
     obj = Runnable()
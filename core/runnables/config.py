@@ -1,18 +1,32 @@
 import asyncio
-from concurrent.futures import Executor, Future, ThreadPoolExecutor
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import wait as wait_for_futures
+from contextlib import contextmanager
 from functools import partial
-from contextvars import ContextVar, copy_context
+from contextvars import Context, ContextVar, copy_context
 import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
 from typing import (
     Any,
+    Awaitable,
+    Deque,
     Dict,
     List,
-    Optional, Union, Callable, TypeVar, cast, Iterable, Iterator, Generator
+    Optional, Union, Callable, TypeVar, cast, Iterable, Iterator, Generator, Sequence,
+    Tuple,
 )
 
-from typing_extensions import ParamSpec, TypedDict
+from typing_extensions import Literal, ParamSpec, TypedDict
 
 from core.callbacks.base import Callbacks
+from core.exceptions import DeadlineExceededError
 
 
 class RunnableConfig(TypedDict, total=False):
@@ -66,11 +80,172 @@ class RunnableConfig(TypedDict, total=False):
         will be generated.
     """
 
+    timeout: Optional[float]
+    """
+    Seconds this call, including its sub-calls and retries, may take. Counted from
+    when the call starts.
+    """
+
+    deadline: Optional[float]
+    """
+    Time, as returned by time.monotonic(), by which this call must finish. Requests
+    still in flight then are cancelled and raise DeadlineExceededError.
+    """
+
+    executor: Literal["thread", "process"]
+    """
+    Where batches run: on a shared thread pool (the default), or on a shared
+    process pool for CPU-bound, pure Python work such as text splitting. Used by
+    ``Runnable.batch``, ``TextSplitter.split_documents_to_batch`` and
+    ``BaseBlobParser.parse_batch``; other parallel work stays on threads. With
+    "process", the runnable and its inputs and outputs must be picklable, and
+    callbacks are not called in the worker processes.
+    """
+
+    chunksize: int
+    """
+    Inputs sent to a worker process at a time with the "process" executor.
+    Defaults to spreading the inputs over about four chunks per process.
+    """
+
+
+def get_config_list(
+        config: Optional[Union[RunnableConfig, Sequence[RunnableConfig]]], length: int
+) -> List[RunnableConfig]:
+    """Get a list of configs from a single config or a list of configs.
+
+    It is useful for subclasses overriding batch() or abatch().
+
+    Args:
+        config (Optional[Union[RunnableConfig, List[RunnableConfig]]]):
+          The config or list of configs.
+        length (int): The length of the list.
+
+    Returns:
+        List[RunnableConfig]: The list of configs.
+
+    Raises:
+        ValueError: If the length of the list is not equal to the length of the inputs.
+    """
+    if length < 0:
+        raise ValueError(f"length must be >= 0, but got {length}")
+    if isinstance(config, Sequence) and len(config) != length:
+        raise ValueError(
+            f"config must be a list of the same length as inputs, "
+            f"but got {len(config)} configs for {length} inputs"
+        )
+
+    if isinstance(config, Sequence):
+        return [RunnableConfig(**c) for c in config]
+    config = config or RunnableConfig()
+    if length > 1 and config.get("run_id") is not None:
+        # A run id identifies a single run, only the first input may keep it.
+        first = RunnableConfig(**config)
+        rest = RunnableConfig(**config)
+        rest.pop("run_id")
+        return [first] + [RunnableConfig(**rest) for _ in range(length - 1)]
+    return [RunnableConfig(**config) for _ in range(length)]
+
 
 P = ParamSpec("P")
 T = TypeVar("T")
 
 
+_current_deadline: ContextVar[Optional[float]] = ContextVar(
+    "current_deadline", default=None
+)
+
+
+def get_deadline(config: Optional[RunnableConfig]) -> Optional[float]:
+    """Get the deadline of a call.
+
+    A call must finish by the earliest of its config's ``deadline``, its config's
+    ``timeout`` from now, and the deadline of the call it is part of.
+
+    Args:
+        config (Optional[RunnableConfig]): The config of the call.
+
+    Returns:
+        Optional[float]: The deadline, as a time.monotonic() value, or None.
+    """
+    config = config or {}
+    candidates = [_current_deadline.get(), config.get("deadline")]
+    if config.get("timeout") is not None:
+        candidates.append(time.monotonic() + cast(float, config["timeout"]))
+    deadlines = [d for d in candidates if d is not None]
+    return min(deadlines) if deadlines else None
+
+
+@contextmanager
+def deadline_context(deadline: Optional[float]) -> Generator[None, None, None]:
+    """Make ``deadline`` the deadline of the calls made within the context.
+
+    Threads started with ContextThreadPoolExecutor and tasks created within the
+    context inherit it.
+
+    Args:
+        deadline (Optional[float]): The deadline, see ``get_deadline``.
+    """
+    token = _current_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _current_deadline.reset(token)
+
+
+def copy_context_with_deadline(deadline: Optional[float]) -> Context:
+    """Copy the current context, with ``deadline`` as its deadline.
+
+    Args:
+        deadline (Optional[float]): The deadline, see ``get_deadline``.
+
+    Returns:
+        Context: The copy, to run calls in with ``Context.run``.
+    """
+    context = copy_context()
+    context.run(_current_deadline.set, deadline)
+    return context
+
+
+def remaining_time() -> Optional[float]:
+    """Get the seconds left before the current deadline, None if there is none.
+
+    Returns:
+        Optional[float]: The seconds left, zero or less once it has passed.
+    """
+    deadline = _current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline() -> None:
+    """Raise DeadlineExceededError if the current deadline has passed."""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceededError("Deadline exceeded")
+
+
+async def await_with_deadline(awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable``, cancelling it if the current deadline passes first.
+
+    Raises:
+        DeadlineExceededError: If the deadline passed.
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return await awaitable
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceededError("Deadline exceeded")
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError as e:
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError("Deadline exceeded") from e
+        raise
+
+
 class ContextThreadPoolExecutor(ThreadPoolExecutor):
     """ThreadPoolExecutor that copies the context to the child thread."""
 
@@ -94,44 +269,410 @@ class ContextThreadPoolExecutor(ThreadPoolExecutor):
             cast(Callable[..., T], partial(copy_context().run, func, *args, **kwargs))
         )
 
+    # ``map`` is inherited: it calls ``submit`` for each input, so each task runs
+    # in a copy of the caller's context, and any iterable is accepted. It
+    # submits every input at once; use ``imap`` for large or unbounded inputs.
+
+
+DEFAULT_EXECUTOR_SIZES: Dict[str, int] = {
+    "io": 32,
+    "cpu": os.cpu_count() or 1,
+    "callbacks": 4,
+    "hedging": 64,
+}
+"""Threads of the shared executors by purpose. "hedging" has room for a request
+and its hedge for each "io" thread. Other purposes get
+``min(32, cpu_count + 4)`` threads, like ThreadPoolExecutor."""
+
+_executors: Dict[str, ContextThreadPoolExecutor] = {}
+_executor_sizes: Dict[str, int] = {}
+_process_executor: Optional[ProcessPoolExecutor] = None
+_executors_lock = threading.Lock()
+_worker = threading.local()
+
+
+def _mark_worker(purpose: str) -> None:
+    _worker.purpose = purpose
+
+
+def configure_executor(purpose: str, max_workers: int) -> None:
+    """Set the number of threads of the shared executor for ``purpose``.
+
+    Takes effect for work submitted afterwards; work already running on the
+    previous executor finishes there.
+
+    Args:
+        purpose (str): The purpose, e.g. "io", "cpu" or "callbacks", or
+            "process" for the number of processes of the process pool.
+        max_workers (int): The number of threads or processes.
+    """
+    global _process_executor
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    with _executors_lock:
+        _executor_sizes[purpose] = max_workers
+        previous: Optional[Executor] = _executors.pop(purpose, None)
+        if purpose == "process":
+            previous, _process_executor = _process_executor, None
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+def get_executor(purpose: str = "io") -> ContextThreadPoolExecutor:
+    """Get the process-wide executor for ``purpose``, creating it on first use.
+
+    The executor is shared and long-lived: do not shut it down, use
+    ``shutdown_executors``. Work submitted to it must not wait for other work
+    submitted to it, or the pool can deadlock once all its threads wait.
+
+    Args:
+        purpose (str): What the executor runs: "io" for blocking calls to
+            models and services, "cpu" for computation, "callbacks" for
+            callback handlers, or any other name for a separate pool.
+
+    Returns:
+        ContextThreadPoolExecutor: The executor.
+    """
+    executor = _executors.get(purpose)
+    if executor is not None:
+        return executor
+    with _executors_lock:
+        executor = _executors.get(purpose)
+        if executor is None:
+            max_workers = _executor_sizes.get(
+                purpose,
+                DEFAULT_EXECUTOR_SIZES.get(purpose, min(32, (os.cpu_count() or 1) + 4)),
+            )
+            executor = _executors[purpose] = ContextThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix=f"sidekick-{purpose}",
+                initializer=_mark_worker,
+                initargs=(purpose,),
+            )
+        return executor
+
+
+def get_process_executor() -> ProcessPoolExecutor:
+    """Get the process-wide process pool, creating it on first use.
+
+    Worker processes are spawned, not forked, so they do not inherit the
+    threads and locks of this process; they import what they run. The pool has
+    one process per CPU unless set with ``configure_executor("process", n)``.
+
+    Returns:
+        ProcessPoolExecutor: The executor.
+    """
+    global _process_executor
+    executor = _process_executor
+    if executor is not None:
+        return executor
+    with _executors_lock:
+        if _process_executor is None:
+            _process_executor = ProcessPoolExecutor(
+                max_workers=_executor_sizes.get("process", os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_executor
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """Shut down the shared executors. Later calls to ``get_executor`` create
+    new ones. Registered to run at exit.
+
+    Args:
+        wait (bool): Whether to wait for the work already submitted.
+    """
+    global _process_executor
+    with _executors_lock:
+        executors: List[Executor] = list(_executors.values())
+        _executors.clear()
+        if _process_executor is not None:
+            executors.append(_process_executor)
+            _process_executor = None
+    for executor in executors:
+        executor.shutdown(wait=wait)
+
+
+def _forget_executors() -> None:
+    # A forked child has none of the parent's threads or worker processes.
+    global _executors_lock, _process_executor
+    _executors.clear()
+    _process_executor = None
+    _executors_lock = threading.Lock()
+
+
+atexit.register(shutdown_executors)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_executors)
+
+
+class _BoundedExecutor(Executor):
+    """Runs at most ``max_workers`` tasks at a time on a shared executor.
+
+    ``submit`` blocks while the limit is reached. ``shutdown`` waits for the
+    tasks submitted through this executor, and leaves the shared one running.
+    """
+
+    def __init__(self, executor: Executor, max_workers: Optional[int]) -> None:
+        self._executor = executor
+        self._max_workers = max_workers or getattr(executor, "_max_workers", None)
+        self._slots = (
+            threading.BoundedSemaphore(max_workers) if max_workers else None
+        )
+        self._futures: "set[Future]" = set()
+        self._lock = threading.Lock()
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+        if self._slots is not None:
+            self._slots.release()
+
+    def submit(  # type: ignore[override]
+        self,
+        func: Callable[P, T],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> Future[T]:
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except BaseException:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._lock:
+            futures = list(self._futures)
+        if cancel_futures:
+            for future in futures:
+                future.cancel()
+        if wait:
+            wait_for_futures(futures)
+
+
+class _ProcessExecutor(Executor):
+    """Runs tasks on the shared process pool, mapping inputs in chunks.
+
+    ``shutdown`` waits for the tasks submitted through this executor, and
+    leaves the process pool running.
+    """
+
+    def __init__(self, executor: ProcessPoolExecutor, chunksize: Optional[int]) -> None:
+        self._executor = executor
+        self._max_workers = executor._max_workers
+        self._chunksize = chunksize
+        self._futures: "set[Future]" = set()
+        self._lock = threading.Lock()
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+
+    def submit(  # type: ignore[override]
+        self,
+        func: Callable[P, T],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> Future[T]:
+        future = self._executor.submit(func, *args, **kwargs)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
     def map(
         self,
         fn: Callable[..., T],
         *iterables: Iterable[Any],
-        timeout: float = None,
-        chunksize: int = 1,
+        timeout: Optional[float] = None,
+        chunksize: int = 0,
     ) -> Iterator[T]:
-        contexts = [copy_context() for _ in range(len(iterables[0]))]  # type: ignore[arg-type]
+        """Map ``fn`` over the iterables in chunks, keeping the input order."""
+        if not chunksize:
+            if self._chunksize:
+                chunksize = self._chunksize
+            else:
+                lists = [list(iterable) for iterable in iterables]
+                iterables = tuple(lists)
+                chunks = 4 * (self._executor._max_workers or 1)
+                chunksize = max(1, math.ceil(min(map(len, lists)) / chunks))
+        return self._executor.map(fn, *iterables, timeout=timeout, chunksize=chunksize)
 
-        def _wrapped_fn(*args: Any) -> T:
-            return contexts.pop().run(fn, *args)
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._lock:
+            futures = list(self._futures)
+        if cancel_futures:
+            for future in futures:
+                future.cancel()
+        if wait:
+            wait_for_futures(futures)
 
-        return super().map(
-            _wrapped_fn,
-            *iterables,
-            timeout=timeout,
-            chunksize=chunksize,
-        )
 
+def process_config(config: RunnableConfig) -> RunnableConfig:
+    """Get the part of ``config`` that can be sent to a worker process.
 
+    Drops the callbacks, and runs nested batches in the worker on threads.
+    """
+    return cast(
+        RunnableConfig,
+        {
+            key: value
+            for key, value in config.items()
+            if key not in ("callbacks", "executor")
+        },
+    )
+
+
+@contextmanager
 def get_executor_for_config(
         config: Optional[RunnableConfig],
+        purpose: str = "io",
+        *,
+        allow_process: bool = False,
 ) -> Generator[Executor, None, None]:
     """Get an executor for a config.
 
+    Tasks run on the shared executor for ``purpose``, at most
+    ``config["max_concurrency"]`` at a time. On leaving the context, waits for
+    the tasks submitted. Called from a thread of that shared executor, a
+    temporary executor is used instead, so that nested batches cannot
+    deadlock the shared one.
+
+    With ``config["executor"] == "process"`` and ``allow_process``, tasks run on
+    the shared process pool instead, and ``map`` sends inputs in chunks of
+    ``config["chunksize"]``. Callers that submit closures or other objects that
+    cannot be pickled leave ``allow_process`` unset and get threads.
+
     Args:
         config (RunnableConfig): The config.
+        purpose (str): The shared executor to use, see ``get_executor``.
+        allow_process (bool): Whether the tasks submitted can run in another
+            process.
 
     Yields:
         Generator[Executor, None, None]: The executor.
     """
     config = config or {}
-    with ContextThreadPoolExecutor(
-            max_workers=config.get("max_concurrency")
+    if allow_process and config.get("executor") == "process":
+        with _ProcessExecutor(
+                get_process_executor(), config.get("chunksize")
+        ) as executor:
+            yield executor
+        return
+    if getattr(_worker, "purpose", None) == purpose:
+        # Its threads count as workers of the shared executor too, so deeper
+        # nesting also stays off the shared one.
+        with ContextThreadPoolExecutor(
+                max_workers=config.get("max_concurrency"),
+                initializer=_mark_worker,
+                initargs=(purpose,),
+        ) as executor:
+            yield executor
+        return
+    with _BoundedExecutor(
+            get_executor(purpose), config.get("max_concurrency")
     ) as executor:
         yield executor
 
 
+def _default_window(executor: Executor, window: Optional[int]) -> int:
+    if window is None:
+        # Enough to keep every worker busy while results are consumed.
+        return 2 * (getattr(executor, "_max_workers", None) or 32)
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    return window
+
+
+def imap(
+        executor: Executor,
+        fn: Callable[..., T],
+        *iterables: Iterable[Any],
+        window: Optional[int] = None,
+) -> Iterator[T]:
+    """Map ``fn`` over the iterables on ``executor``, yielding results in order.
+
+    Unlike ``Executor.map``, inputs are read lazily and at most ``window`` tasks
+    are submitted and not yet yielded, so memory stays bounded whatever the
+    length of the inputs, which may be iterators such as
+    ``BaseLoader.lazy_load()``. If a task raises, the exception is raised in
+    its place and the remaining tasks are cancelled, as they are when the
+    iterator is closed.
+
+    Example:
+        .. code-block:: python
+
+            with get_executor_for_config(config) as executor:
+                for chunks in imap(executor, splitter.split_documents, pages):
+                    ...
+
+    Args:
+        executor (Executor): The executor, e.g. from ``get_executor_for_config``.
+        fn (Callable[..., T]): The function to map.
+        *iterables (Iterable[Any]): The inputs, zipped as for ``map``.
+        window (Optional[int]): The most tasks in flight. Defaults to twice the
+            executor's workers.
+
+    Yields:
+        T: The result of each input, in input order.
+    """
+    window = _default_window(executor, window)
+    pending: Deque[Future[T]] = deque()
+    try:
+        for args in zip(*iterables):
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(executor.submit(fn, *args))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def imap_as_completed(
+        executor: Executor,
+        fn: Callable[..., T],
+        *iterables: Iterable[Any],
+        window: Optional[int] = None,
+) -> Iterator[Tuple[int, T]]:
+    """Like ``imap``, but yields results as they complete, with their index.
+
+    Args:
+        executor (Executor): The executor, e.g. from ``get_executor_for_config``.
+        fn (Callable[..., T]): The function to map.
+        *iterables (Iterable[Any]): The inputs, zipped as for ``map``.
+        window (Optional[int]): The most tasks in flight. Defaults to twice the
+            executor's workers.
+
+    Yields:
+        Tuple[int, T]: The index of an input and its result.
+    """
+    window = _default_window(executor, window)
+    pending: Dict[Future[T], int] = {}
+    try:
+        for index, args in enumerate(zip(*iterables)):
+            if len(pending) >= window:
+                done, _ = wait_for_futures(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+            pending[executor.submit(fn, *args)] = index
+        while pending:
+            done, _ = wait_for_futures(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
 async def run_in_executor(
         executor_or_config: Optional[Union[Executor, RunnableConfig]],
         func: Callable[P, T],
@@ -150,9 +691,9 @@ async def run_in_executor(
         Output: The output of the function.
     """
     if executor_or_config is None or isinstance(executor_or_config, dict):
-        # Use default executor with context copied from current context
+        # Use the shared I/O executor with context copied from current context
         return await asyncio.get_running_loop().run_in_executor(
-            None,
+            get_executor("io"),
             cast(Callable[..., T], partial(copy_context().run, func, *args, **kwargs)),
         )
 
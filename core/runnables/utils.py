@@ -1,8 +1,15 @@
+import asyncio
+import threading
+from collections import OrderedDict
 from functools import lru_cache
-from typing import Any, Type, TypeVar
+from typing import Any, Coroutine, Dict, List, Optional, Tuple, Type, TypeVar
 
 from pydantic.v1 import create_model as _create_model_base, BaseModel, BaseConfig, ConfigDict
 
+from core.tracing import get_tracer
+
+tracer = get_tracer(__name__)
+
 
 class _SchemaConfig(BaseConfig):
     arbitrary_types_allowed = True
@@ -13,16 +20,52 @@ def create_model(
         __model_name: str,
         **field_definitions: Any,
 ) -> Type[BaseModel]:
-
-    print("create model")
-    print("\t", __model_name)
     try:
         return _create_model_cached(__model_name, **field_definitions)
     except TypeError:
         # something in field definitions is not hashable
-        return _create_model_base(
-            __model_name, __config__=_SchemaConfig, **field_definitions
-        )
+        return _create_model_by_identity(__model_name, field_definitions)
+
+
+_MODELS_BY_IDENTITY_SIZE = 256
+_models_by_identity: "OrderedDict[Tuple[Any, ...], Tuple[Type[BaseModel], dict]]" = (
+    OrderedDict()
+)
+_models_by_identity_lock = threading.Lock()
+
+
+def _identity_key(value: Any) -> Any:
+    if isinstance(value, tuple):
+        return tuple(_identity_key(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        return id(value)
+    return value
+
+
+def _create_model_by_identity(
+        __model_name: str, field_definitions: Dict[str, Any]
+) -> Type[BaseModel]:
+    # Unhashable values are keyed by id. Each entry keeps its definitions
+    # alive, so that their ids cannot be reused by other objects.
+    key = (__model_name, *(
+        (name, _identity_key(value)) for name, value in field_definitions.items()
+    ))
+    with _models_by_identity_lock:
+        entry = _models_by_identity.get(key)
+        if entry is not None:
+            _models_by_identity.move_to_end(key)
+            return entry[0]
+    tracer.event("runnable.create_model", model=__model_name)
+    model = _create_model_base(
+        __model_name, __config__=_SchemaConfig, **field_definitions
+    )
+    with _models_by_identity_lock:
+        _models_by_identity[key] = (model, field_definitions)
+        if len(_models_by_identity) > _MODELS_BY_IDENTITY_SIZE:
+            _models_by_identity.popitem(last=False)
+    return model
 
 
 @lru_cache(maxsize=256)
@@ -30,13 +73,44 @@ def _create_model_cached(
         __model_name: str,
         **field_definitions: Any,
 ) -> Type[BaseModel]:
-    print(_SchemaConfig)
-    print(field_definitions)
+    tracer.event("runnable.create_model", model=__model_name)
     return _create_model_base(
         __model_name, __config__=_SchemaConfig, **field_definitions
     )
 
 
+async def gated_coro(semaphore: asyncio.Semaphore, coro: Coroutine) -> Any:
+    """Run a coroutine with a semaphore.
+
+    Args:
+        semaphore: The semaphore to use.
+        coro: The coroutine to run.
+
+    Returns:
+        The result of the coroutine.
+    """
+    async with semaphore:
+        return await coro
+
+
+async def gather_with_concurrency(n: Optional[int], *coros: Coroutine) -> List[Any]:
+    """Gather coroutines with a limit on the number of concurrent coroutines.
+
+    Args:
+        n: The number of coroutines to run concurrently. No limit if None.
+        coros: The coroutines to run.
+
+    Returns:
+        The results of the coroutines, in the order of ``coros``.
+    """
+    if n is None:
+        return await asyncio.gather(*coros)
+
+    semaphore = asyncio.Semaphore(n)
+
+    return await asyncio.gather(*(gated_coro(semaphore, c) for c in coros))
+
+
 Input = TypeVar("Input", contravariant=True)
 # Output type should implement __concat__, as eg str, list, dict do
 Output = TypeVar("Output", covariant=True)
@@ -0,0 +1,154 @@
+"""Coalescing of identical concurrent calls."""
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future, wait
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from core.exceptions import DeadlineExceededError, RequestCancelledError
+from core.runnables.config import await_with_deadline, remaining_time
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Errors about the leader's own call rather than the keys: followers must not
+# fail with them.
+_CALLER_ERRORS = (DeadlineExceededError, RequestCancelledError, asyncio.CancelledError)
+# Set on a released key's future so its followers claim the key again.
+_RELEASED = object()
+
+
+class SingleFlight(Generic[K, V]):
+    """Makes sure only one call per key is in flight at any time.
+
+    The first caller to claim a key becomes its leader and computes the value;
+    callers that ask for the same key while the leader is still running wait on
+    the leader's future and receive the same value (or exception), waiting no
+    longer than their own deadline. If the leader is cancelled or runs out of
+    time, the key is released instead and a follower takes over as its leader.
+    Works across threads and event loops, since followers wait on a concurrent
+    Future.
+
+    Example:
+        .. code-block:: python
+
+            flight = SingleFlight()
+            # Each key is computed once even if several threads ask at once.
+            values = flight.run_many(["a", "b", "a"], lambda keys: fetch(keys))
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[K, Future] = {}
+
+    def _claim(self, keys: Sequence[K]) -> Tuple[List[K], Dict[K, Future]]:
+        leaders: List[K] = []
+        followers: Dict[K, Future] = {}
+        seen = set()
+        with self._lock:
+            for key in keys:
+                if key in seen:
+                    continue
+                seen.add(key)
+                future = self._calls.get(key)
+                if future is None:
+                    self._calls[key] = Future()
+                    leaders.append(key)
+                else:
+                    followers[key] = future
+        return leaders, followers
+
+    def _resolve(self, leaders: List[K], values: Sequence[V]) -> None:
+        with self._lock:
+            futures = [self._calls.pop(key) for key in leaders]
+        for future, value in zip(futures, values):
+            if not future.done():
+                future.set_result(value)
+
+    def _fail(self, leaders: List[K], error: BaseException) -> None:
+        with self._lock:
+            futures = [self._calls.pop(key) for key in leaders]
+        shared = not isinstance(error, _CALLER_ERRORS)
+        for future in futures:
+            if future.done():
+                continue
+            if shared:
+                future.set_exception(error)
+            else:
+                future.set_result(_RELEASED)
+
+    def run_many(
+            self, keys: Sequence[K], fn: Callable[[List[K]], Sequence[V]]
+    ) -> List[V]:
+        """Get the value of every key, computing only keys no one else is computing.
+
+        Args:
+            keys: The keys to get values for. Duplicates are computed once.
+            fn: Computes the values of the given keys, in the same order.
+
+        Returns:
+            The values, in the same order as ``keys``.
+        """
+        resolved: Dict[K, V] = {}
+        pending: List[K] = list(keys)
+        while pending:
+            leaders, followers = self._claim(pending)
+            if leaders:
+                try:
+                    values = fn(leaders)
+                except BaseException as e:
+                    self._fail(leaders, e)
+                    raise
+                self._resolve(leaders, values)
+                resolved.update(zip(leaders, values))
+            pending = []
+            for key, future in followers.items():
+                if not wait([future], timeout=remaining_time()).done:
+                    raise DeadlineExceededError("Deadline exceeded")
+                value = future.result()
+                if value is _RELEASED:
+                    pending.append(key)
+                else:
+                    resolved[key] = value
+        return [resolved[key] for key in keys]
+
+    async def arun_many(
+            self, keys: Sequence[K], fn: Callable[[List[K]], Awaitable[Sequence[V]]]
+    ) -> List[V]:
+        """Async version of ``run_many``; ``fn`` is awaited and followers wait
+        without blocking the event loop. Cancelling a follower does not cancel
+        the leader's call."""
+        resolved: Dict[K, V] = {}
+        pending: List[K] = list(keys)
+        while pending:
+            leaders, followers = self._claim(pending)
+            if leaders:
+                try:
+                    values = await fn(leaders)
+                except BaseException as e:
+                    self._fail(leaders, e)
+                    raise
+                self._resolve(leaders, values)
+                resolved.update(zip(leaders, values))
+            pending = []
+            for key, future in followers.items():
+                # Shielded: cancelling a wrapped future cancels the shared one.
+                value = await await_with_deadline(
+                    asyncio.shield(asyncio.wrap_future(future))
+                )
+                if value is _RELEASED:
+                    pending.append(key)
+                else:
+                    resolved[key] = value
+        return [resolved[key] for key in keys]
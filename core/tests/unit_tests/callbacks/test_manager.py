@@ -0,0 +1,39 @@
+import asyncio
+import threading
+from typing import Any, List
+
+from core.callbacks.base import AsyncCallbackHandler
+from core.callbacks.manager import handle_event
+from core.runnables.config import configure_executor
+
+
+class NestingHandler(AsyncCallbackHandler):
+    """Fires the event again from inside its own handler, ``depth`` times."""
+
+    def __init__(self, depth: int, events: List[int]) -> None:
+        self.depth = depth
+        self.events = events
+
+    async def on_text(self, text: str, **kwargs: Any) -> None:
+        self.events.append(self.depth)
+        if self.depth:
+            handle_event(
+                [NestingHandler(self.depth - 1, self.events)], "on_text", None, text
+            )
+
+
+def test_nested_async_handlers_do_not_deadlock() -> None:
+    configure_executor("callbacks", 1)
+    events: List[int] = []
+
+    async def run() -> None:
+        handle_event([NestingHandler(3, events)], "on_text", None, "hi")
+
+    try:
+        thread = threading.Thread(target=asyncio.run, args=(run(),), daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+    finally:
+        configure_executor("callbacks", 4)
+
+    assert events == [3, 2, 1, 0]
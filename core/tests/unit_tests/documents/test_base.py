@@ -0,0 +1,33 @@
+import pickle
+
+from core.documents.base import Document
+
+
+def test_construct_trusted_matches_constructor() -> None:
+    metadata = {"source": "report.pdf", "page": 3}
+    trusted = Document.construct_trusted("text", metadata)
+
+    assert trusted == Document(page_content="text", metadata=metadata)
+    assert trusted.metadata is metadata
+    assert trusted.dict() == {
+        "page_content": "text", "metadata": metadata, "type": "Document"
+    }
+    assert Document.construct_trusted("text").metadata == {}
+
+
+def test_construct_trusted_document_behaves_like_validated_one() -> None:
+    document = Document.construct_trusted("text")
+    document.page_content = "changed"
+
+    assert "page_content" in document.__fields_set__
+    assert document.copy(update={"metadata": {"a": 1}}).metadata == {"a": 1}
+    assert pickle.loads(pickle.dumps(document)) == document
+
+
+def test_document_pickles_as_its_fields() -> None:
+    document = Document(page_content="text", metadata={"page": 1})
+    restored = pickle.loads(pickle.dumps(document))
+
+    assert restored == document
+    assert restored.__fields_set__ == document.__fields_set__
+    assert len(pickle.dumps(document)) < 120
@@ -0,0 +1,137 @@
+import pickle
+from typing import Iterator
+
+import pytest
+
+from core.document_loaders.blob_loaders import Blob
+from core.document_loaders.parser.base import BaseBlobParser
+from core.documents.base import Document
+from core.documents.batch import DocumentBatch
+from core.runnables.config import RunnableConfig
+from core.text_splitters.character import RecursiveCharacterTextSplitter
+
+
+class LineParser(BaseBlobParser):
+    def lazy_parse(self, blob: Blob) -> Iterator[Document]:
+        for number, line in enumerate(blob.as_string().splitlines()):
+            yield Document(page_content=line, metadata={"line": number})
+
+
+def _documents() -> list:
+    return [
+        Document(page_content="alpha", metadata={"source": "a.pdf", "page": 0}),
+        Document(page_content="", metadata={"source": "a.pdf"}),
+        Document(page_content="gamma", metadata={"page": True, "tags": ["x"]}),
+        Document(page_content="delta"),
+    ]
+
+
+def test_batch_round_trips_documents() -> None:
+    documents = _documents()
+    batch = DocumentBatch(documents)
+
+    assert len(batch) == 4
+    assert list(batch) == documents
+    assert batch[-1] == documents[-1]
+    assert list(batch.texts()) == ["alpha", "", "gamma", "delta"]
+    assert batch.metadata("page") == [0, None, True, None]
+    assert batch.metadata("missing") == [None] * 4
+    with pytest.raises(IndexError):
+        batch[4]
+
+
+def test_documents_are_independent_copies() -> None:
+    batch = DocumentBatch(_documents())
+    document = batch[0]
+    document.metadata["page"] = 7
+
+    assert batch[0].metadata == {"source": "a.pdf", "page": 0}
+
+
+def test_mutable_metadata_values_are_not_shared() -> None:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=5, chunk_overlap=0)
+    batch = splitter.split_documents_to_batch(
+        [Document(page_content="aaaa bbbb", metadata={"l": ["x"]})]
+    )
+
+    batch[0].metadata["l"].append("y")
+    batch.metadata("l")[1].append("z")
+
+    assert len(batch) == 2
+    assert [document.metadata for document in batch] == [{"l": ["x"]}] * 2
+
+
+def test_slices_are_views() -> None:
+    documents = _documents()
+    batch = DocumentBatch(documents)
+    view = batch[1:3]
+
+    assert view._text is batch._text
+    assert list(view) == documents[1:3]
+    assert list(view[1:]) == documents[2:3]
+    assert list(batch[::2]) == documents[::2]
+    assert list(batch[3:1]) == []
+
+
+def test_batch_pickles() -> None:
+    batch = DocumentBatch(_documents())[1:]
+
+    assert list(pickle.loads(pickle.dumps(batch))) == list(batch)
+
+
+def test_pickled_slice_holds_only_its_rows() -> None:
+    batch = DocumentBatch.from_texts(
+        ["x" * 100 for _ in range(100)], [{"page": i} for i in range(100)]
+    )
+
+    assert len(pickle.dumps(batch[:10])) < len(pickle.dumps(batch)) / 5
+
+
+def test_concat_keeps_order_and_metadata() -> None:
+    documents = _documents()
+    batch = DocumentBatch(documents)
+
+    joined = DocumentBatch.concat([batch[2:], DocumentBatch(), batch[:2]])
+
+    assert list(joined) == documents[2:] + documents[:2]
+    assert joined.metadata("page") == [True, None, 0, None]
+
+
+def test_splitter_produces_batch() -> None:
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=10, chunk_overlap=0, add_start_index=True
+    )
+    documents = [
+        Document(page_content="one two three four five", metadata={"source": "s"}),
+        Document(page_content="six seven", metadata={"source": "t"}),
+    ]
+
+    batch = splitter.split_documents_to_batch(iter(documents))
+
+    assert list(batch) == splitter.split_documents(documents)
+    assert list(splitter.create_batch(["six seven"])) == splitter.create_documents(
+        ["six seven"]
+    )
+
+
+def test_splitter_splits_in_worker_processes() -> None:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=10, chunk_overlap=0)
+    documents = [
+        Document(page_content=f"document {i} has words", metadata={"i": i})
+        for i in range(7)
+    ]
+    config: RunnableConfig = {"executor": "process", "chunksize": 2}
+
+    batch = splitter.split_documents_to_batch(documents, config)
+
+    assert list(batch) == splitter.split_documents(documents)
+
+
+def test_parse_batch_in_worker_processes() -> None:
+    blobs = [Blob.from_data(f"{i}\n{i + 1}") for i in range(5)]
+
+    batch = LineParser().parse_batch(blobs, {"executor": "process"})
+
+    assert list(batch.texts()) == ["0", "1", "1", "2", "2", "3", "3", "4", "4", "5"]
+    assert batch.metadata("line") == [0, 1] * 5
+    assert list(LineParser().parse_batch(blobs)) == list(batch)
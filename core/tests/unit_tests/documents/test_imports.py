@@ -1,6 +1,6 @@
 from core.documents import __all__
 
-EXPECTED_ALL = ["Document"]
+EXPECTED_ALL = ["Document", "DocumentBatch", "DocumentBatchBuilder"]
 
 
 def test_all_imports() -> None:
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from core.exceptions import DeadlineExceededError
+from core.language_models.model import SideKickModel
+from core.runnables.config import (
+    check_deadline,
+    deadline_context,
+    get_deadline,
+    remaining_time,
+)
+from server.server import SideKickSimulator, SimulatorConfig
+
+
+def _slow_model(simulator: SideKickSimulator, **kwargs) -> SideKickModel:
+    return SideKickModel(anthropic_api_url=simulator.url, max_retries=0, **kwargs)
+
+
+def test_get_deadline_takes_the_earliest() -> None:
+    now = time.monotonic()
+    assert get_deadline(None) is None
+    assert get_deadline({"deadline": now + 5, "timeout": 1}) <= now + 2
+
+    with deadline_context(now + 1):
+        # An inner config cannot extend the deadline of the outer call.
+        assert get_deadline({"timeout": 10}) == now + 1
+        assert 0 < remaining_time() <= 1
+    assert remaining_time() is None
+
+
+def test_check_deadline_raises_once_passed() -> None:
+    with deadline_context(time.monotonic() - 1):
+        with pytest.raises(DeadlineExceededError):
+            check_deadline()
+
+
+def test_invoke_times_out_in_flight_request() -> None:
+    config = SimulatorConfig(latency="constant", latency_ms=2000)
+    with SideKickSimulator(config) as simulator:
+        model = _slow_model(simulator)
+
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceededError):
+            model.invoke("hi", config={"timeout": 0.2})
+        assert time.monotonic() - start < 1
+
+
+def test_ainvoke_cancels_in_flight_request() -> None:
+    config = SimulatorConfig(latency="constant", latency_ms=2000)
+    with SideKickSimulator(config) as simulator:
+        model = _slow_model(simulator)
+
+        async def run() -> None:
+            with pytest.raises(DeadlineExceededError):
+                await model.ainvoke("hi", config={"timeout": 0.2})
+
+        start = time.monotonic()
+        asyncio.run(run())
+        assert time.monotonic() - start < 1
+
+
+def test_batch_skips_prompts_queued_past_the_deadline() -> None:
+    config = SimulatorConfig(latency="constant", latency_ms=300)
+    with SideKickSimulator(config) as simulator:
+        model = _slow_model(simulator)
+
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceededError):
+            model.generate(
+                [f"prompt {i}" for i in range(8)],
+                config={"timeout": 0.5, "max_concurrency": 1},
+            )
+        assert time.monotonic() - start < 1.5
+        assert simulator.stats.to_dict()["requests"] <= 2
+
+
+def test_stream_times_out_between_chunks() -> None:
+    config = SimulatorConfig(
+        latency="constant", latency_ms=0, tokens_per_second=5, completion_tokens=50
+    )
+    with SideKickSimulator(config) as simulator:
+        model = _slow_model(simulator, streaming=True)
+
+        chunks = []
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceededError):
+            for chunk in model.stream("hi", config={"timeout": 0.5}):
+                chunks.append(chunk)
+        assert time.monotonic() - start < 1.5
+        assert len(chunks) < 50
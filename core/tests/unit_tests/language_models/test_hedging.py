@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+from typing import Any, List
+
+import pytest
+
+from core.exceptions import RequestCancelledError
+from core.language_models.ModelClient import (
+    CancelScope,
+    SideKickClient,
+    _current_scope,
+)
+from core.language_models.hedging import LatencyTracker, RequestHedger
+from core.runnables.config import configure_executor, get_executor_for_config
+from server.server import SideKickSimulator, SimulatorConfig
+
+
+def _warm_hedger(latency: float = 0.01, **kwargs: Any) -> RequestHedger:
+    hedger = RequestHedger(percentile=0.9, min_samples=10, **kwargs)
+    for _ in range(10):
+        hedger.latencies.record(latency)
+    return hedger
+
+
+def test_latency_tracker_percentile_over_window() -> None:
+    tracker = LatencyTracker(window=10)
+    for latency in range(100):
+        tracker.record(latency)
+
+    assert len(tracker) == 10
+    assert tracker.percentile(0.5) == 95
+    assert tracker.percentile(0.99) == 99
+
+
+def test_no_hedging_until_enough_samples() -> None:
+    hedger = RequestHedger(min_samples=5)
+
+    assert hedger.run(lambda: "ok") == "ok"
+    assert hedger.hedge_delay() is None
+    assert hedger.stats["hedged"] == 0
+
+
+def test_slow_request_is_hedged_and_loser_cancelled() -> None:
+    hedger = _warm_hedger()
+    scopes: List[CancelScope] = []
+
+    def slow() -> str:
+        scopes.append(_current_scope.get())
+        time.sleep(1)
+        return "primary"
+
+    start = time.monotonic()
+    assert hedger.run(slow, lambda: "hedge") == "hedge"
+
+    assert time.monotonic() - start < 0.5
+    assert scopes[0].cancelled
+    assert hedger.stats == {
+        "requests": 1, "hedged": 1, "hedge_won": 1, "rejected": 0
+    }
+
+
+def test_hedge_not_sent_when_not_admitted() -> None:
+    hedger = _warm_hedger()
+
+    def slow() -> str:
+        time.sleep(0.05)
+        return "primary"
+
+    assert hedger.run(slow, lambda: "hedge", admit=lambda: False) == "primary"
+    assert hedger.stats["rejected"] == 1
+    assert hedger.stats["hedged"] == 0
+
+
+class FakeRequests:
+    """100 ms requests that record how many are in flight."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def __call__(self) -> str:
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.1)
+        with self.lock:
+            self.running -= 1
+        return "ok"
+
+
+def test_hedging_does_not_cap_concurrency() -> None:
+    hedger = _warm_hedger(latency=0.2)
+    requests = FakeRequests()
+
+    start = time.monotonic()
+    with get_executor_for_config({"max_concurrency": 20}) as executor:
+        outputs = list(executor.map(lambda _: hedger.run(requests), range(40)))
+
+    assert outputs == ["ok"] * 40
+    assert requests.peak == 20
+    assert time.monotonic() - start < 0.6
+    assert hedger.stats["hedged"] == 0
+
+
+def test_queued_requests_are_not_hedged() -> None:
+    configure_executor("hedging", 2)
+    try:
+        hedger = _warm_hedger(latency=0.15)
+        requests = FakeRequests()
+
+        with get_executor_for_config({"max_concurrency": 8}) as executor:
+            list(executor.map(lambda _: hedger.run(requests), range(8)))
+
+        assert requests.peak == 2
+        assert hedger.stats["hedged"] == 0
+    finally:
+        configure_executor("hedging", 64)
+
+
+def test_async_hedge_cancels_loser() -> None:
+    hedger = _warm_hedger()
+    cancelled = []
+
+    async def slow() -> str:
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "primary"
+
+    async def fast() -> str:
+        return "hedge"
+
+    async def admit() -> bool:
+        return True
+
+    async def run() -> str:
+        result = await hedger.arun(slow, fast, admit=admit)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "hedge"
+    assert cancelled == [True]
+    assert hedger.hedge_rate == 1.0
+
+
+def test_cancel_scope_interrupts_in_flight_request() -> None:
+    config = SimulatorConfig(latency="constant", latency_ms=2000)
+    with SideKickSimulator(config) as simulator:
+        client = SideKickClient(base_url=simulator.url, api_key="sk", max_retries=0)
+        scope = CancelScope()
+        timer = threading.Timer(0.1, scope.cancel)
+        timer.start()
+
+        start = time.monotonic()
+        with pytest.raises(RequestCancelledError):
+            scope.run(client.completions.create, prompt="hi")
+        assert time.monotonic() - start < 1
+        with pytest.raises(RequestCancelledError):
+            scope.run(client.completions.create, prompt="hi")
@@ -0,0 +1,216 @@
+import asyncio
+import gc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional
+
+from core.callbacks.base import BaseCallbackHandler
+from core.callbacks.manager import CallbackManagerForLLMRun
+from core.language_models.llms import LLM
+from core.outputs.generation import GenerationChunk
+from core.outputs.llm_results import LLMResult
+
+
+class FakeEchoLLM(LLM):
+    """Fake LLM that echoes the prompt back and records peak concurrency."""
+
+    delay: float = 0.0
+    active: int = 0
+    peak: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-echo"
+
+    def _call(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Any = None,
+            **kwargs: Any,
+    ) -> str:
+        with _lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with _lock:
+            self.active -= 1
+        return prompt.upper()
+
+
+_lock = threading.Lock()
+
+
+class FakeAsyncEchoLLM(FakeEchoLLM):
+    """Fake LLM with a native async path that records the threads it ran on."""
+
+    threads: set = set()
+
+    async def _acall(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Any = None,
+            **kwargs: Any,
+    ) -> str:
+        self.threads.add(threading.get_ident())
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return prompt.upper()
+
+
+def test_generate_keeps_prompt_order() -> None:
+    llm = FakeEchoLLM(delay=0.01)
+    prompts = [f"prompt {i}" for i in range(20)]
+
+    result = llm.generate(prompts)
+
+    assert [g[0].text for g in result.generations] == [p.upper() for p in prompts]
+
+
+def test_generate_fans_out_concurrently() -> None:
+    llm = FakeEchoLLM(delay=0.05)
+
+    llm.generate([str(i) for i in range(8)], config={"max_concurrency": 8})
+
+    assert llm.peak > 1
+
+
+def test_generate_respects_max_concurrency() -> None:
+    llm = FakeEchoLLM(delay=0.02)
+
+    llm.generate([str(i) for i in range(10)], config={"max_concurrency": 2})
+
+    assert llm.peak <= 2
+
+
+def test_invoke_single_prompt() -> None:
+    assert FakeEchoLLM().invoke("hello") == "HELLO"
+
+
+def test_agenerate_runs_on_event_loop() -> None:
+    llm = FakeAsyncEchoLLM(delay=0.01)
+    prompts = [f"prompt {i}" for i in range(50)]
+
+    result = asyncio.run(llm.agenerate(prompts, config={"max_concurrency": 10}))
+
+    assert [g[0].text for g in result.generations] == [p.upper() for p in prompts]
+    assert len(llm.threads) == 1
+    assert 1 < llm.peak <= 10
+
+
+def test_ainvoke_falls_back_to_call() -> None:
+    assert asyncio.run(FakeEchoLLM().ainvoke("hello")) == "HELLO"
+
+
+class FakeStreamingLLM(FakeEchoLLM):
+    """Fake LLM that streams the prompt back one word at a time."""
+
+    def _stream(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        for word in prompt.split(" "):
+            chunk = GenerationChunk(text=word + " ")
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class RecordingHandler(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.tokens: List[str] = []
+        self.responses: List[LLMResult] = []
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.tokens.append(token)
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.responses.append(response)
+
+
+class RunManagerRecordingLLM(FakeEchoLLM):
+    """Fake LLM that records the run manager ``_call`` receives."""
+
+    run_managers: list = []
+
+    def _call(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Any = None,
+            **kwargs: Any,
+    ) -> str:
+        self.run_managers.append(run_manager)
+        return super()._call(prompt, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def test_acall_fallback_passes_sync_run_manager() -> None:
+    llm = RunManagerRecordingLLM()
+    config = {"callbacks": [RecordingHandler()]}
+
+    assert asyncio.run(llm.ainvoke("hello", config=config)) == "HELLO"
+    assert len(llm.run_managers) == 1
+    assert isinstance(llm.run_managers[0], CallbackManagerForLLMRun)
+
+
+def test_stream_yields_chunks_and_fires_callbacks() -> None:
+    handler = RecordingHandler()
+    stream = FakeStreamingLLM().stream("a b c", config={"callbacks": [handler]})
+
+    assert next(stream) == "a "
+    assert handler.tokens == ["a "]
+    assert list(stream) == ["b ", "c "]
+    assert handler.tokens == ["a ", "b ", "c "]
+    assert handler.responses[0].generations[0][0].text == "a b c "
+
+
+def test_astream_falls_back_to_sync_stream() -> None:
+    async def collect() -> List[str]:
+        return [c async for c in FakeStreamingLLM().astream("x y")]
+
+    assert asyncio.run(collect()) == ["x ", "y "]
+
+
+def test_stream_without_streaming_support_yields_once() -> None:
+    assert list(FakeEchoLLM().stream("x y")) == ["X Y"]
+
+
+def test_generate_reports_each_prompt_on_llm_end() -> None:
+    handler = RecordingHandler()
+
+    FakeEchoLLM().generate(["a", "b"], callbacks=[handler])
+
+    assert sorted(r.generations[0][0].text for r in handler.responses) == ["A", "B"]
+
+
+def test_coalesce_requests_shares_backend_call() -> None:
+    llm = FakeEchoLLM(delay=0.05, coalesce_requests=True)
+    barrier = threading.Barrier(8)
+    # A collection pause longer than the delay would let the leader finish
+    # before the other threads join it.
+    gc.collect()
+
+    def call(_: int) -> str:
+        barrier.wait()
+        return llm.invoke("same prompt")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        outputs = list(executor.map(call, range(8)))
+
+    assert outputs == ["SAME PROMPT"] * 8
+    assert llm.calls == 1
+
+
+def test_generate_runs_on_threads_with_process_executor() -> None:
+    result = FakeEchoLLM().generate(["a", "b"], config={"executor": "process"})
+
+    assert [g[0].text for g in result.generations] == ["A", "B"]
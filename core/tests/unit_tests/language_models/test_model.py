@@ -0,0 +1,340 @@
+import asyncio
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+from tenacity import RetryCallState
+
+from core.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
+from core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from core.exceptions import (
+    APIConnectionError,
+    APIStatusError,
+    CircuitOpenError,
+    DeadlineExceededError,
+    InternalServerError,
+    RateLimitError,
+)
+from core.language_models.hedging import RequestHedger
+from core.language_models.model import SideKickModel
+from core.language_models.retry import CircuitBreaker, RetryBudget
+from core.rate_limiters import BaseRateLimiter
+
+
+class RecordingRateLimiter(BaseRateLimiter):
+    def __init__(self) -> None:
+        self.acquired: List[int] = []
+
+    def acquire(self, *, tokens: int = 0, blocking: bool = True) -> bool:
+        self.acquired.append(tokens)
+        return True
+
+    async def aacquire(self, *, tokens: int = 0, blocking: bool = True) -> bool:
+        return self.acquire(tokens=tokens, blocking=blocking)
+
+
+class FakeCompletions:
+    def create(self, **params: Any) -> Any:
+        return SimpleNamespace(completion=params["prompt"][::-1])
+
+
+def test_completion_acquires_rate_limiter_with_token_estimate() -> None:
+    limiter = RecordingRateLimiter()
+    model = SideKickModel(max_tokens=100, rate_limiter=limiter)
+    model.client = SimpleNamespace(completions=FakeCompletions())
+
+    response = model._completion(prompt="x" * 40, max_tokens_to_sample=100)
+
+    assert response.completion == "x" * 40
+    assert limiter.acquired == [111]
+
+
+class FlakyCompletions:
+    """Fails the first ``failures`` requests with ``error``."""
+
+    def __init__(self, failures: int, error: BaseException) -> None:
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def create(self, **params: Any) -> Any:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return SimpleNamespace(completion="ok")
+
+    async def acreate(self, **params: Any) -> Any:
+        return self.create(**params)
+
+
+class RetryHandler(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.retries: List[int] = []
+
+    def on_retry(self, retry_state: RetryCallState, **kwargs: Any) -> None:
+        self.retries.append(retry_state.attempt_number)
+
+
+def _flaky_model(completions: FlakyCompletions, **kwargs: Any) -> SideKickModel:
+    model = SideKickModel(retry_min_seconds=0.001, retry_max_seconds=0.01, **kwargs)
+    model.client = SimpleNamespace(completions=completions)
+    model.async_client = SimpleNamespace(
+        completions=SimpleNamespace(create=completions.acreate)
+    )
+    return model
+
+
+def _run_manager(handler: BaseCallbackHandler) -> CallbackManagerForLLMRun:
+    return CallbackManagerForLLMRun(
+        run_id=uuid.uuid4(), handlers=[handler], inheritable_handlers=[]
+    )
+
+
+def test_completion_retries_transient_errors_and_reports_them() -> None:
+    completions = FlakyCompletions(2, InternalServerError("boom", status_code=503))
+    model = _flaky_model(completions, max_retries=2)
+    handler = RetryHandler()
+
+    response = model._completion(run_manager=_run_manager(handler), prompt="hi")
+
+    assert response.completion == "ok"
+    assert completions.calls == 3
+    assert handler.retries == [1, 2]
+
+
+def test_completion_gives_up_after_max_retries() -> None:
+    completions = FlakyCompletions(5, APIConnectionError("down"))
+    model = _flaky_model(completions, max_retries=1)
+
+    with pytest.raises(APIConnectionError):
+        model._completion(prompt="hi")
+    assert completions.calls == 2
+
+
+def test_completion_does_not_retry_client_errors() -> None:
+    completions = FlakyCompletions(1, APIStatusError("bad", status_code=400))
+    model = _flaky_model(completions, max_retries=3)
+
+    with pytest.raises(APIStatusError):
+        model._completion(prompt="hi")
+    assert completions.calls == 1
+
+
+def test_acompletion_retries_rate_limits() -> None:
+    completions = FlakyCompletions(1, RateLimitError("slow down", status_code=429))
+    model = _flaky_model(completions, max_retries=1)
+
+    response = asyncio.run(model._acompletion(prompt="hi"))
+
+    assert response.completion == "ok"
+    assert completions.calls == 2
+
+
+class AsyncRetryHandler(AsyncCallbackHandler):
+    def __init__(self) -> None:
+        self.retries: List[int] = []
+
+    async def on_retry(self, retry_state: RetryCallState, **kwargs: Any) -> None:
+        await asyncio.sleep(0.05)
+        self.retries.append(retry_state.attempt_number)
+
+
+def test_acompletion_awaits_async_retry_callback() -> None:
+    completions = FlakyCompletions(1, RateLimitError("slow down", status_code=429))
+    model = _flaky_model(completions, max_retries=1)
+    handler = AsyncRetryHandler()
+    run_manager = AsyncCallbackManagerForLLMRun(
+        run_id=uuid.uuid4(), handlers=[handler], inheritable_handlers=[]
+    )
+
+    asyncio.run(model._acompletion(run_manager=run_manager, prompt="hi"))
+
+    assert handler.retries == [1]
+
+
+def test_retry_budget_limits_retries() -> None:
+    completions = FlakyCompletions(100, APIConnectionError("down"))
+    model = _flaky_model(
+        completions, max_retries=5, retry_budget=RetryBudget(ratio=0, min_retries=1)
+    )
+
+    for _ in range(2):
+        with pytest.raises(APIConnectionError):
+            model._completion(prompt="hi")
+    # One retry for the first request, none left for the second.
+    assert completions.calls == 3
+
+
+def test_circuit_breaker_fails_fast_while_open() -> None:
+    completions = FlakyCompletions(2, APIConnectionError("down"))
+    model = _flaky_model(
+        completions,
+        max_retries=0,
+        circuit_breaker=CircuitBreaker(failure_threshold=2, recovery_timeout=0.05),
+    )
+
+    for _ in range(2):
+        with pytest.raises(APIConnectionError):
+            model._completion(prompt="hi")
+    with pytest.raises(CircuitOpenError):
+        model._completion(prompt="hi")
+    assert completions.calls == 2
+
+    time.sleep(0.05)
+    assert model._completion(prompt="hi").completion == "ok"
+    assert model.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_release_trial_lets_next_request_be_the_trial() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.05)
+
+    breaker.before_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.release_trial()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    breaker.before_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+class FailingOnceRateLimiter(BaseRateLimiter):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def acquire(self, *, tokens: int = 0, blocking: bool = True) -> bool:
+        self.calls += 1
+        if self.calls == 1:
+            raise DeadlineExceededError("Deadline exceeded")
+        return True
+
+    async def aacquire(self, *, tokens: int = 0, blocking: bool = True) -> bool:
+        return self.acquire(tokens=tokens, blocking=blocking)
+
+
+def test_circuit_breaker_trial_is_taken_only_once_admitted() -> None:
+    completions = FlakyCompletions(0, APIConnectionError("down"))
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+    model = _flaky_model(
+        completions,
+        max_retries=0,
+        circuit_breaker=breaker,
+        rate_limiter=FailingOnceRateLimiter(),
+    )
+    breaker.record_failure()
+    time.sleep(0.05)
+
+    with pytest.raises(DeadlineExceededError):
+        model._completion(prompt="hi")
+    assert model._completion(prompt="hi").completion == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def _recovered_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.05)
+    return breaker
+
+
+def test_circuit_breaker_trial_past_its_deadline_makes_way() -> None:
+    completions = FlakyCompletions(1, DeadlineExceededError("Deadline exceeded"))
+    model = _flaky_model(
+        completions, max_retries=0, circuit_breaker=_recovered_breaker()
+    )
+
+    with pytest.raises(DeadlineExceededError):
+        model._completion(prompt="hi")
+    assert model.circuit_breaker.state == CircuitBreaker.OPEN
+    assert model._completion(prompt="hi").completion == "ok"
+    assert model.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_cancelled_trial_makes_way() -> None:
+    calls = 0
+
+    async def create(**params: Any) -> Any:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(1)
+        return SimpleNamespace(completion="ok")
+
+    model = SideKickModel(max_retries=0, circuit_breaker=_recovered_breaker())
+    model.async_client = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    async def main() -> None:
+        trial = asyncio.create_task(model._acompletion(prompt="hi"))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        assert (await model._acompletion(prompt="hi")).completion == "ok"
+
+    asyncio.run(main())
+    assert model.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+class SlowFirstCompletions:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def create(self, **params: Any) -> Any:
+        self.calls += 1
+        if self.calls == 1:
+            time.sleep(1)
+        return SimpleNamespace(completion=f"call {self.calls}")
+
+
+def test_completion_hedges_within_rate_limit() -> None:
+    hedger = RequestHedger(percentile=0.5, min_samples=1)
+    hedger.latencies.record(0.01)
+    limiter = RecordingRateLimiter()
+    model = SideKickModel(max_tokens=10, hedger=hedger, rate_limiter=limiter)
+    model.client = SimpleNamespace(completions=SlowFirstCompletions())
+
+    response = model._completion(prompt="x" * 40, max_tokens_to_sample=10)
+
+    assert response.completion == "call 2"
+    # Acquired once for the request and once, up front, for its hedge.
+    assert limiter.acquired == [21, 21]
+    assert hedger.stats["hedge_won"] == 1
+
+
+def test_with_overrides_shares_clients_and_limiter() -> None:
+    limiter = RecordingRateLimiter()
+    model = SideKickModel(rate_limiter=limiter, temperature=0.1)
+
+    variant = model.with_overrides(temperature=0.9, max_tokens=10)
+
+    assert (variant.temperature, variant.max_tokens_to_sample) == (0.9, 10)
+    assert model.temperature == 0.1
+    assert variant.client is model.client
+    assert variant.rate_limiter is limiter
+    assert variant._default_params["max_tokens_to_sample"] == 10
+
+
+def test_with_overrides_validates_overrides() -> None:
+    model = SideKickModel()
+
+    with pytest.raises(ValueError):
+        model.with_overrides(temperature="hot")
+    with pytest.raises(ValueError, match="model_kwargs"):
+        model.with_overrides(unknown=1)
+    with pytest.raises(ValueError, match="clients depend on it"):
+        model.with_overrides(anthropic_api_url="http://other:8000")
+
+
+def test_models_with_same_settings_share_clients() -> None:
+    assert SideKickModel().client is SideKickModel(temperature=0.5).client
+    assert (
+        SideKickModel(anthropic_api_url="http://other:8000").client
+        is not SideKickModel().client
+    )
@@ -0,0 +1,201 @@
+import asyncio
+import http.client
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, List, Set
+
+import pytest
+
+from core.exceptions import APIConnectionError, DeadlineExceededError, RateLimitError
+from core.language_models.ModelClient import (
+    AsyncSideKickClient,
+    Completion,
+    SideKickClient,
+)
+from core.language_models.model import SideKickModel
+from core.runnables.config import deadline_context
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """Answers with the prompt reversed, one character per event if streaming."""
+
+    protocol_version = "HTTP/1.1"
+    clients: Set[Any] = set()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: Any, **headers: str) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def do_POST(self) -> None:
+        self.clients.add(self.client_address)
+        params = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if params["prompt"] == "limit":
+            self._send_json(
+                429,
+                {"error": {"type": "rate_limit_error", "message": "slow down"}},
+                **{"Retry-After": "3"},
+            )
+            return
+        if params["prompt"] == "truncated":
+            # The error body is cut short by the connection closing.
+            self.send_response(500)
+            self.send_header("Content-Length", "100")
+            self.end_headers()
+            self.wfile.write(b"{")
+            self.close_connection = True
+            return
+        completion = params["prompt"][::-1]
+        if not params.get("stream"):
+            self._send_json(200, {"completion": completion, "stop_reason": "stop"})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._send_chunk(b"event: ping\ndata: {}\n\n")
+        for char in completion:
+            data = json.dumps({"completion": char, "stop_reason": None})
+            self._send_chunk(f"event: completion\ndata: {data}\n\n".encode())
+        self._send_chunk(b"")
+
+
+@pytest.fixture()
+def base_url() -> Iterator[str]:
+    EchoHandler.clients = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _client(base_url: str) -> SideKickClient:
+    return SideKickClient(base_url=base_url, api_key="sk", max_retries=0)
+
+
+def test_create_reuses_connections(base_url: str) -> None:
+    client = _client(base_url)
+
+    completions = [client.completions.create(prompt=f"abc{i}") for i in range(5)]
+
+    assert [c.completion for c in completions] == [f"{i}cba" for i in range(5)]
+    assert len(EchoHandler.clients) == 1
+
+
+def test_clients_share_connection_pool(base_url: str) -> None:
+    for i in range(3):
+        _client(base_url).completions.create(prompt="abc")
+
+    assert len(EchoHandler.clients) == 1
+
+
+def test_failed_error_body_read_releases_connection(base_url: str) -> None:
+    client = SideKickClient(
+        base_url=base_url, api_key="sk", max_retries=0, pool_maxsize=1
+    )
+    results: List[str] = []
+
+    def call() -> None:
+        for _ in range(2):
+            with pytest.raises(http.client.IncompleteRead):
+                client.completions.create(prompt="truncated")
+        results.append(client.completions.create(prompt="abc").completion)
+
+    thread = threading.Thread(target=call, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert results == ["cba"]
+
+
+def test_create_streams_chunks(base_url: str) -> None:
+    client = _client(base_url)
+
+    chunks = list(client.completions.create(prompt="abc", stream=True))
+
+    assert [c.completion for c in chunks] == ["c", "b", "a"]
+    # The connection was read to the end and is reused.
+    assert client.completions.create(prompt="xy").completion == "yx"
+    assert len(EchoHandler.clients) == 1
+
+
+def test_abandoned_stream_closes_its_connection(base_url: str) -> None:
+    client = _client(base_url)
+
+    stream = client.completions.create(prompt="abc", stream=True)
+    next(stream)
+    stream.close()
+    client.completions.create(prompt="xy")
+
+    assert len(EchoHandler.clients) == 2
+
+
+def test_stream_past_its_deadline_raises_deadline_error(base_url: str) -> None:
+    client = _client(base_url)
+    with deadline_context(time.monotonic() + 0.1):
+        stream = client.completions.create(prompt="abc", stream=True)
+    time.sleep(0.15)
+
+    with pytest.raises(DeadlineExceededError) as excinfo:
+        next(stream)
+
+    assert excinfo.value.__cause__ is not excinfo.value
+
+
+def test_create_raises_status_errors(base_url: str) -> None:
+    with pytest.raises(RateLimitError) as info:
+        _client(base_url).completions.create(prompt="limit")
+
+    assert info.value.status_code == 429
+    assert info.value.retry_after == 3
+
+
+def test_create_raises_connection_errors() -> None:
+    client = SideKickClient(base_url="http://127.0.0.1:9", api_key="sk", max_retries=0)
+
+    with pytest.raises(APIConnectionError):
+        client.completions.create(prompt="abc")
+
+
+def test_async_create(base_url: str) -> None:
+    client = AsyncSideKickClient(base_url=base_url, api_key="sk", max_retries=0)
+
+    async def run() -> List[Any]:
+        completion = await client.completions.create(prompt="abc")
+        stream = await client.completions.create(prompt="abc", stream=True)
+        chunks = [chunk async for chunk in stream]
+        again = await client.completions.create(prompt="xy")
+        return [completion, chunks, again]
+
+    completion, chunks, again = asyncio.run(run())
+
+    assert completion == Completion(completion="cba", stop_reason="stop")
+    assert [c.completion for c in chunks] == ["c", "b", "a"]
+    assert again.completion == "yx"
+    assert len(EchoHandler.clients) == 1
+
+
+def test_model_reaches_server(base_url: str) -> None:
+    model = SideKickModel(anthropic_api_url=base_url)
+    prompt = f"{model.HUMAN_PROMPT} hi{model.AI_PROMPT}"
+
+    assert model.invoke(prompt) == prompt[::-1]
+    assert "".join(model.stream(prompt)) == prompt[::-1]
+    assert asyncio.run(model.ainvoke(prompt)) == prompt[::-1]
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from contextlib import ExitStack
+from typing import List
+
+from core.language_models.router import SideKickRouter
+from server.server import SideKickSimulator, SimulatorConfig
+
+
+def _simulators(stack: ExitStack, *configs: SimulatorConfig) -> List[SideKickSimulator]:
+    return [stack.enter_context(SideKickSimulator(config)) for config in configs]
+
+
+def test_ewma_prefers_the_fast_replica() -> None:
+    with ExitStack() as stack:
+        fast, slow = _simulators(
+            stack,
+            SimulatorConfig(latency="constant", latency_ms=0),
+            SimulatorConfig(latency="constant", latency_ms=50),
+        )
+        model = SideKickRouter(endpoints=[fast.url, slow.url], balancing="ewma")
+        for i in range(20):
+            model.invoke(f"prompt {i}")
+
+        assert fast.stats.to_dict()["completed"] >= 15
+        assert slow.stats.to_dict()["completed"] <= 5
+
+
+def test_least_outstanding_spreads_concurrent_requests() -> None:
+    config = SimulatorConfig(latency="constant", latency_ms=50)
+    with ExitStack() as stack:
+        simulators = _simulators(stack, config, config)
+        model = SideKickRouter(endpoints=[s.url for s in simulators])
+
+        model.batch([f"prompt {i}" for i in range(8)], {"max_concurrency": 4})
+
+        peaks = [s.stats.to_dict()["peak_in_flight"] for s in simulators]
+        assert peaks == [2, 2]
+
+
+def test_failing_replica_is_ejected() -> None:
+    with ExitStack() as stack:
+        healthy, failing = _simulators(
+            stack,
+            SimulatorConfig(latency="constant", latency_ms=0),
+            SimulatorConfig(latency="constant", latency_ms=0, error_rate=1),
+        )
+        model = SideKickRouter(
+            endpoints=[failing.url, healthy.url],
+            failure_threshold=2,
+            max_retries=3,
+            retry_min_seconds=0.001,
+            retry_max_seconds=0.001,
+        )
+
+        results = model.batch([f"prompt {i}" for i in range(10)])
+        async_result = asyncio.run(model.ainvoke("prompt 0"))
+
+        assert all(results)
+        assert async_result == results[0]
+        assert healthy.stats.to_dict()["completed"] == 11
+        # Ejected after its first failures instead of taking a share of all.
+        assert failing.stats.to_dict()["errors"] < 10
+        ejected = model.balancer.endpoints[0]
+        assert ejected.ejected_until > time.monotonic()
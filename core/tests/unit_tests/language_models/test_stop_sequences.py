@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Iterator, List
+
+import pytest
+
+from core.language_models.model import SideKickModel
+from core.language_models.stop_sequences import StopSequenceMatcher
+
+
+def _scan(matcher: StopSequenceMatcher, chunks: List[str]) -> str:
+    scanner = matcher.scanner()
+    text = ""
+    for chunk in chunks:
+        text += scanner.feed(chunk)
+        if scanner.stopped:
+            return text
+    return text + scanner.flush()
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("no stop here", None),
+        ("query</search_query> more", 5),
+        ("a\n\nHuman: hi", 1),
+        ("</search_que", None),
+    ],
+)
+def test_find(text: str, expected: Any) -> None:
+    matcher = StopSequenceMatcher(["</search_query>", "\n\nHuman:", ""])
+
+    assert matcher.find(text) == expected
+
+
+def test_overlapping_stop_sequences_cut_at_earliest_start() -> None:
+    matcher = StopSequenceMatcher(["bc", "abcd"])
+
+    assert matcher.truncate("xabcd") == "x"
+    assert _scan(matcher, ["xa", "b", "cd"]) == "x"
+    assert _scan(matcher, ["xa", "b", "ce"]) == "xa"
+
+
+def test_stop_sequence_split_across_chunks() -> None:
+    matcher = StopSequenceMatcher(["</search_query>"])
+    chunks = ["<search_query>otters<", "/search", "_qu", "ery> ignored"]
+
+    assert _scan(matcher, chunks) == "<search_query>otters"
+
+
+def test_partial_stop_sequence_is_released_at_end() -> None:
+    matcher = StopSequenceMatcher(["</search_query>"])
+
+    assert _scan(matcher, ["done </search", "_qu"]) == "done </search_qu"
+
+
+def test_get_anthropic_stop_does_not_mutate_input() -> None:
+    model = SideKickModel()
+    stop = ["</search_query>"]
+
+    assert model._get_anthropic_stop(stop) == ["</search_query>", "\n\nHuman:"]
+    assert stop == ["</search_query>"]
+
+
+class RecordingStream:
+    def __init__(self, tokens: List[str]) -> None:
+        self.tokens = tokens
+        self.sent = 0
+        self.closed = False
+
+    def __iter__(self) -> Iterator[Any]:
+        for token in self.tokens:
+            self.sent += 1
+            yield SimpleNamespace(completion=token)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_stream_stops_and_closes_upstream_at_stop_sequence() -> None:
+    stream = RecordingStream(["<search_query>ot", "ters</sea", "rch_query>", "x", "y"])
+    requests: List[dict] = []
+
+    def create(**params: Any) -> Any:
+        requests.append(params)
+        return stream
+
+    model = SideKickModel(streaming=True)
+    model.client = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    text = model.invoke("hi", stop=["</search_query>"])
+
+    assert text == "<search_query>otters"
+    assert stream.sent == 3
+    assert stream.closed
+    assert requests[0]["stop_sequences"] == ["</search_query>", "\n\nHuman:"]
+
+
+def test_astream_stops_at_stop_sequence() -> None:
+    class AsyncRecordingStream:
+        def __init__(self) -> None:
+            self.closed = False
+
+        async def __aiter__(self) -> Any:
+            for token in ["a", "b</st", "op>", "c"]:
+                yield SimpleNamespace(completion=token)
+
+        async def aclose(self) -> None:
+            self.closed = True
+
+    stream = AsyncRecordingStream()
+
+    async def create(**params: Any) -> Any:
+        return stream
+
+    model = SideKickModel(streaming=True)
+    model.async_client = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    assert asyncio.run(model.ainvoke("hi", stop=["</stop>"])) == "ab"
+    assert stream.closed
+
+
+def test_non_streamed_completion_is_truncated() -> None:
+    model = SideKickModel()
+    model.client = SimpleNamespace(
+        completions=SimpleNamespace(
+            create=lambda **params: SimpleNamespace(completion="answer\n\nHuman: more")
+        )
+    )
+
+    assert model.invoke("hi") == "answer"
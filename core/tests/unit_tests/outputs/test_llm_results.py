@@ -0,0 +1,22 @@
+from core.outputs.generation import Generation
+from core.outputs.llm_results import LLMResult
+
+
+def test_construct_trusted_matches_constructor() -> None:
+    generations = [[Generation(text="a")], [Generation(text="b")]]
+    trusted = LLMResult.construct_trusted(generations, {"token_usage": {}})
+
+    assert trusted == LLMResult(
+        generations=generations, llm_output={"token_usage": {}}
+    )
+    assert trusted.model_dump() == {
+        "generations": [
+            [{"text": "a", "generation_info": None, "type": "Generation"}],
+            [{"text": "b", "generation_info": None, "type": "Generation"}],
+        ],
+        "llm_output": {"token_usage": {}},
+    }
+    assert trusted.model_fields_set == {"generations", "llm_output"}
+    assert [r.generations for r in trusted.flatten()] == [
+        [generations[0]], [generations[1]]
+    ]
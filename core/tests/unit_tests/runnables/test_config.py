@@ -0,0 +1,187 @@
+import asyncio
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, Set
+
+import pytest
+
+from core.runnables.config import (
+    ContextThreadPoolExecutor,
+    RunnableConfig,
+    configure_executor,
+    get_executor,
+    get_executor_for_config,
+    imap,
+    imap_as_completed,
+    run_in_executor,
+    shutdown_executors,
+)
+
+var: ContextVar[str] = ContextVar("var", default="unset")
+
+
+def test_executor_is_shared_across_calls() -> None:
+    threads: Set[str] = set()
+
+    for _ in range(3):
+        with get_executor_for_config({"max_concurrency": 2}) as executor:
+            list(executor.map(
+                lambda _: threads.add(threading.current_thread().name), range(4)
+            ))
+
+    assert get_executor("io") is get_executor("io")
+    assert get_executor("cpu") is not get_executor("io")
+    assert all(name.startswith("sidekick-io") for name in threads)
+
+
+def test_max_concurrency_bounds_shared_executor() -> None:
+    lock = threading.Lock()
+    active: List[int] = [0, 0]
+
+    def work(_: int) -> None:
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+
+    with get_executor_for_config({"max_concurrency": 3}) as executor:
+        list(executor.map(work, range(12)))
+
+    assert active[1] == 3
+
+
+def test_exiting_waits_for_submitted_tasks_and_copies_context() -> None:
+    results: List[str] = []
+    var.set("caller")
+
+    def work() -> None:
+        time.sleep(0.05)
+        results.append(var.get())
+
+    with get_executor_for_config(None) as executor:
+        executor.submit(work)
+
+    assert results == ["caller"]
+
+
+def test_nested_batches_do_not_deadlock() -> None:
+    configure_executor("io", 2)
+    try:
+        def outer(i: int) -> int:
+            with get_executor_for_config(None) as executor:
+                return sum(executor.map(lambda j: i * j, range(3)))
+
+        with get_executor_for_config(None) as executor:
+            assert list(executor.map(outer, range(4))) == [0, 3, 6, 9]
+    finally:
+        configure_executor("io", 32)
+
+
+def test_deeply_nested_batches_do_not_deadlock() -> None:
+    configure_executor("io", 1)
+    try:
+        def nested(depth: int) -> int:
+            if not depth:
+                return 1
+            with get_executor_for_config(None) as executor:
+                return sum(executor.map(nested, [depth - 1] * 2))
+
+        assert nested(3) == 8
+    finally:
+        configure_executor("io", 32)
+
+
+def test_run_in_executor_uses_shared_executor() -> None:
+    name = asyncio.run(run_in_executor(None, lambda: threading.current_thread().name))
+
+    assert name.startswith("sidekick-io")
+
+
+def test_shutdown_executors_recreates_on_next_use() -> None:
+    executor = get_executor("test")
+    shutdown_executors()
+
+    assert get_executor("test") is not executor
+
+
+def test_process_executor_maps_in_order() -> None:
+    with get_executor_for_config({"executor": "process"}) as executor:
+        assert list(executor.map(abs, range(0, -50, -1))) == list(range(50))
+
+
+def test_map_accepts_unsized_iterables() -> None:
+    with ContextThreadPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(abs, (-i for i in range(4)))) == [0, 1, 2, 3]
+
+
+class InFlight:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most = 0
+
+    def __call__(self, i: int) -> int:
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        time.sleep(0.001 * (i % 3))
+        with self.lock:
+            self.running -= 1
+        return i * 2
+
+
+def test_imap_reads_unbounded_input_with_bounded_window() -> None:
+    fn = InFlight()
+    consumed = itertools.count()
+
+    with get_executor_for_config({"max_concurrency": 4}) as executor:
+        results = imap(executor, fn, consumed, window=3)
+        assert list(itertools.islice(results, 50)) == list(range(0, 100, 2))
+        results.close()
+
+    assert fn.most <= 3
+    # Only the window was read ahead of the last result.
+    assert next(consumed) <= 54
+
+
+def test_imap_as_completed_yields_every_index() -> None:
+    with get_executor_for_config(None) as executor:
+        results = list(imap_as_completed(executor, InFlight(), iter(range(20))))
+
+    assert sorted(results) == [(i, i * 2) for i in range(20)]
+
+
+def test_imap_raises_in_place_and_cancels_the_rest() -> None:
+    ran: List[int] = []
+
+    def fn(i: int) -> int:
+        if i == 2:
+            raise ValueError(i)
+        time.sleep(0.01)
+        ran.append(i)
+        return i
+
+    with get_executor_for_config({"max_concurrency": 1}) as executor:
+        results = imap(executor, fn, range(100), window=2)
+        assert [next(results), next(results)] == [0, 1]
+        with pytest.raises(ValueError):
+            next(results)
+
+    assert len(ran) < 10
+    with pytest.raises(ValueError):
+        next(imap(get_executor("io"), fn, range(3), window=0))
+
+
+@pytest.mark.parametrize("config", [{}, {"executor": "process"}])
+def test_imap_does_not_retain_completed_futures(config: RunnableConfig) -> None:
+    retained = []
+
+    with get_executor_for_config(config, allow_process=True) as executor:
+        for _ in imap(executor, abs, iter(range(300)), window=8):
+            retained.append(len(executor._futures))  # type: ignore[attr-defined]
+
+    assert max(retained) <= 16
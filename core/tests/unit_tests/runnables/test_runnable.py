@@ -0,0 +1,236 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import pytest
+
+from core.runnables.base import Runnable, RunnableLambda, RunnableSequence
+from core.runnables.config import RunnableConfig
+from core.runnables.utils import create_model
+from core.tracing import TraceEvent, trace_run
+
+
+class SlowSquare(Runnable[int, int]):
+    """Squares its input after sleeping proportionally to it; fails on negatives."""
+
+    def invoke(
+            self, _input: int, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> int:
+        if _input < 0:
+            raise ValueError(f"negative input {_input}")
+        time.sleep(_input * 0.01)
+        return _input * _input
+
+
+def test_batch_keeps_input_order() -> None:
+    assert SlowSquare().batch([5, 1, 3, 0]) == [25, 1, 9, 0]
+
+
+def test_batch_return_exceptions() -> None:
+    outputs = SlowSquare().batch([2, -1, 3], return_exceptions=True)
+
+    assert outputs[0] == 4
+    assert isinstance(outputs[1], ValueError)
+    assert outputs[2] == 9
+
+
+def test_batch_raises_by_default() -> None:
+    with pytest.raises(ValueError):
+        SlowSquare().batch([2, -1, 3])
+
+
+def test_batch_in_worker_processes_keeps_input_order() -> None:
+    config: RunnableConfig = {"executor": "process", "chunksize": 2}
+
+    outputs = SlowSquare().batch([3, -1, 0, 2, 1], config, return_exceptions=True)
+
+    assert outputs[0] == 9
+    assert isinstance(outputs[1], ValueError)
+    assert outputs[2:] == [0, 4, 1]
+
+
+def test_batch_as_completed_runs_on_threads_with_process_executor() -> None:
+    results = SlowSquare().batch_as_completed([2, 3], {"executor": "process"})
+
+    assert sorted(results) == [(0, 4), (1, 9)]
+
+
+def test_batch_as_completed_yields_every_index() -> None:
+    results = list(
+        SlowSquare().batch_as_completed([8, 0, 4], config={"max_concurrency": 3})
+    )
+
+    assert sorted(results) == [(0, 64), (1, 0), (2, 16)]
+    # The quickest input finishes first.
+    assert results[0] == (1, 0)
+
+
+def test_abatch() -> None:
+    outputs = asyncio.run(
+        SlowSquare().abatch([3, -2, 1], {"max_concurrency": 2}, return_exceptions=True)
+    )
+
+    assert outputs[0] == 9
+    assert isinstance(outputs[1], ValueError)
+    assert outputs[2] == 1
+
+
+class NamedSquare(SlowSquare):
+    pass
+
+
+def test_types_and_schemas_are_resolved_once_per_class() -> None:
+    events: List[TraceEvent] = []
+
+    with trace_run(events.append):
+        schemas = [SlowSquare().input_schema for _ in range(3)]
+        output_schema = SlowSquare().output_schema
+
+    assert SlowSquare().InputType is int
+    assert NamedSquare().OutputType is int
+    assert schemas[0] is schemas[1] is schemas[2]
+    assert schemas[0](__root__=3).__root__ == 3
+    assert output_schema.__name__ == "SlowSquareOutput"
+    assert [e.name for e in events].count("runnable.input_schema") == 1
+    assert NamedSquare().input_schema.__name__ == "NamedSquareInput"
+    renamed = SlowSquare()
+    renamed.name = "Square"
+    assert renamed.input_schema.__name__ == "SquareInput"
+
+
+def test_create_model_caches_unhashable_definitions() -> None:
+    default: List[int] = []
+
+    first = create_model("Unhashable", items=(List[int], default))
+
+    assert create_model("Unhashable", items=(List[int], default)) is first
+    assert create_model("Unhashable", items=(List[int], [])) is not first
+
+
+class ListInput(SlowSquare):
+    @property
+    def InputType(self) -> Any:
+        return List[int]
+
+
+def test_overridden_types_are_not_cached_per_class() -> None:
+    assert ListInput._schemas is None
+    assert ListInput().input_schema(__root__=[1]).__root__ == [1]
+
+
+class Words(Runnable[str, str]):
+    """Streams the words of its input, logging each one."""
+
+    def __init__(self, log: List[str]) -> None:
+        self.log = log
+
+    def invoke(
+            self, _input: str, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> str:
+        return "".join(self.stream(_input, config))
+
+    def stream(
+            self, _input: str, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Iterator[str]:
+        for word in _input.split():
+            self.log.append(f"words {word}")
+            yield word + " "
+
+    async def astream(
+            self, _input: str, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> AsyncIterator[str]:
+        for chunk in self.stream(_input, config):
+            yield chunk
+
+
+class Upper(Runnable[str, str]):
+    """Upper-cases text chunk by chunk, logging each chunk."""
+
+    def __init__(self, log: List[str]) -> None:
+        self.log = log
+        self.batch_sizes: List[int] = []
+
+    def invoke(
+            self, _input: str, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> str:
+        if not _input:
+            raise ValueError("empty input")
+        return _input.upper()
+
+    def batch(self, inputs: List[str], *args: Any, **kwargs: Any) -> List[str]:
+        self.batch_sizes.append(len(inputs))
+        return super().batch(inputs, *args, **kwargs)
+
+    def transform(
+            self,
+            _input: Iterator[str],
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Any,
+    ) -> Iterator[str]:
+        for chunk in _input:
+            self.log.append(f"upper {chunk.strip()}")
+            yield chunk.upper()
+
+    async def atransform(
+            self,
+            _input: AsyncIterator[str],
+            config: Optional[RunnableConfig] = None,
+            **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        async for chunk in _input:
+            yield chunk.upper()
+
+
+def test_pipe_composes_and_flattens() -> None:
+    chain = Words([]) | Upper([]) | str.strip
+
+    assert isinstance(chain, RunnableSequence)
+    assert len(chain.steps) == 3
+    assert isinstance(chain.last, RunnableLambda)
+    assert chain.invoke("a b") == "A B"
+    assert (str.lower | chain).invoke("X y") == "X Y"
+    assert chain.input_schema is Words([]).input_schema
+    with pytest.raises(TypeError):
+        chain | 1
+
+
+def test_stream_pipes_chunks_between_steps() -> None:
+    log: List[str] = []
+    chain = Words(log) | Upper(log)
+
+    chunks = []
+    for chunk in chain.stream("one two three"):
+        chunks.append(chunk)
+        if len(chunks) == 2:
+            break
+
+    assert chunks == ["ONE ", "TWO "]
+    # The second step ran on each chunk before the first produced the next.
+    assert log == ["words one", "upper one", "words two", "upper two"]
+
+
+def test_stream_buffers_for_steps_without_transform() -> None:
+    chain = Words([]) | len
+
+    # The chunks "a " and "b " are joined before the function is called once.
+    assert list(chain.stream("a b")) == [4]
+    assert chain.invoke("a b") == 4
+
+
+def test_astream_pipes_chunks_between_steps() -> None:
+    async def collect() -> List[str]:
+        return [c async for c in (Words([]) | Upper([])).astream("a b")]
+
+    assert asyncio.run(collect()) == ["A ", "B "]
+
+
+def test_batch_passes_whole_batches_and_skips_failures() -> None:
+    upper = Upper([])
+    chain = RunnableLambda(str.strip) | upper | (lambda text: text + "!")
+
+    outputs = chain.batch([" a", " ", "b "], return_exceptions=True)
+
+    assert outputs[0] == "A!" and outputs[2] == "B!"
+    assert isinstance(outputs[1], ValueError)
+    assert upper.batch_sizes == [3]
+    assert asyncio.run(chain.abatch(["a", "b"])) == ["A!", "B!"]
@@ -0,0 +1,221 @@
+import threading
+from pathlib import Path
+from typing import Any, List, Optional
+
+import pytest
+
+from core.caches import InMemoryCache, InMemorySemanticCache, SQLiteCache
+from core.embeddings import HashingEmbeddings
+from core.globals import get_llm_cache, set_llm_cache
+from core.language_models.llms import LLM
+from core.outputs.generation import Generation
+
+
+class CountingLLM(LLM):
+    """Fake LLM that echoes prompts and counts backend calls."""
+
+    calls: List[str] = []
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "counting"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"temperature": self.temperature}
+
+    def _call(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Any = None,
+            **kwargs: Any,
+    ) -> str:
+        with _lock:
+            self.calls.append(prompt)
+        return prompt[::-1]
+
+
+_lock = threading.Lock()
+
+
+@pytest.fixture(autouse=True)
+def reset_global_cache() -> None:
+    previous = get_llm_cache()
+    yield
+    set_llm_cache(previous)
+
+
+def test_in_memory_cache_evicts_least_recently_used() -> None:
+    cache = InMemoryCache(maxsize=2)
+    cache.update("a", "llm", [Generation(text="A")])
+    cache.update("b", "llm", [Generation(text="B")])
+    cache.lookup("a", "llm")
+    cache.update("c", "llm", [Generation(text="C")])
+
+    assert cache.lookup("b", "llm") is None
+    assert cache.lookup("a", "llm") == [Generation(text="A")]
+    assert cache.lookup("c", "llm") == [Generation(text="C")]
+
+
+def test_in_memory_cache_ttl_expires(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr("core.caches.time.monotonic", lambda: now[0])
+    cache = InMemoryCache(ttl=10)
+    cache.update("a", "llm", [Generation(text="A")])
+
+    now[0] = 109.0
+    assert cache.lookup("a", "llm") == [Generation(text="A")]
+    now[0] = 110.0
+    assert cache.lookup("a", "llm") is None
+    assert len(cache) == 0
+
+
+def test_in_memory_cache_rejects_bad_bounds() -> None:
+    with pytest.raises(ValueError):
+        InMemoryCache(maxsize=0)
+    with pytest.raises(ValueError):
+        InMemoryCache(ttl=-1)
+
+
+def test_generate_only_sends_cache_misses() -> None:
+    cache = InMemoryCache()
+    llm = CountingLLM(cache=cache)
+    llm.generate(["one", "two"])
+    llm.calls.clear()
+
+    result = llm.generate(["two", "three", "one"])
+
+    assert llm.calls == ["three"]
+    assert [g[0].text for g in result.generations] == ["owt", "eerht", "eno"]
+
+
+def test_cache_is_keyed_on_model_params() -> None:
+    cache = InMemoryCache()
+    CountingLLM(cache=cache, temperature=0.0).generate(["one"])
+
+    llm = CountingLLM(cache=cache, temperature=1.0)
+    llm.generate(["one"])
+
+    assert llm.calls == ["one"]
+
+
+def test_generate_uses_global_cache() -> None:
+    set_llm_cache(InMemoryCache())
+    llm = CountingLLM()
+    llm.invoke("hello")
+    llm.calls.clear()
+
+    assert llm.invoke("hello") == "olleh"
+    assert llm.calls == []
+
+
+def test_cache_false_disables_global_cache() -> None:
+    set_llm_cache(InMemoryCache())
+    llm = CountingLLM(cache=False)
+    llm.invoke("hello")
+    llm.invoke("hello")
+
+    assert llm.calls == ["hello", "hello"]
+
+
+def test_sqlite_cache_survives_restart(tmp_path: Path) -> None:
+    path = tmp_path / "cache.db"
+    cache = SQLiteCache(path)
+    cache.update("a", "llm", [Generation(text="A", generation_info={"n": 1})])
+    cache.close()
+
+    reopened = SQLiteCache(path)
+
+    assert reopened.lookup("a", "llm") == [
+        Generation(text="A", generation_info={"n": 1})
+    ]
+    assert reopened.lookup("a", "other-llm") is None
+
+
+def test_sqlite_cache_bulk_lookup_keeps_order(tmp_path: Path) -> None:
+    cache = SQLiteCache(tmp_path / "cache.db")
+    cache.update_many(
+        [(str(i), "llm", [Generation(text=f"g{i}")]) for i in range(0, 1200, 2)]
+    )
+
+    results = cache.lookup_many([(str(i), "llm") for i in range(1200)])
+
+    assert [r[0].text if r else None for r in results[:4]] == ["g0", None, "g2", None]
+    assert sum(r is not None for r in results) == 600
+
+
+def test_sqlite_cache_clear_by_llm_string(tmp_path: Path) -> None:
+    cache = SQLiteCache(tmp_path / "cache.db")
+    cache.update("a", "llm-1", [Generation(text="A")])
+    cache.update("a", "llm-2", [Generation(text="B")])
+
+    cache.clear(llm_string="llm-1")
+
+    assert cache.lookup("a", "llm-1") is None
+    assert cache.lookup("a", "llm-2") == [Generation(text="B")]
+
+
+def test_generate_reads_sqlite_cache_in_bulk(
+        tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = SQLiteCache(tmp_path / "cache.db")
+    CountingLLM(cache=cache).generate(["one", "two"])
+
+    def _no_single_lookups(*args: Any) -> None:
+        raise AssertionError("generate should use lookup_many")
+
+    monkeypatch.setattr(cache, "lookup", _no_single_lookups)
+    llm = CountingLLM(cache=cache)
+    result = llm.generate(["one", "two", "three"])
+
+    assert llm.calls == ["three"]
+    assert [g[0].text for g in result.generations] == ["eno", "owt", "eerht"]
+
+
+def test_semantic_cache_hits_similar_prompts() -> None:
+    cache = InMemorySemanticCache(HashingEmbeddings(), score_threshold=0.8)
+    cache.update("What is the capital of France?", "llm", [Generation(text="Paris")])
+
+    assert cache.lookup("what is the capital city of France", "llm") == [
+        Generation(text="Paris")
+    ]
+    assert cache.lookup("How do I bake bread?", "llm") is None
+    assert cache.lookup("What is the capital of France?", "other-llm") is None
+
+
+def test_semantic_cache_update_replaces_cached_prompt() -> None:
+    cache = InMemorySemanticCache(HashingEmbeddings())
+    cache.update("alpha beta", "llm", [Generation(text="old")])
+    cache.update("alpha beta", "llm", [Generation(text="new")])
+
+    assert cache.lookup("alpha beta", "llm") == [Generation(text="new")]
+    assert cache._indexes["llm"].size == 1
+
+
+def test_semantic_cache_evicts_least_recently_used() -> None:
+    cache = InMemorySemanticCache(HashingEmbeddings(), maxsize=2)
+    cache.update("alpha beta", "llm", [Generation(text="1")])
+    cache.update("gamma delta", "llm", [Generation(text="2")])
+    cache.lookup("alpha beta", "llm")
+    cache.update("epsilon zeta", "llm", [Generation(text="3")])
+
+    assert [
+        cache.lookup(prompt, "llm")
+        for prompt in ["alpha beta", "gamma delta", "epsilon zeta"]
+    ] == [[Generation(text="1")], None, [Generation(text="3")]]
+
+
+def test_generate_with_semantic_cache() -> None:
+    llm = CountingLLM(
+        cache=InMemorySemanticCache(HashingEmbeddings(), score_threshold=0.8)
+    )
+    llm.generate(["What is the capital of France?"])
+
+    result = llm.generate(
+        ["what is the capital city of France", "How do I bake bread?"]
+    )
+
+    assert llm.calls == ["What is the capital of France?", "How do I bake bread?"]
+    assert result.generations[0][0].text == "?ecnarF fo latipac eht si tahW"
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import pytest
+
+from core.rate_limiters import InMemoryRateLimiter
+
+
+def test_requests_are_spread_at_the_configured_rate() -> None:
+    limiter = InMemoryRateLimiter(requests_per_minute=1200, burst_seconds=0.05)
+
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+
+    # One request fits in the burst, the other four wait 50ms each.
+    assert 0.15 <= elapsed < 0.5
+
+
+def test_non_blocking_acquire_fails_when_exhausted() -> None:
+    limiter = InMemoryRateLimiter(requests_per_minute=60)
+
+    assert limiter.acquire(blocking=False)
+    assert not limiter.acquire(blocking=False)
+
+
+def test_token_budget_is_limited() -> None:
+    limiter = InMemoryRateLimiter(tokens_per_minute=6000, burst_seconds=1)
+
+    assert limiter.acquire(tokens=100, blocking=False)
+    assert not limiter.acquire(tokens=100, blocking=False)
+    assert limiter.acquire(tokens=0, blocking=False)
+
+
+def test_requests_larger_than_the_bucket_still_pass() -> None:
+    limiter = InMemoryRateLimiter(tokens_per_minute=60, burst_seconds=1)
+
+    assert limiter.acquire(tokens=1000, blocking=False)
+    # The oversized request left the bucket in debt.
+    assert not limiter.acquire(tokens=1, blocking=False)
+
+
+def test_aacquire_shares_the_budget_with_acquire() -> None:
+    limiter = InMemoryRateLimiter(requests_per_minute=60)
+    limiter.acquire()
+
+    assert not asyncio.run(limiter.aacquire(blocking=False))
+
+
+def test_rejects_bad_rates() -> None:
+    with pytest.raises(ValueError):
+        InMemoryRateLimiter(requests_per_minute=0)
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from typing import Iterator
+
+import pytest
+
+from core.exceptions import InternalServerError, RateLimitError
+from core.language_models.ModelClient import SideKickClient
+from core.language_models.model import SideKickModel
+from server.server import SideKickSimulator, SimulatorConfig, _truncate_at_stop
+
+
+@pytest.fixture()
+def simulator() -> Iterator[SideKickSimulator]:
+    with SideKickSimulator(SimulatorConfig(latency="constant", latency_ms=0)) as sim:
+        yield sim
+
+
+def _client(url: str) -> SideKickClient:
+    return SideKickClient(base_url=url, api_key="sk", max_retries=0)
+
+
+def test_completion_matches_streamed_chunks(simulator: SideKickSimulator) -> None:
+    client = _client(simulator.url)
+    params = {"prompt": "hello", "max_tokens_to_sample": 5}
+
+    completion = client.completions.create(**params)
+    chunks = list(client.completions.create(stream=True, **params))
+
+    assert len(chunks) == 5
+    assert "".join(c.completion for c in chunks) == completion.completion
+    assert chunks[-1].stop_reason == completion.stop_reason == "max_tokens"
+    assert simulator.stats.to_dict()["connections"] == 1
+
+
+def test_stop_sequences() -> None:
+    tokens = [" the", " quick", " brown"]
+
+    assert _truncate_at_stop(tokens, ["ick"]) == ([" the", " qu"], "stop_sequence")
+    assert _truncate_at_stop(tokens, [" quick"]) == ([" the"], "stop_sequence")
+    assert _truncate_at_stop(tokens, ["fox"]) == (tokens, "max_tokens")
+
+
+def test_injected_errors() -> None:
+    config = SimulatorConfig(latency_ms=0, rate_limit_rate=1, retry_after=2)
+    with SideKickSimulator(config) as sim, pytest.raises(RateLimitError) as info:
+        _client(sim.url).completions.create(prompt="hi")
+    assert info.value.retry_after == 2
+
+    with SideKickSimulator(SimulatorConfig(latency_ms=0, error_rate=1)) as sim:
+        with pytest.raises(InternalServerError):
+            _client(sim.url).completions.create(prompt="hi")
+        assert sim.stats.to_dict()["errors"] == 1
+
+
+def test_concurrency_limit() -> None:
+    config = SimulatorConfig(latency="constant", latency_ms=200, max_concurrency=1)
+    errors = []
+
+    def call(url: str) -> None:
+        try:
+            _client(url).completions.create(prompt="hi")
+        except RateLimitError as e:
+            errors.append(e)
+
+    with SideKickSimulator(config) as sim:
+        threads = [threading.Thread(target=call, args=(sim.url,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = sim.stats.to_dict()
+
+    assert len(errors) == 2
+    assert stats["peak_in_flight"] == 1
+    assert stats["completed"] == 1
+
+
+def test_model_retries_against_simulator() -> None:
+    config = SimulatorConfig(latency_ms=0, error_rate=0.5, seed=1)
+    with SideKickSimulator(config) as sim:
+        model = SideKickModel(
+            anthropic_api_url=sim.url,
+            max_retries=10,
+            retry_min_seconds=0.001,
+            retry_max_seconds=0.01,
+        )
+        results = model.batch(["a", "b", "c", "d"])
+        async_result = asyncio.run(model.ainvoke("a"))
+        stats = sim.stats.to_dict()
+
+    assert all(results)
+    assert async_result == results[0]
+    assert stats["errors"] > 0
+    assert stats["completed"] == 5
@@ -0,0 +1,222 @@
+import asyncio
+import threading
+import time
+from typing import List
+
+import pytest
+
+from core.exceptions import DeadlineExceededError
+from core.runnables.config import deadline_context
+from core.singleflight import SingleFlight
+
+
+def test_run_many_dedupes_keys_in_one_call() -> None:
+    calls: List[List[str]] = []
+
+    def fetch(keys: List[str]) -> List[str]:
+        calls.append(keys)
+        return [k.upper() for k in keys]
+
+    assert SingleFlight().run_many(["a", "b", "a"], fetch) == ["A", "B", "A"]
+    assert calls == [["a", "b"]]
+
+
+def test_concurrent_callers_share_one_call() -> None:
+    flight: SingleFlight[str, str] = SingleFlight()
+    calls: List[List[str]] = []
+    started = threading.Event()
+
+    def fetch(keys: List[str]) -> List[str]:
+        calls.append(keys)
+        started.set()
+        time.sleep(0.05)
+        return [k.upper() for k in keys]
+
+    results: List[List[str]] = []
+    leader = threading.Thread(target=lambda: results.append(flight.run_many(["a"], fetch)))
+    leader.start()
+    started.wait()
+    followers = [
+        threading.Thread(target=lambda: results.append(flight.run_many(["a"], fetch)))
+        for _ in range(5)
+    ]
+    for t in followers:
+        t.start()
+    for t in [leader, *followers]:
+        t.join()
+
+    assert calls == [["a"]]
+    assert results == [["A"]] * 6
+
+
+def test_followers_receive_leader_exception() -> None:
+    flight: SingleFlight[str, str] = SingleFlight()
+    started = threading.Event()
+    errors: List[BaseException] = []
+
+    def fail(keys: List[str]) -> List[str]:
+        started.set()
+        time.sleep(0.05)
+        raise ValueError("backend down")
+
+    def call() -> None:
+        try:
+            flight.run_many(["a"], fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join()
+    follower.join()
+
+    assert len(errors) == 2
+    # The key is released, so the next call runs again.
+    with pytest.raises(ValueError):
+        flight.run_many(["a"], fail)
+
+
+def test_arun_many_shares_call_between_tasks() -> None:
+    flight: SingleFlight[str, str] = SingleFlight()
+    calls: List[List[str]] = []
+
+    async def fetch(keys: List[str]) -> List[str]:
+        calls.append(keys)
+        await asyncio.sleep(0.01)
+        return [k.upper() for k in keys]
+
+    async def main() -> List[List[str]]:
+        return await asyncio.gather(
+            *(flight.arun_many(["a", "b"], fetch) for _ in range(10))
+        )
+
+    assert asyncio.run(main()) == [["A", "B"]] * 10
+    assert calls == [["a", "b"]]
+
+
+def test_cancelling_a_follower_does_not_affect_the_others() -> None:
+    flight: SingleFlight[str, str] = SingleFlight()
+
+    async def fetch(keys: List[str]) -> List[str]:
+        await asyncio.sleep(0.05)
+        return [k.upper() for k in keys]
+
+    async def main() -> None:
+        leader = asyncio.create_task(flight.arun_many(["a"], fetch))
+        await asyncio.sleep(0)
+        followers = [
+            asyncio.create_task(flight.arun_many(["a"], fetch)) for _ in range(2)
+        ]
+        await asyncio.sleep(0.01)
+        followers[0].cancel()
+
+        assert await leader == ["A"]
+        assert await followers[1] == ["A"]
+        with pytest.raises(asyncio.CancelledError):
+            await followers[0]
+
+    asyncio.run(main())
+
+
+def test_follower_takes_over_when_leader_runs_out_of_time() -> None:
+    flight: SingleFlight[str, str] = SingleFlight()
+    calls: List[List[str]] = []
+    started = threading.Event()
+
+    def fetch(keys: List[str]) -> List[str]:
+        calls.append(keys)
+        if len(calls) == 1:
+            started.set()
+            time.sleep(0.05)
+            raise DeadlineExceededError("Deadline exceeded")
+        return [k.upper() for k in keys]
+
+    errors: List[BaseException] = []
+
+    def lead() -> None:
+        try:
+            flight.run_many(["a"], fetch)
+        except DeadlineExceededError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait()
+    # The follower gets a value of its own, not the leader's deadline error.
+    assert flight.run_many(["a", "b"], fetch) == ["A", "B"]
+    leader.join()
+
+    assert len(errors) == 1
+    assert calls == [["a"], ["b"], ["a"]]
+
+
+def test_follower_takes_over_when_leader_is_cancelled() -> None:
+    flight: SingleFlight[str, str] = SingleFlight()
+    calls: List[List[str]] = []
+
+    async def fetch(keys: List[str]) -> List[str]:
+        calls.append(keys)
+        await asyncio.sleep(0.05)
+        return [k.upper() for k in keys]
+
+    async def main() -> None:
+        leader = asyncio.create_task(flight.arun_many(["a"], fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.arun_many(["a"], fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        assert await follower == ["A"]
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(main())
+    assert calls == [["a"], ["a"]]
+
+
+def test_follower_raises_its_own_deadline() -> None:
+    flight: SingleFlight[str, str] = SingleFlight()
+    started = threading.Event()
+
+    def fetch(keys: List[str]) -> List[str]:
+        started.set()
+        time.sleep(0.3)
+        return [k.upper() for k in keys]
+
+    leader = threading.Thread(target=lambda: flight.run_many(["a"], fetch))
+    leader.start()
+    started.wait()
+
+    start = time.monotonic()
+    with deadline_context(time.monotonic() + 0.05):
+        with pytest.raises(DeadlineExceededError):
+            flight.run_many(["a"], fetch)
+    assert time.monotonic() - start < 0.2
+    leader.join()
+
+
+def test_async_follower_raises_its_own_deadline() -> None:
+    flight: SingleFlight[str, str] = SingleFlight()
+
+    async def fetch(keys: List[str]) -> List[str]:
+        await asyncio.sleep(0.3)
+        return [k.upper() for k in keys]
+
+    async def follow() -> None:
+        with deadline_context(time.monotonic() + 0.05):
+            with pytest.raises(DeadlineExceededError):
+                await flight.arun_many(["a"], fetch)
+
+    async def main() -> None:
+        leader = asyncio.create_task(flight.arun_many(["a"], fetch))
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        await follow()
+        assert time.monotonic() - start < 0.2
+        # The leader's call is not cancelled with the follower.
+        assert await leader == ["A"]
+
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+import logging
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+
+from core.language_models.model import SideKickModel
+from core.runnables.config import ContextThreadPoolExecutor
+from core.tracing import TRACE, TraceEvent, get_tracer, trace_run
+
+
+def test_disabled_tracer_records_nothing() -> None:
+    tracer = get_tracer("tests.tracing.disabled")
+
+    assert not tracer.enabled()
+    with tracer.span("noop") as span:
+        span.annotate(ignored=True)
+    tracer.event("noop")
+
+
+def test_trace_run_collects_events_and_spans() -> None:
+    tracer = get_tracer("tests.tracing.run")
+    events: List[TraceEvent] = []
+
+    with trace_run(events.append):
+        tracer.event("start", prompts=2)
+        with tracer.span("work") as span:
+            span.annotate(cached=1)
+        with pytest.raises(ValueError):
+            with tracer.span("fails"):
+                raise ValueError
+    tracer.event("after")
+
+    assert [e.name for e in events] == ["start", "work", "fails"]
+    assert events[0].duration is None
+    assert events[1].duration >= 0
+    assert events[1].fields == {"cached": 1}
+    assert events[2].fields == {"error": "ValueError"}
+
+
+def test_trace_run_follows_context_into_threads() -> None:
+    tracer = get_tracer("tests.tracing.threads")
+    events: List[TraceEvent] = []
+
+    with trace_run(events.append):
+        with ContextThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(lambda i: tracer.event("task", i=i), range(3)))
+
+    assert sorted(e.fields["i"] for e in events) == [0, 1, 2]
+
+
+def test_logger_at_trace_level_logs_events(caplog: Any) -> None:
+    tracer = get_tracer("tests.tracing.logger")
+
+    with caplog.at_level(TRACE, logger="tests.tracing.logger"):
+        with tracer.span("work", prompts=1):
+            pass
+
+    assert len(caplog.records) == 1
+    assert caplog.records[0].levelname == "TRACE"
+    assert caplog.records[0].getMessage().startswith("work ")
+    assert caplog.records[0].trace_event.fields == {"prompts": 1}
+
+
+def test_invoke_traces_request_path(capsys: Any) -> None:
+    model = SideKickModel()
+    model.client = SimpleNamespace(
+        completions=SimpleNamespace(
+            create=lambda **params: SimpleNamespace(completion="ok")
+        )
+    )
+    events: List[TraceEvent] = []
+
+    with trace_run(events.append):
+        assert model.invoke("hi") == "ok"
+
+    names = [e.name for e in events]
+    assert names == [
+        "llm.cache_lookup", "model.request", "llm.call", "llm.generate", "llm.invoke"
+    ]
+    assert capsys.readouterr().out == ""
+    assert logging.getLevelName(TRACE) == "TRACE"
@@ -5,6 +5,7 @@ import logging
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
+from functools import partial
 from typing import (
     AbstractSet,
     Any,
@@ -21,12 +22,21 @@ from typing import (
 )
 
 from core.documents.base import  Document
+from core.documents.batch import DocumentBatch, DocumentBatchBuilder
+from core.runnables.config import RunnableConfig, get_executor_for_config
 
 logger = logging.getLogger(__name__)
 
 TS = TypeVar("TS", bound="TextSplitter")
 
 
+def _split_document(splitter: TextSplitter, document: Document) -> DocumentBatch:
+    """Split one document in a worker process."""
+    builder = DocumentBatchBuilder()
+    splitter._add_chunks(builder, document.page_content, document.metadata)
+    return builder.build()
+
+
 class TextSplitter(ABC):
     """Interface for splitting text into chunks."""
 
@@ -82,7 +92,7 @@ class TextSplitter(ABC):
                     index = text.find(chunk, max(0, offset))
                     metadata["start_index"] = index
                     previous_chunk_len = len(chunk)
-                new_doc = Document(page_content=chunk, metadata=metadata)
+                new_doc = Document.construct_trusted(chunk, metadata)
                 documents.append(new_doc)
         return documents
 
@@ -94,6 +104,59 @@ class TextSplitter(ABC):
             metadatas.append(doc.metadata)
         return self.create_documents(texts, metadatas=metadatas)
 
+    def create_batch(
+        self, texts: Iterable[str], metadatas: Optional[Iterable[dict]] = None
+    ) -> DocumentBatch:
+        """Create a DocumentBatch of the chunks of a list of texts.
+
+        Like ``create_documents``, but the chunks are stored column by column
+        instead of as one Document each, and the texts and metadatas may be
+        iterators.
+        """
+        builder = DocumentBatchBuilder()
+        if metadatas is None:
+            for text in texts:
+                self._add_chunks(builder, text, {})
+        else:
+            for text, metadata in zip(texts, metadatas):
+                self._add_chunks(builder, text, metadata)
+        return builder.build()
+
+    def split_documents_to_batch(
+        self, documents: Iterable[Document], config: Optional[RunnableConfig] = None
+    ) -> DocumentBatch:
+        """Split documents into a DocumentBatch, one document at a time.
+
+        With ``config["executor"] == "process"``, the documents are split in
+        worker processes, in chunks of ``config["chunksize"]`` documents, and the
+        splitter must be picklable.
+        """
+        if config and config.get("executor") == "process":
+            with get_executor_for_config(config, allow_process=True) as executor:
+                return DocumentBatch.concat(
+                    executor.map(partial(_split_document, self), documents)
+                )
+        builder = DocumentBatchBuilder()
+        for doc in documents:
+            self._add_chunks(builder, doc.page_content, doc.metadata)
+        return builder.build()
+
+    def _add_chunks(
+        self, builder: DocumentBatchBuilder, text: str, metadata: dict
+    ) -> None:
+        index = 0
+        previous_chunk_len = 0
+        # The batch keeps values, not dicts, so one copy serves all chunks.
+        metadata = copy.deepcopy(metadata)
+        for chunk in self.split_text(text):
+            if self._add_start_index:
+                offset = index + previous_chunk_len - self._chunk_overlap
+                index = text.find(chunk, max(0, offset))
+                previous_chunk_len = len(chunk)
+                builder.append(chunk, {**metadata, "start_index": index})
+            else:
+                builder.append(chunk, metadata)
+
     def _join_docs(self, docs: List[str], separator: str) -> Optional[str]:
         text = separator.join(docs)
         if self._strip_whitespace:
@@ -0,0 +1,178 @@
+"""Lightweight trace points for the request path.
+
+Trace points are named events, optionally timed, that cost close to nothing
+while tracing is disabled. Tracing is enabled per logger, by setting a logger
+to the ``TRACE`` level, or per run, by collecting the events of a block of code
+with ``trace_run``:
+
+.. code-block:: python
+
+    logging.basicConfig()
+    logging.getLogger("core.language_models").setLevel(TRACE)
+
+    events = []
+    with trace_run(events.append):
+        model.invoke("Tell me a joke")
+    for event in events:
+        print(event.name, event.duration)
+"""
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import TracebackType
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Type
+
+TRACE = 5
+"""Log level of trace events, below ``logging.DEBUG``."""
+
+logging.addLevelName(TRACE, "TRACE")
+
+
+class TraceEvent(NamedTuple):
+    """A trace point that was hit."""
+
+    name: str
+    """The name of the trace point, e.g. ``llm.generate``."""
+    logger: str
+    """The name of the logger of the tracer."""
+    duration: Optional[float]
+    """Seconds spent in the span, None for an event."""
+    fields: Dict[str, Any]
+    """Details recorded at the trace point."""
+
+    def __str__(self) -> str:
+        details = " ".join(f"{key}={value!r}" for key, value in self.fields.items())
+        if self.duration is not None:
+            details = f"{self.duration * 1000:.3f}ms {details}"
+        return f"{self.name} {details}".rstrip()
+
+
+TraceSink = Callable[[TraceEvent], None]
+
+_run_sink: ContextVar[Optional[TraceSink]] = ContextVar("trace_sink", default=None)
+
+
+@contextmanager
+def trace_run(sink: TraceSink) -> Iterator[None]:
+    """Send the trace events of the enclosed code to ``sink``.
+
+    Applies to every tracer, whatever its logger's level, including in the
+    threads and tasks the code starts with a copy of the context.
+
+    Args:
+        sink: Called with each trace event.
+    """
+    token = _run_sink.set(sink)
+    try:
+        yield
+    finally:
+        _run_sink.reset(token)
+
+
+class Span:
+    """Times a block of code and emits a trace event when it ends."""
+
+    __slots__ = ("_tracer", "_name", "fields", "_start")
+
+    def __init__(self, tracer: Tracer, name: str, fields: Dict[str, Any]) -> None:
+        self._tracer = tracer
+        self._name = name
+        self.fields = fields
+        self._start = 0.0
+
+    def annotate(self, **fields: Any) -> None:
+        """Add details to the trace event."""
+        self.fields.update(fields)
+
+    def __enter__(self) -> Span:
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(
+            self,
+            exc_type: Optional[Type[BaseException]],
+            exc: Optional[BaseException],
+            tb: Optional[TracebackType],
+    ) -> None:
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        self._tracer._emit(self._name, time.perf_counter() - self._start, self.fields)
+
+
+class _NullSpan:
+    """Stands in for a ``Span`` while tracing is disabled."""
+
+    __slots__ = ()
+
+    def annotate(self, **fields: Any) -> None:
+        pass
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Emits the trace events of a module.
+
+    Events go to the module's logger at the ``TRACE`` level, and to the sink of
+    the enclosing ``trace_run`` if any. While neither listens, ``event`` and
+    ``span`` return at once.
+
+    Example:
+        .. code-block:: python
+
+            tracer = get_tracer(__name__)
+
+            with tracer.span("llm.generate", prompts=len(prompts)) as span:
+                ...
+                span.annotate(cached=len(cached))
+    """
+
+    __slots__ = ("logger",)
+
+    def __init__(self, name: str) -> None:
+        self.logger = logging.getLogger(name)
+
+    def enabled(self) -> bool:
+        """Whether trace events are being recorded."""
+        return _run_sink.get() is not None or self.logger.isEnabledFor(TRACE)
+
+    def event(self, name: str, **fields: Any) -> None:
+        """Record that the trace point ``name`` was hit."""
+        if self.enabled():
+            self._emit(name, None, fields)
+
+    def span(self, name: str, **fields: Any) -> Any:
+        """Time the enclosed code as the trace point ``name``.
+
+        Returns:
+            A context manager yielding a ``Span``, or a stand-in that records
+            nothing if tracing is disabled.
+        """
+        if not self.enabled():
+            return _NULL_SPAN
+        return Span(self, name, fields)
+
+    def _emit(
+            self, name: str, duration: Optional[float], fields: Dict[str, Any]
+    ) -> None:
+        event = TraceEvent(name, self.logger.name, duration, fields)
+        sink = _run_sink.get()
+        if sink is not None:
+            sink(event)
+        if self.logger.isEnabledFor(TRACE):
+            self.logger.log(TRACE, "%s", event, extra={"trace_event": event})
+
+
+def get_tracer(name: str) -> Tracer:
+    """Get the tracer of a module, emitting to the logger of the same name."""
+    return Tracer(name)
@@ -1,26 +1,47 @@
 import warnings
-from typing import Union, Dict, Any, Set
+import weakref
+from typing import AbstractSet, Union, Dict, Any, Mapping
 
 from pydantic.v1 import SecretStr
 
 
-def get_pydantic_field_names(pydantic_cls: Any) -> Set[str]:
+_field_names_cache: "weakref.WeakKeyDictionary[type, Mapping[str, str]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_pydantic_field_aliases(pydantic_cls: Any) -> Mapping[str, str]:
+    """Map the field names and aliases of a pydantic class to field names.
+
+    Computed once per class and cached; do not modify the result.
+
+    Args:
+        pydantic_cls: Pydantic class."""
+    names = _field_names_cache.get(pydantic_cls)
+    if names is None:
+        names = {}
+        for field in pydantic_cls.__fields__.values():
+            names[field.name] = field.name
+            if field.has_alias:
+                names[field.alias] = field.name
+        _field_names_cache[pydantic_cls] = names
+    return names
+
+
+def get_pydantic_field_names(pydantic_cls: Any) -> AbstractSet[str]:
     """Get field names, including aliases, for a pydantic class.
 
+    Computed once per class and cached.
+
     Args:
         pydantic_cls: Pydantic class."""
-    all_required_field_names = set()
-    for field in pydantic_cls.__fields__.values():
-        all_required_field_names.add(field.name)
-        if field.has_alias:
-            all_required_field_names.add(field.alias)
-    return all_required_field_names
+    return get_pydantic_field_aliases(pydantic_cls).keys()
 
 
 def build_extra_kwargs(
         extra_kwargs: Dict[str, Any],
         values: Dict[str, Any],
-        all_required_field_names: Set[str],
+        all_required_field_names: AbstractSet[str],
 ) -> Dict[str, Any]:
     """Build extra kwargs from values and extra_kwargs.
 
@@ -40,7 +61,7 @@ def build_extra_kwargs(
             )
             extra_kwargs[field_name] = values.pop(field_name)
 
-    invalid_model_kwargs = all_required_field_names.intersection(extra_kwargs.keys())
+    invalid_model_kwargs = all_required_field_names & extra_kwargs.keys()
     if invalid_model_kwargs:
         raise ValueError(
             f"Parameters {invalid_model_kwargs} should be specified explicitly. "
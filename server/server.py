@@ -0,0 +1,420 @@
+"""Local stand-in for the SideKick completion server, for load testing.
+
+Speaks the same protocol as ``SideKickClient``: ``POST /v1/complete`` answered
+with a JSON completion, or with server-sent ``completion`` events over a
+chunked, keep-alive response when streaming. Latency, generation speed, error
+and 429 injection and the concurrency limit are configurable, so models, caches,
+retries and batching can be exercised without a network.
+
+Run it from the command line:
+
+    python -m server.server --port=8000 --latency_ms=200 --error_rate=0.05
+
+or in process:
+
+    with SideKickSimulator(SimulatorConfig(latency_ms=50)) as simulator:
+        model = SideKickModel(anthropic_api_url=simulator.url)
+"""
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel
+
+COMPLETIONS_PATH = "/v1/complete"
+STATS_PATH = "/v1/stats"
+
+_WORDS = (
+    "the quick brown fox jumps over a lazy dog while sidekick answers every "
+    "question with measured latency and steady throughput"
+).split()
+
+
+class SimulatorConfig(BaseModel):
+    """Behaviour of the simulated backend."""
+
+    latency: Literal["constant", "uniform", "normal", "lognormal", "exponential"] = (
+        "lognormal"
+    )
+    """Distribution of the time to first token."""
+
+    latency_ms: float = 100.0
+    """Median time to first token, in milliseconds; the mean for ``exponential``."""
+
+    latency_jitter: float = 0.5
+    """Spread of the latency distribution: the sigma of ``lognormal``, and
+    relative to ``latency_ms`` for ``uniform`` and ``normal``."""
+
+    tokens_per_second: float = 0.0
+    """Generation speed after the first token. Instantaneous if 0."""
+
+    completion_tokens: int = 32
+    """Tokens generated per completion, capped by ``max_tokens_to_sample``."""
+
+    error_rate: float = 0.0
+    """Share of requests answered with a 500 error."""
+
+    rate_limit_rate: float = 0.0
+    """Share of requests answered with a 429 error."""
+
+    retry_after: Optional[float] = 1.0
+    """Seconds sent in the ``Retry-After`` header of 429 responses."""
+
+    max_concurrency: Optional[int] = None
+    """Requests handled at once; requests beyond it get a 429. Unlimited if None."""
+
+    api_key: Optional[str] = None
+    """Key the ``x-api-key`` header must match. Any key is accepted if None."""
+
+    seed: Optional[int] = None
+    """Seed for latency and error injection, for reproducible runs."""
+
+
+class SimulatorStats:
+    """Counters of the requests handled by a simulator, safe across threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.completed = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "completed": self.completed,
+                "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "connections": self.connections,
+            }
+
+
+class SideKickSimulator:
+    """A simulated SideKick server running on a background thread.
+
+    Example:
+        .. code-block:: python
+
+            simulator = SideKickSimulator(SimulatorConfig(rate_limit_rate=0.1))
+            simulator.start()
+            ...
+            print(simulator.stats.to_dict())
+            simulator.stop()
+    """
+
+    def __init__(
+            self,
+            config: Optional[SimulatorConfig] = None,
+            *,
+            host: str = "127.0.0.1",
+            port: int = 0,
+    ) -> None:
+        """Initialize the simulator.
+
+        Args:
+            config: The behaviour of the backend.
+            host: The host to listen on.
+            port: The port to listen on. A free port is picked if 0.
+        """
+        self.config = config or SimulatorConfig()
+        self.stats = SimulatorStats()
+        self._random = random.Random(self.config.seed)
+        self._random_lock = threading.Lock()
+        self._server = _SimulatorHTTPServer((host, port), _SimulatorHandler, self)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The base url to give to clients."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "SideKickSimulator":
+        """Start serving on a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve on the calling thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "SideKickSimulator":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def sample_latency(self) -> float:
+        """Sample a time to first token, in seconds."""
+        config = self.config
+        median = config.latency_ms / 1000
+        with self._random_lock:
+            if config.latency == "constant":
+                latency = median
+            elif config.latency == "uniform":
+                spread = median * config.latency_jitter
+                latency = self._random.uniform(median - spread, median + spread)
+            elif config.latency == "normal":
+                latency = self._random.gauss(median, median * config.latency_jitter)
+            elif config.latency == "exponential":
+                latency = self._random.expovariate(1 / median) if median else 0.0
+            else:
+                latency = median * self._random.lognormvariate(
+                    0, config.latency_jitter
+                )
+        return max(0.0, latency)
+
+    def sample_failure(self) -> Optional[int]:
+        """Sample whether to fail a request, returning the status to fail with."""
+        with self._random_lock:
+            draw = self._random.random()
+        if draw < self.config.rate_limit_rate:
+            return 429
+        if draw < self.config.rate_limit_rate + self.config.error_rate:
+            return 500
+        return None
+
+    def try_enter(self) -> bool:
+        """Count a request in, unless the concurrency limit is reached."""
+        stats = self.stats
+        with stats._lock:
+            stats.requests += 1
+            limit = self.config.max_concurrency
+            if limit is not None and stats.in_flight >= limit:
+                stats.rate_limited += 1
+                return False
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+            return True
+
+    def exit(self, status: int) -> None:
+        """Count a request out with the status it was answered with."""
+        stats = self.stats
+        with stats._lock:
+            stats.in_flight -= 1
+            if status == 429:
+                stats.rate_limited += 1
+            elif status >= 400:
+                stats.errors += 1
+            else:
+                stats.completed += 1
+
+
+def generate_tokens(params: Dict[str, Any], completion_tokens: int) -> List[str]:
+    """Generate the tokens of a completion, deterministically from the prompt."""
+    n_tokens = min(completion_tokens, int(params.get("max_tokens_to_sample", 256)))
+    seed = zlib.crc32(str(params.get("prompt", "")).encode("utf-8"))
+    return [" " + _WORDS[(seed + i * 7) % len(_WORDS)] for i in range(n_tokens)]
+
+
+def _truncate_at_stop(
+        tokens: List[str], stop_sequences: List[str]
+) -> Tuple[List[str], str]:
+    """Cut the tokens before the first stop sequence, returning the stop reason."""
+    text = "".join(tokens)
+    indexes = [text.find(stop) for stop in stop_sequences if stop]
+    indexes = [index for index in indexes if index != -1]
+    if not indexes:
+        return tokens, "max_tokens"
+    end = min(indexes)
+    kept: List[str] = []
+    length = 0
+    for token in tokens:
+        if length + len(token) > end:
+            if end > length:
+                kept.append(token[: end - length])
+            break
+        kept.append(token)
+        length += len(token)
+    return kept, "stop_sequence"
+
+
+class _SimulatorHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address: Tuple[str, int],
+            handler: Any,
+            simulator: SideKickSimulator,
+    ) -> None:
+        self.simulator = simulator
+        super().__init__(address, handler)
+
+
+class _SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: _SimulatorHTTPServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.simulator.stats._lock:
+            self.server.simulator.stats.connections += 1
+
+    def _send_json(
+            self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, error_type: str, message: str) -> None:
+        headers = {}
+        retry_after = self.server.simulator.config.retry_after
+        if status == 429 and retry_after is not None:
+            headers["Retry-After"] = str(retry_after)
+        payload = {"type": "error", "error": {"type": error_type, "message": message}}
+        self._send_json(status, payload, headers)
+
+    def _send_event(self, event: str, data: Dict[str, Any]) -> None:
+        payload = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path == STATS_PATH:
+            self._send_json(200, self.server.simulator.stats.to_dict())
+        else:
+            self._send_error(404, "not_found_error", f"Unknown path {self.path}")
+
+    def do_POST(self) -> None:
+        simulator = self.server.simulator
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != COMPLETIONS_PATH:
+            self._send_error(404, "not_found_error", f"Unknown path {self.path}")
+            return
+        config = simulator.config
+        if config.api_key is not None and self.headers.get("x-api-key") != config.api_key:
+            self._send_error(401, "authentication_error", "Invalid API key")
+            return
+        try:
+            params = json.loads(body)
+        except ValueError:
+            self._send_error(400, "invalid_request_error", "Body is not valid JSON")
+            return
+
+        if not simulator.try_enter():
+            self._send_error(429, "rate_limit_error", "Too many concurrent requests")
+            return
+        status = 200
+        try:
+            status = self._complete(simulator, params)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away mid-response.
+            status = 499
+            self.close_connection = True
+        finally:
+            simulator.exit(status)
+
+    def _complete(self, simulator: SideKickSimulator, params: Dict[str, Any]) -> int:
+        config = simulator.config
+        time.sleep(simulator.sample_latency())
+        failure = simulator.sample_failure()
+        if failure == 429:
+            self._send_error(429, "rate_limit_error", "Rate limit exceeded")
+            return 429
+        if failure == 500:
+            self._send_error(500, "api_error", "Injected internal server error")
+            return 500
+
+        tokens, stop_reason = _truncate_at_stop(
+            generate_tokens(params, config.completion_tokens),
+            params.get("stop_sequences") or [],
+        )
+        model = params.get("model", "sidekick")
+        delay = 1 / config.tokens_per_second if config.tokens_per_second else 0.0
+
+        if not params.get("stream"):
+            time.sleep(delay * max(0, len(tokens) - 1))
+            payload = {
+                "type": "completion",
+                "completion": "".join(tokens),
+                "stop_reason": stop_reason,
+                "model": model,
+            }
+            self._send_json(200, payload)
+            return 200
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._send_event("ping", {"type": "ping"})
+        for i, token in enumerate(_iter_paced(tokens, delay)):
+            self._send_event(
+                "completion",
+                {
+                    "type": "completion",
+                    "completion": token,
+                    "stop_reason": stop_reason if i == len(tokens) - 1 else None,
+                    "model": model,
+                },
+            )
+        self.wfile.write(b"0\r\n\r\n")
+        return 200
+
+
+def _iter_paced(tokens: List[str], delay: float) -> Iterator[str]:
+    """Yield the tokens ``delay`` seconds apart, the first one right away."""
+    start = time.monotonic()
+    for i, token in enumerate(tokens):
+        wait = start + i * delay - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        yield token
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, **config: Any) -> None:
+    """Run the simulator until interrupted.
+
+    Args:
+        host: The host to listen on.
+        port: The port to listen on.
+        **config: The fields of ``SimulatorConfig``.
+    """
+    simulator = SideKickSimulator(SimulatorConfig(**config), host=host, port=port)
+    print(f"SideKick simulator listening on {simulator.url}")
+    simulator.serve_forever()
+
+
+if __name__ == "__main__":
+    from fire import Fire
+
+    Fire(serve)